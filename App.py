@@ -36,9 +36,54 @@
 #        data_agendamento DATETIME2 NOT NULL,
 #        status NVARCHAR(50) NOT NULL DEFAULT 'agendado',
 #        id_video_postado NVARCHAR(100),
-#        mensagem_erro NVARCHAR(MAX)
+#        mensagem_erro NVARCHAR(MAX),
+#        upload_sessao_uri NVARCHAR(MAX),
+#        bytes_enviados BIGINT,
+#        bytes_total BIGINT,
+#        taxa_upload FLOAT,
+#        hash_video NVARCHAR(64),
+#        worker_id NVARCHAR(100),
+#        lease_expira_em DATETIME2,
+#        versao BIGINT,
+#        atualizado_em DATETIME2,
+#        prioridade INT NOT NULL DEFAULT 0,
+#        duracao_segundos FLOAT,
+#        codec_video NVARCHAR(50),
+#        codec_audio NVARCHAR(50),
+#        taxa_bits BIGINT,
+#        largura INT,
+#        altura INT,
+#        moov_no_inicio BIT,
+#        preparo NVARCHAR(50),
+#        taxa_alocada FLOAT,
+#        tentativas INT NOT NULL DEFAULT 0,
+#        proxima_tentativa_em DATETIME2,
+#        historico_erros NVARCHAR(MAX)
 #    );
+#    CREATE INDEX ix_agendamentos_status_lease ON agendamentos (status, lease_expira_em);
+#    CREATE INDEX ix_agendamentos_status_data ON agendamentos (status, data_agendamento, id);
+#    CREATE INDEX ix_agendamentos_data_id ON agendamentos (data_agendamento, id);
+#    CREATE INDEX ix_agendamentos_versao ON agendamentos (versao);
+#    CREATE TABLE cota_youtube (
+#        projeto NVARCHAR(100) NOT NULL,
+#        dia DATE NOT NULL,
+#        unidades_usadas INT NOT NULL DEFAULT 0,
+#        atualizado_em DATETIME2,
+#        PRIMARY KEY (projeto, dia)
+#    );
+#    Se a tabela já existe, adicione as colunas novas com:
+#    ALTER TABLE agendamentos ADD upload_sessao_uri NVARCHAR(MAX), bytes_enviados BIGINT, bytes_total BIGINT, taxa_upload FLOAT;
+#    ALTER TABLE agendamentos ADD hash_video NVARCHAR(64);
+#    ALTER TABLE agendamentos ADD worker_id NVARCHAR(100), lease_expira_em DATETIME2;
+#    ALTER TABLE agendamentos ADD versao BIGINT, atualizado_em DATETIME2;
+#    ALTER TABLE agendamentos ADD prioridade INT NOT NULL DEFAULT 0;
+#    ALTER TABLE agendamentos ADD duracao_segundos FLOAT, codec_video NVARCHAR(50), codec_audio NVARCHAR(50), taxa_bits BIGINT,
+#        largura INT, altura INT, moov_no_inicio BIT, preparo NVARCHAR(50);
+#    ALTER TABLE agendamentos ADD taxa_alocada FLOAT;
+#    ALTER TABLE agendamentos ADD tentativas INT NOT NULL DEFAULT 0, proxima_tentativa_em DATETIME2, historico_erros NVARCHAR(MAX);
 # 5. ATENÇÃO: Substitua 'NOME_DO_SEU_PC\\SQLEXPRESS' na connection_string abaixo pelo nome da sua instância SQL Server.
+# 6. Alternativa sem SQL Server (uma máquina só, ou Linux): coloque DATABASE_BACKEND=sqlite no '.env'.
+#    O banco fica no arquivo SQLITE_PATH (padrão: agendamentos.db) e as tabelas são criadas automaticamente.
 
 # ----------------------------------------------------------------------------
 # 4. CONFIGURAÇÃO DO GOOGLE GEMINI API (ANTES DE RODAR O CÓDIGO):
@@ -52,27 +97,55 @@
 # 5. CÓDIGO DO SERVIDOR (app.py):
 # ----------------------------------------------------------------------------
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request as FlaskRequest, Response, request, jsonify, send_from_directory, g
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from werkzeug.utils import secure_filename
 import os
+import re
+import uuid
+import shutil
+import hashlib
+import tempfile
 import pickle
 import datetime
 import json # Importado para parsear a resposta da IA
+import time
+import random
+import socket
+import http.client
+import httplib2
+import math
+import queue
+import logging
+import threading
 
 # Importações do Google YouTube API
 from google.auth.transport.requests import Request
+from google.auth.exceptions import RefreshError
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient import discovery_cache
+import google_auth_httplib2
+from googleapiclient.http import MediaFileUpload, build_http
 from googleapiclient.errors import HttpError
 
 # Importações do Banco de Dados (SQLAlchemy)
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import update, Column, Integer, BigInteger, Float, String, Boolean, Date, DateTime, Index, and_, or_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Importações para IA do Gemini e gerenciamento de segredos
-import google.generativeai as genai
 from dotenv import load_dotenv
+from metadata_service import MetadataService, GeminiClient, ResponseCache, TokenRateLimiter
+from storage import build_database_url, create_storage_engine, is_sqlite
+from media_prep import MODOS as MODOS_PREPARO, MediaRejectedError, file_sha256
+from bandwidth import BandwidthManager, parse_profiles, megabits_to_bytes
+from disk_manager import DiskManager
+from manifest import (ManifestError, EXTENSOES_VIDEO, detect_format, parse_manifest, parse_items,
+                      resolve_server_path, list_videos)
+from telemetry import (REGISTRY, CONTENT_TYPE_METRICAS, BUCKETS_ATRASO, BUCKETS_BYTES_POR_SEGUNDO,
+                       configure_logging, log_event, job_context, span, record_error)
 
 # Carrega as variáveis de ambiente (como a chave da API Gemini) do arquivo .env
 load_dotenv()
@@ -80,19 +153,170 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# --- LOGS E MÉTRICAS (veja telemetry.py) ---
+# Logs em JSON na saída padrão; LOG_LEVEL=DEBUG mostra também a duração de cada etapa (spans)
+configure_logging('app', os.getenv('LOG_LEVEL', 'INFO'))
+HTTP_REQUISICOES = REGISTRY.counter(
+    'postador_http_requisicoes_total', 'Requisições HTTP por rota, método e status.', ('rota', 'metodo', 'status'))
+HTTP_DURACAO = REGISTRY.histogram(
+    'postador_http_duracao_segundos', 'Duração das requisições HTTP por rota.', ('rota', 'metodo'))
+AGENDAMENTOS_CRIADOS = REGISTRY.counter(
+    'postador_agendamentos_criados_total', 'Agendamentos criados, separados por vídeo repetido ou novo.', ('duplicado',))
+UPLOADS = REGISTRY.counter(
+    'postador_uploads_total', 'Uploads para o YouTube por resultado.', ('resultado',))
+UPLOAD_BYTES = REGISTRY.counter(
+    'postador_upload_bytes_total', 'Bytes enviados ao YouTube.')
+UPLOAD_TAXA = REGISTRY.histogram(
+    'postador_upload_bytes_por_segundo', 'Taxa de envio de cada parte do upload para o YouTube.',
+    buckets=BUCKETS_BYTES_POR_SEGUNDO)
+UPLOAD_RETENTATIVAS = REGISTRY.counter(
+    'postador_upload_retentativas_total', 'Partes reenviadas após falha temporária, por motivo.', ('motivo',))
+ATRASO_POSTAGEM = REGISTRY.histogram(
+    'postador_atraso_postagem_segundos', 'Horário em que o vídeo ficou postado menos data_agendamento.',
+    buckets=BUCKETS_ATRASO)
+RECUSAS_DISCO = REGISTRY.counter(
+    'postador_envios_recusados_disco_total', 'Vídeos recusados antes da gravação por falta de espaço ou de cota de bytes.')
+LIMPEZA_DISCO_BYTES = REGISTRY.counter(
+    'postador_limpeza_disco_bytes_total', 'Bytes apagados de uploads/ pela limpeza.')
+
 # --- CONFIGURAÇÕES GERAIS ---
 UPLOAD_FOLDER = 'uploads'
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
 CLIENT_SECRET_FILE = 'client_secret.json'
 TOKEN_FILE = 'token.pickle'
+# Endereço alternativo da API do YouTube, ex.: o servidor falso de benchmarks/fake_youtube.py (vazio = Google)
+YOUTUBE_API_ROOT_URL = os.getenv('YOUTUBE_API_ROOT_URL', '')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# --- CONFIGURAÇÃO DO RECEBIMENTO DE VÍDEOS ---
+# Tamanho máximo de um vídeo enviado pelo dashboard (em MB). Pode ser alterado no .env com MAX_VIDEO_MB
+MAX_VIDEO_BYTES = int(os.getenv('MAX_VIDEO_MB', '16384')) * 1024 * 1024
+# Folga para os campos de texto do formulário que vêm junto com o vídeo
+app.config['MAX_CONTENT_LENGTH'] = MAX_VIDEO_BYTES + 1024 * 1024
+# Envio em partes pelo navegador: cada sessão fica em uploads/.sessoes/<upload_id>/ até ser finalizada
+UPLOAD_SESSIONS_FOLDER = os.path.join(UPLOAD_FOLDER, '.sessoes')
+UPLOAD_SESSION_CHUNK_SIZE = max(1, int(os.getenv('UPLOAD_SESSAO_CHUNK_MB', '8'))) * 1024 * 1024
+os.makedirs(UPLOAD_SESSIONS_FOLDER, exist_ok=True)
+
+# --- ESPAÇO EM DISCO E LIMPEZA DE uploads/ (veja disk_manager.py) ---
+# Espaço livre que sempre fica sobrando no disco; vídeos que não caberiam são recusados antes de começar a gravar
+DISCO_RESERVA_MB = int(os.getenv('DISCO_RESERVA_MB', '1024'))
+# Máximo de bytes de vídeos esperando o upload (0 = sem limite além do espaço livre)
+DISCO_COTA_PENDENTE_GB = float(os.getenv('DISCO_COTA_PENDENTE_GB', '0'))
+# Por quantos dias o vídeo de um agendamento com 'erro' ou 'esgotado' fica guardado para ser recolocado na fila
+RETENCAO_FALHAS_DIAS = float(os.getenv('RETENCAO_FALHAS_DIAS', '7'))
+# Arquivos sem agendamento só são apagados depois deste tempo parados (protege gravações em andamento)
+DISCO_CARENCIA_HORAS = float(os.getenv('DISCO_CARENCIA_HORAS', '1'))
+# Sessões de envio em partes sem nenhuma parte nova há mais que isto são descartadas
+SESSOES_ENVIO_VALIDADE_HORAS = float(os.getenv('SESSOES_ENVIO_VALIDADE_HORAS', '24'))
+disk_manager = DiskManager(
+    UPLOAD_FOLDER, UPLOAD_SESSIONS_FOLDER,
+    reserva_bytes=DISCO_RESERVA_MB * 1024 * 1024,
+    cota_pendente_bytes=int(DISCO_COTA_PENDENTE_GB * 1024 ** 3),
+    carencia_segundos=DISCO_CARENCIA_HORAS * 3600,
+    sessoes_validade_segundos=SESSOES_ENVIO_VALIDADE_HORAS * 3600,
+)
+REGISTRY.gauge('postador_disco_livre_bytes', 'Espaço livre no disco da pasta uploads/.').set_function(
+    disk_manager.free_bytes)
+
+# --- AGENDAMENTO EM LOTE (veja manifest.py) ---
+# Os arquivos citados nos manifestos de /api/schedule/youtube/bulk precisam estar dentro desta pasta do servidor
+IMPORT_FOLDER = os.getenv('PASTA_IMPORTACAO', 'importar')
+# Máximo de linhas (vídeos) aceitas em um único lote
+BULK_MAX_ROWS = int(os.getenv('LOTE_MAX_LINHAS', '1000'))
+
+# --- PREPARAÇÃO DOS VÍDEOS ANTES DO UPLOAD (veja media_prep.py) ---
+# Vídeos novos ficam com status 'preparando' até o worker analisá-los; só então viram 'agendado'.
+# PREPARO_VIDEO: 'analisar' (padrão) confere duração, codecs e taxa e recusa o que o YouTube não aceitaria;
+# 'remux' também coloca o índice (moov) dos MP4s no início; 'transcodificar' também converte para H.264/AAC
+# os vídeos com codec não aceito ou acima de PREPARO_TAXA_MAXIMA_KBPS; 'desligado' pula a etapa.
+PREPARO_VIDEO = os.getenv('PREPARO_VIDEO', 'analisar').lower()
+if PREPARO_VIDEO not in MODOS_PREPARO:
+    raise ValueError(f"PREPARO_VIDEO inválido: {PREPARO_VIDEO!r}. Use um destes: {', '.join(MODOS_PREPARO)}.")
+PREPARO_PERFIL = {
+    'modo': PREPARO_VIDEO,
+    'taxa_maxima_kbps': int(os.getenv('PREPARO_TAXA_MAXIMA_KBPS', '0')),  # 0 = sem limite
+    'crf': int(os.getenv('PREPARO_CRF', '20')),
+    'preset': os.getenv('PREPARO_PRESET', 'medium'),
+    'audio_kbps': 192,
+}
+
+# --- AVISO AO WORKER ---
+# Endereços UDP dos workers que devem recarregar a fila quando um agendamento é criado ou alterado.
+# Vários workers: WORKER_NOTIFY_ADDRS=127.0.0.1:5055,192.168.0.20:5055
+WORKER_NOTIFY_ADDRS = [
+    (endereco.rsplit(':', 1)[0], int(endereco.rsplit(':', 1)[1]))
+    for endereco in os.getenv('WORKER_NOTIFY_ADDRS', '127.0.0.1:5055').split(',') if endereco.strip()
+]
+
+# --- CONFIGURAÇÃO DO UPLOAD EM PARTES (CHUNKS) PARA O YOUTUBE ---
+# Tamanho de cada parte enviada ao YouTube. Precisa ser múltiplo de 256 KB, por isso é configurado em MB.
+UPLOAD_CHUNK_SIZE = max(1, int(os.getenv('UPLOAD_CHUNK_MB', '8'))) * 1024 * 1024
+# Quantas vezes seguidas uma parte pode falhar (erro 5xx ou de rede) antes de desistir do upload
+UPLOAD_MAX_TENTATIVAS = int(os.getenv('UPLOAD_MAX_TENTATIVAS', '8'))
+UPLOAD_BACKOFF_MAXIMO = 64  # segundos
+# Apenas estes erros são temporários e merecem nova tentativa
+STATUS_HTTP_RETENTAVEIS = (500, 502, 503, 504)
+ERROS_DE_REDE_RETENTAVEIS = (ConnectionError, TimeoutError, socket.timeout, socket.gaierror,
+                             http.client.HTTPException, httplib2.HttpLib2Error)
+
+# --- NOVAS TENTATIVAS DE UPLOADS QUE FALHARAM ---
+# Erros temporários (rede, 5xx, limite de taxa) devolvem o agendamento para a fila com espera exponencial
+# (com variação aleatória); depois de RETENTATIVAS_MAXIMAS falhas ele vai para 'esgotado'.
+# Erros permanentes (vídeo recusado, arquivo ausente, credencial inválida) vão direto para 'erro'.
+RETENTATIVAS_MAXIMAS = max(1, int(os.getenv('RETENTATIVAS_MAXIMAS', '5')))
+RETENTATIVA_BASE_SEGUNDOS = float(os.getenv('RETENTATIVA_BASE_SEGUNDOS', '60'))
+RETENTATIVA_MAXIMA_SEGUNDOS = float(os.getenv('RETENTATIVA_MAXIMA_SEGUNDOS', '3600'))
+# Quantas falhas ficam guardadas em historico_erros
+HISTORICO_ERROS_MAXIMO = 10
+# Status HTTP do YouTube que valem nova tentativa do agendamento inteiro, além dos 5xx
+STATUS_HTTP_TEMPORARIOS = STATUS_HTTP_RETENTAVEIS + (401, 408, 429)
+# Motivos do erro 403 que são temporários (limite de taxa), ao contrário da cota diária
+MOTIVOS_403_TEMPORARIOS = ('rateLimitExceeded', 'userRateLimitExceeded', 'backendError')
+
+# --- LIMITE DE BANDA DOS UPLOADS (veja bandwidth.py) ---
+# Taxa máxima somando todos os uploads deste processo, em megabits/s (0 = sem limite). Com vários workers,
+# cada um tem o seu limite. Partes menores (UPLOAD_CHUNK_MB) deixam a divisão entre os uploads mais suave.
+BANDA_MAXIMA_MBPS = float(os.getenv('BANDA_MAXIMA_MBPS', '0'))
+# Limites por horário local, que substituem BANDA_MAXIMA_MBPS dentro da faixa. Ex.: 08:00-18:00=20;18:00-08:00=0
+BANDA_PERFIS = parse_profiles(os.getenv('BANDA_PERFIS', ''))
+# Atraso em relação a data_agendamento em que a fatia de banda de um upload chega ao dobro
+BANDA_URGENCIA_MINUTOS = int(os.getenv('BANDA_URGENCIA_MINUTOS', '30'))
+bandwidth_manager = BandwidthManager(megabits_to_bytes(BANDA_MAXIMA_MBPS), BANDA_PERFIS, BANDA_URGENCIA_MINUTOS * 60)
+REGISTRY.gauge('postador_banda_limite_bytes_por_segundo',
+               'Limite de banda dos uploads no horário atual (0 = sem limite).').set_function(
+    bandwidth_manager.current_limit)
+REGISTRY.gauge('postador_banda_uploads_ativos',
+               'Uploads dividindo a banda neste processo.').set_function(lambda: len(bandwidth_manager.snapshot()))
+
+# --- CONFIGURAÇÃO DA COTA DA API DO YOUTUBE ---
+# Cota diária do projeto no Google Cloud (padrão: 10.000 unidades). A cota zera à meia-noite do horário do Pacífico.
+YOUTUBE_COTA_DIARIA = int(os.getenv('YOUTUBE_COTA_DIARIA', '10000'))
+# Custo de cada videos().insert. Retomar uma sessão de upload já aberta não gasta cota de novo.
+YOUTUBE_CUSTO_UPLOAD = int(os.getenv('YOUTUBE_CUSTO_UPLOAD', '1600'))
+# Motivos do erro 403 que indicam cota esgotada: o agendamento é adiado em vez de ir para 'erro'
+MOTIVOS_COTA_ESGOTADA = ('quotaExceeded', 'dailyLimitExceeded', 'uploadLimitExceeded')
+
 # --- CONFIGURAÇÃO DA API GEMINI ---
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Limites das chamadas à IA: chamadas simultâneas, tokens por minuto e cache das respostas
+GEMINI_MAX_CONCORRENCIA = int(os.getenv('GEMINI_MAX_CONCORRENCIA', '4'))
+GEMINI_TOKENS_POR_MINUTO = int(os.getenv('GEMINI_TOKENS_POR_MINUTO', '250000'))
+GEMINI_CACHE_ITENS = int(os.getenv('GEMINI_CACHE_ITENS', '1024'))
+GEMINI_CACHE_TTL_HORAS = float(os.getenv('GEMINI_CACHE_TTL_HORAS', '24'))
+# Máximo de resumos aceitos em uma única chamada de /api/generate-content/batch
+GEMINI_MAX_LOTE = 50
+metadata_service = None
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    metadata_service = MetadataService(
+        GeminiClient(GEMINI_API_KEY),
+        cache=ResponseCache(GEMINI_CACHE_ITENS, GEMINI_CACHE_TTL_HORAS * 3600),
+        rate_limiter=TokenRateLimiter(GEMINI_TOKENS_POR_MINUTO),
+        max_concurrency=GEMINI_MAX_CONCORRENCIA,
+    )
 else:
-    print("AVISO: Chave da API Gemini não encontrada no .env. A funcionalidade de IA estará desabilitada.")
+    log_event('gemini_desabilitado', "Chave da API Gemini não encontrada no .env. A funcionalidade de IA estará desabilitada.",
+              logging.WARNING)
 
 # --- CONFIGURAÇÃO DO BANCO DE DADOS (SQL SERVER) ---
 # **MUITO IMPORTANTE:** Substitua 'NOME_DO_SEU_PC\\SQLEXPRESS' pela sua instância real!
@@ -103,13 +327,60 @@ DATABASE_NAME = 'PostadorYoutubeDB'
 # Esta string usa Autenticação do Windows. Garanta que o "ODBC Driver 17 for SQL Server" está instalado.
 CONNECTION_STRING = f"mssql+pyodbc://@{SERVER_NAME}/{DATABASE_NAME}?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes"
 
-engine = create_engine(CONNECTION_STRING)
+# --- ESCOLHA DO BANCO E POOL DE CONEXÕES (veja storage.py) ---
+# DATABASE_BACKEND=sqlite usa o arquivo SQLITE_PATH em modo WAL, sem SQL Server (as tabelas são criadas sozinhas).
+# DATABASE_URL, se definida, substitui as duas opções por qualquer URL do SQLAlchemy.
+DATABASE_BACKEND = os.getenv('DATABASE_BACKEND', 'sqlserver').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'agendamentos.db')
+DATABASE_URL = os.getenv('DATABASE_URL') or build_database_url(DATABASE_BACKEND, CONNECTION_STRING, SQLITE_PATH)
+# Conexões por processo: o pool é dividido pelas rotas do Flask, pelas threads de upload e pela thread de eventos
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))      # segundos esperando uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))    # segundos até reabrir uma conexão do SQL Server
+
+engine = create_storage_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+)
 Session = sessionmaker(bind=engine)
 Base = declarative_base() # Base para os modelos de ORM
 
+# Versão de alteração dos agendamentos: microssegundos desde 1970, sempre crescente dentro do processo.
+# Toda linha inserida ou alterada (pelo ORM ou por UPDATE direto) recebe uma versão nova,
+# o que permite ao dashboard pedir só o que mudou desde a última versão que ele viu.
+_ultima_versao = 0
+_versao_lock = threading.Lock()
+
+def next_version():
+    global _ultima_versao
+    with _versao_lock:
+        _ultima_versao = max(_ultima_versao + 1, time.time_ns() // 1000)
+        return _ultima_versao
+
+
+def to_local_naive(data):
+    """Converte datas com fuso para o horário local sem fuso, que é como o worker compara horários."""
+    if data.tzinfo is not None:
+        return data.astimezone().replace(tzinfo=None)
+    return data
+
 # Define o modelo da tabela 'agendamentos' usando SQLAlchemy ORM
 class Agendamento(Base):
     __tablename__ = 'agendamentos'
+    __table_args__ = (
+        # Usado pelo worker para recuperar agendamentos cujo lease expirou
+        Index('ix_agendamentos_status_lease', 'status', 'lease_expira_em'),
+        # Fila do worker e listagem filtrada por status, na ordem da paginação
+        Index('ix_agendamentos_status_data', 'status', 'data_agendamento', 'id'),
+        # Listagem sem filtro de status, na ordem da paginação (data_agendamento, id)
+        Index('ix_agendamentos_data_id', 'data_agendamento', 'id'),
+        # Atualizações incrementais do dashboard (since=<versao>) e ETag
+        Index('ix_agendamentos_versao', 'versao'),
+    )
     id = Column(Integer, primary_key=True)
     plataforma = Column(String(50), nullable=False)
     caminho_video = Column(String, nullable=False)
@@ -120,69 +391,191 @@ class Agendamento(Base):
     status = Column(String(50), nullable=False, default='agendado')
     id_video_postado = Column(String(100))
     mensagem_erro = Column(String)
+    # Progresso do upload em partes: permite retomar o envio se o worker cair no meio
+    upload_sessao_uri = Column(String)
+    bytes_enviados = Column(BigInteger)
+    bytes_total = Column(BigInteger)
+    taxa_upload = Column(Float) # bytes/s da última parte enviada
+    taxa_alocada = Column(Float) # fatia da banda (bytes/s) dada a este upload pelo limite de banda; vazio sem limite
+    # Novas tentativas após erros temporários: o worker só pega o agendamento depois de proxima_tentativa_em
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa_em = Column(DateTime)
+    historico_erros = Column(String) # JSON com as últimas falhas: [{"em", "tipo", "erro", "temporario"}]
+    hash_video = Column(String(64)) # SHA-256 do arquivo; o vídeo fica salvo em uploads/<hash>.<extensão>
+    # Lease do worker que está postando o vídeo: se ele parar de renovar, outro worker pode assumir
+    worker_id = Column(String(100))
+    lease_expira_em = Column(DateTime)
+    # Preenchidas automaticamente a cada inserção/alteração
+    versao = Column(BigInteger, default=next_version, onupdate=next_version)
+    atualizado_em = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    # Dentro da cota do dia, os agendamentos vencidos de maior prioridade são postados primeiro
+    prioridade = Column(Integer, nullable=False, default=0)
+    # Resultado da preparação do vídeo (media_prep.py), preenchido antes de o status virar 'agendado'
+    duracao_segundos = Column(Float)
+    codec_video = Column(String(50))
+    codec_audio = Column(String(50))
+    taxa_bits = Column(BigInteger)
+    largura = Column(Integer)
+    altura = Column(Integer)
+    moov_no_inicio = Column(Boolean)
+    preparo = Column(String(50)) # 'nenhum', 'remux' ou 'transcodificado'
+
+# Unidades da API do YouTube gastas por projeto em cada dia (no horário do Pacífico).
+# Fica no banco para que todos os workers dividam a mesma cota e ela sobreviva a reinícios.
+class CotaYoutube(Base):
+    __tablename__ = 'cota_youtube'
+    projeto = Column(String(100), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    unidades_usadas = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
 # Cria as tabelas no banco se elas ainda não existirem (apenas se for usar ORM para criar)
 # Base.metadata.create_all(engine) # Comentado, pois você já criou via SSMS, mas útil para o futuro.
+# No SQLite não há SSMS: as tabelas e os índices de __table_args__ são criados na primeira execução.
+if is_sqlite(engine):
+    Base.metadata.create_all(engine)
 
 # --- FUNÇÃO DE IA PARA GERAR CONTEÚDO ---
 def generate_ai_content(summary: str):
     """
     Usa a API Gemini para gerar título, descrição e tags a partir de um resumo.
+    Resumos repetidos são respondidos pelo cache do metadata_service, sem nova chamada à IA.
     """
-    if not GEMINI_API_KEY:
+    if not metadata_service:
         raise Exception("A chave da API Gemini não foi configurada no servidor. Verifique o arquivo .env.")
+    return metadata_service.generate(summary)
 
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    prompt = f"""
-    Você é um especialista em marketing de conteúdo para o YouTube. Sua tarefa é criar metadados otimizados para um vídeo, com base em um resumo fornecido.
-    Responda APENAS com um objeto JSON válido, sem nenhum texto ou formatação adicional antes ou depois.
+# ----------------------------------------------------------------------------
+# GERENCIADOR DE CREDENCIAIS E SERVIÇO DO YOUTUBE
+# ----------------------------------------------------------------------------
+class CredentialManager:
+    """
+    Mantém as credenciais do YouTube em memória para o processo inteiro:
+    - o token.pickle só é relido quando o arquivo muda (ex.: outro processo renovou o token);
+    - o token é renovado um pouco antes de expirar, sob um lock, para que uploads simultâneos
+      não renovem o mesmo token ao mesmo tempo;
+    - o arquivo é regravado de forma atômica (arquivo temporário + os.replace);
+    - o documento de descoberta da API é lido uma vez, e cada thread tem o seu próprio serviço
+      do YouTube com a sua conexão HTTP reaproveitada (httplib2 não é seguro entre threads).
+    """
 
-    O JSON deve ter as seguintes chaves: "title", "description", "tags".
+    def __init__(self, token_file, refresh_margin_seconds=300, http_timeout=120, api_root_url=''):
+        self.token_file = token_file
+        self.api_root_url = api_root_url
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin_seconds)
+        self.http_timeout = http_timeout
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._token_mtime = None
+        self._discovery_document = None
+        self._local = threading.local()
 
-    - "title": Crie um título magnético e otimizado para SEO, com no máximo 70 caracteres.
-    - "description": Crie uma descrição de 3 parágrafos. O primeiro resume o vídeo. O segundo detalha os pontos principais. O terceiro é uma chamada para ação (call-to-action) para se inscrever no canal e seguir nas redes sociais.
-    - "tags": Crie uma única string contendo 10 a 15 hashtags relevantes, separadas por vírgulas.
+    def _reload_if_changed(self):
+        if not os.path.exists(self.token_file):
+            self._credentials, self._token_mtime = None, None
+            return
+        mtime = os.path.getmtime(self.token_file)
+        if mtime != self._token_mtime:
+            with open(self.token_file, 'rb') as token:
+                self._credentials = pickle.load(token)
+            self._token_mtime = mtime
 
-    Resumo do vídeo:
-    ---
-    {summary}
-    ---
-    """
-    
-    response = model.generate_content(prompt)
-    
-    # Limpa a resposta para garantir que é um JSON válido
-    cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
-    
-    return json.loads(cleaned_response)
+    def _expires_soon(self, credentials):
+        # O google-auth guarda a expiração em UTC sem fuso
+        if not credentials.expiry:
+            return False
+        agora_utc = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return credentials.expiry - agora_utc < self.refresh_margin
+
+    def save(self, credentials):
+        """Grava o token de forma atômica: quem ler o arquivo nunca vê um pickle pela metade."""
+        with self._lock:
+            self._write(credentials)
+
+    def _write(self, credentials):
+        pasta = os.path.dirname(os.path.abspath(self.token_file))
+        fd, caminho_temporario = tempfile.mkstemp(prefix='.token-', dir=pasta)
+        try:
+            with os.fdopen(fd, 'wb') as token:
+                pickle.dump(credentials, token)
+            os.replace(caminho_temporario, self.token_file)
+        except Exception:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+            raise
+        self._credentials = credentials
+        self._token_mtime = os.path.getmtime(self.token_file)
+
+    def get_credentials(self):
+        """Retorna credenciais válidas (renovando se necessário) ou None se for preciso autenticar."""
+        with self._lock:
+            self._reload_if_changed()
+            credentials = self._credentials
+            if not credentials:
+                return None
+            if credentials.refresh_token and (not credentials.valid or self._expires_soon(credentials)):
+                credentials.refresh(Request())
+                self._write(credentials)
+            return credentials if credentials.valid else None
+
+    def _get_discovery_document(self):
+        # O documento de descoberta vem junto com a biblioteca; só é buscado na rede se não estiver disponível
+        if self._discovery_document is None:
+            documento = discovery_cache.get_static_doc('youtube', 'v3')
+            if documento is None:
+                documento = json.dumps(build('youtube', 'v3', credentials=self._credentials)._rootDesc)
+            if self.api_root_url:
+                # Chamadas e uploads passam a ir para outro servidor (a URL de upload é montada a partir do rootUrl)
+                descricao = json.loads(documento)
+                raiz = self.api_root_url.rstrip('/') + '/'
+                descricao['rootUrl'] = descricao['mtlsRootUrl'] = raiz
+                descricao['baseUrl'] = raiz + descricao.get('servicePath', '')
+                documento = json.dumps(descricao)
+            self._discovery_document = documento
+        return self._discovery_document
+
+    def get_service(self):
+        """Retorna o serviço do YouTube desta thread, ou None se não houver credenciais válidas."""
+        credentials = self.get_credentials()
+        if credentials is None:
+            return None
+        local = self._local
+        if getattr(local, 'credentials', None) is not credentials:
+            # build_http() tira o 308 dos redirecionamentos: no upload em partes ele é o "Resume Incomplete"
+            # do YouTube, e o httplib2 puro o trataria como redirecionamento sem Location
+            http = build_http()
+            http.timeout = self.http_timeout
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+            local.service = build_from_document(self._get_discovery_document(), http=http)
+            local.credentials = credentials
+        return local.service
+
+
+credential_manager = CredentialManager(TOKEN_FILE, api_root_url=YOUTUBE_API_ROOT_URL)
 
 # ----------------------------------------------------------------------------
 # FUNÇÃO DE AUTENTICAÇÃO DO YOUTUBE
 # ----------------------------------------------------------------------------
+class AuthenticationError(Exception):
+    """Não há credenciais do YouTube utilizáveis; é preciso autenticar de novo em /api/auth."""
+
+
 def get_authenticated_service():
     """Autentica e retorna o serviço do YouTube"""
-    credentials = None
-    
-    if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, 'rb') as token:
-            credentials = pickle.load(token)
-    
-    if not credentials or not credentials.valid:
-        if credentials and credentials.expired and credentials.refresh_token:
-            credentials.refresh(Request())
-        else:
-            if not os.path.exists(CLIENT_SECRET_FILE):
-                return None, "Arquivo client_secret.json não encontrado!"
-            
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CLIENT_SECRET_FILE, SCOPES)
-            credentials = flow.run_local_server(port=8080)
-        
-        with open(TOKEN_FILE, 'wb') as token:
-            pickle.dump(credentials, token)
-    
-    return build('youtube', 'v3', credentials=credentials), None
+    service = credential_manager.get_service()
+    if service:
+        return service, None
+
+    # Sem token válido: abre o fluxo de autorização no navegador
+    if not os.path.exists(CLIENT_SECRET_FILE):
+        return None, "Arquivo client_secret.json não encontrado!"
+
+    flow = InstalledAppFlow.from_client_secrets_file(
+        CLIENT_SECRET_FILE, SCOPES)
+    credentials = flow.run_local_server(port=8080)
+    credential_manager.save(credentials)
+
+    return credential_manager.get_service(), None
 
 # ----------------------------------------------------------------------------
 # ROTA: AUTENTICAÇÃO
@@ -208,6 +601,294 @@ def auth_status():
         return jsonify({"authenticated": True}), 200
     return jsonify({"authenticated": False}), 200
 
+# ----------------------------------------------------------------------------
+# RECEBIMENTO DO VÍDEO EM STREAMING (SEM CÓPIA DUPLA E COM DEDUPLICAÇÃO)
+# ----------------------------------------------------------------------------
+class InsufficientStorage(HTTPException):
+    """O disco chegou à reserva de espaço livre enquanto o vídeo era gravado."""
+    code = 507
+
+
+class HashingFileWriter:
+    """
+    Destino dos arquivos enviados no formulário. O Werkzeug escreve aqui cada bloco
+    do corpo da requisição assim que ele chega: o bloco vai direto para um arquivo
+    temporário dentro de uploads/ enquanto o SHA-256 é calculado, sem passar por um
+    arquivo temporário do sistema e sem segurar o vídeo na memória.
+    Com reserva_bytes, o espaço livre é conferido a cada CONFERENCIA_DISCO_BYTES gravados
+    (envios sem Content-Length não passam pela admissão antecipada).
+    """
+
+    CONFERENCIA_DISCO_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, pasta, limite_bytes, reserva_bytes=0):
+        fd, self.caminho = tempfile.mkstemp(prefix='.recebendo-', dir=pasta)
+        self._arquivo = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self.reserva_bytes = reserva_bytes
+        self._proxima_conferencia = 0
+        self.tamanho = 0
+        self.armazenado = False
+
+    def write(self, dados):
+        # Ao recusar, o arquivo parcial é apagado aqui: o Werkzeug não chega a entregar este
+        # objeto ao Flask, que então não chamaria close() no fim da requisição
+        self.tamanho += len(dados)
+        if self.tamanho > self.limite_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f"O vídeo excede o tamanho máximo de {self.limite_bytes // (1024 * 1024)} MB.")
+        if self.reserva_bytes and self.tamanho >= self._proxima_conferencia:
+            self._proxima_conferencia = self.tamanho + self.CONFERENCIA_DISCO_BYTES
+            if shutil.disk_usage(self.pasta).free - len(dados) < self.reserva_bytes:
+                self.close()
+                raise InsufficientStorage(f"Sem espaço em disco no servidor: o envio parou em "
+                                          f"{self.tamanho / 1024 ** 2:.0f} MB para preservar a reserva de "
+                                          f"{self.reserva_bytes / 1024 ** 2:.0f} MB.")
+        self._hash.update(dados)
+        return self._arquivo.write(dados)
+
+    def seek(self, *args):
+        return self._arquivo.seek(*args)
+
+    def tell(self):
+        return self._arquivo.tell()
+
+    def read(self, *args):
+        return self._arquivo.read(*args)
+
+    def finish(self):
+        """Garante que tudo foi gravado no disco e retorna o SHA-256 do conteúdo."""
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self._arquivo.close()
+        return self._hash.hexdigest()
+
+    def close(self):
+        # Chamado pelo Flask ao fim da requisição: se o arquivo não foi armazenado, é descartado
+        if not self._arquivo.closed:
+            self._arquivo.close()
+        if not self.armazenado and os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+
+class StreamingRequest(FlaskRequest):
+    """Request do Flask que grava os arquivos do formulário com o HashingFileWriter."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFileWriter(UPLOAD_FOLDER, MAX_VIDEO_BYTES, disk_manager.reserva_bytes)
+
+
+app.request_class = StreamingRequest
+
+
+def hashed_path(hash_video, nome_original):
+    """Caminho em uploads/ de um vídeo armazenado pelo conteúdo: <sha256><extensão do nome original>."""
+    extensao = os.path.splitext(secure_filename(nome_original or ''))[1].lower() or '.mp4'
+    return os.path.join(UPLOAD_FOLDER, f"{hash_video}{extensao}")
+
+
+def store_file_by_hash(caminho_origem, hash_video, nome_original, renovar=True):
+    """
+    Move um arquivo já gravado em disco para uploads/<sha256><extensão>. Se um vídeo com
+    o mesmo conteúdo já existe, o novo é descartado e o existente é reaproveitado.
+    renovar=False é para quem protege o arquivo da limpeza de outro jeito (disk_manager.protect).
+    Retorna (caminho, duplicado).
+    """
+    caminho_final = hashed_path(hash_video, nome_original)
+    duplicado = os.path.exists(caminho_final)
+    if duplicado:
+        os.remove(caminho_origem)
+        # Renova a data do arquivo para a limpeza não apagá-lo antes de o novo agendamento chegar ao banco
+        if renovar:
+            os.utime(caminho_final)
+    else:
+        os.replace(caminho_origem, caminho_final)
+    return caminho_final, duplicado
+
+
+def store_by_hash(arquivo, nome_original):
+    """
+    Armazena pelo conteúdo um vídeo recebido pelo HashingFileWriter.
+    Retorna (caminho, hash, tamanho, duplicado).
+    """
+    hash_video = arquivo.finish()
+    caminho_final, duplicado = store_file_by_hash(arquivo.caminho, hash_video, nome_original)
+    arquivo.armazenado = True
+    return caminho_final, hash_video, arquivo.tamanho, duplicado
+
+
+# Agendamentos cujo vídeo precisa continuar no disco: os que ainda vão ser postados e,
+# durante RETENCAO_FALHAS_DIAS, os que falharam e podem ser recolocados na fila
+STATUS_PENDENTES = ('preparando', 'agendado', 'processando')
+STATUS_FALHAS_RETIDAS = ('erro', 'esgotado')
+
+
+def video_retained_condition():
+    """Filtro dos agendamentos que seguram o arquivo do vídeo no disco."""
+    limite = datetime.datetime.now() - datetime.timedelta(days=RETENCAO_FALHAS_DIAS)
+    return or_(Agendamento.status.in_(STATUS_PENDENTES),
+               and_(Agendamento.status.in_(STATUS_FALHAS_RETIDAS), Agendamento.atualizado_em >= limite))
+
+
+def remove_video_if_unused(session, caminho_video):
+    """Apaga o arquivo do vídeo, a menos que outro agendamento pendente (ou falha recente) use o mesmo arquivo."""
+    ainda_em_uso = session.query(Agendamento.id).filter(
+        Agendamento.caminho_video == caminho_video,
+        video_retained_condition()
+    ).first()
+    if not ainda_em_uso and os.path.exists(caminho_video):
+        os.remove(caminho_video)
+
+# ----------------------------------------------------------------------------
+# ESPAÇO EM DISCO: ADMISSÃO DE VÍDEOS NOVOS E LIMPEZA DE uploads/
+# ----------------------------------------------------------------------------
+def pending_video_bytes(session):
+    """Soma de bytes_total dos agendamentos que ainda vão ser postados."""
+    return session.query(func.coalesce(func.sum(Agendamento.bytes_total), 0)).filter(
+        Agendamento.status.in_(STATUS_PENDENTES)
+    ).scalar()
+
+
+def check_disk_admission(tamanho, bytes_gravados=None):
+    """
+    Confere, antes de gravar qualquer byte, se um vídeo de `tamanho` bytes cabe no disco e na cota
+    de bytes pendentes. bytes_gravados, se informado, é o que ocupa espaço novo no disco (o tamanho
+    inteiro conta na cota). Retorna None se cabe, ou a mensagem para o usuário.
+    """
+    pendentes = 0
+    if disk_manager.cota_pendente_bytes:
+        session = Session()
+        try:
+            pendentes = pending_video_bytes(session) + disk_manager.session_bytes()
+        finally:
+            session.close()
+    motivo = disk_manager.check_admission(tamanho, pendentes, bytes_gravados)
+    if motivo:
+        RECUSAS_DISCO.inc()
+        log_event('envio_recusado_disco', motivo, logging.WARNING, bytes=tamanho, pendentes_bytes=pendentes)
+    return motivo
+
+
+def collect_disk_garbage():
+    """
+    Apaga de uploads/ os arquivos que nenhum agendamento segura mais (órfãos de gravações que falharam,
+    vídeos de cancelados e de falhas mais antigas que RETENCAO_FALHAS_DIAS, temporários de envios
+    interrompidos) e as sessões de envio em partes abandonadas. Chamada de tempos em tempos pelo worker.
+    Retorna o resumo de DiskManager.collect.
+    """
+    session = Session()
+    try:
+        referenciados = {caminho for (caminho,) in
+                         session.query(Agendamento.caminho_video).filter(video_retained_condition())}
+    finally:
+        session.close()
+    with span('limpeza_disco'):
+        resultado = disk_manager.collect(referenciados)
+    if resultado['arquivos'] or resultado['sessoes']:
+        LIMPEZA_DISCO_BYTES.inc(resultado['bytes'])
+        log_event('limpeza_disco', f"Limpeza de {UPLOAD_FOLDER}/: {resultado['arquivos']} arquivo(s) e "
+                  f"{resultado['sessoes']} sessão(ões) de envio apagados, {resultado['bytes'] / 1024 ** 2:.0f} MB liberados.",
+                  **resultado)
+    return resultado
+
+
+@app.route('/api/disco', methods=['GET'])
+def disk_status():
+    """Espaço livre, bytes pendentes e limites usados na admissão de vídeos novos"""
+    session = Session()
+    try:
+        return jsonify(disk_manager.usage(pending_video_bytes(session))), 200
+    except Exception as e:
+        return jsonify({"error": f"Erro ao consultar o disco: {str(e)}"}), 500
+    finally:
+        session.close()
+
+# ----------------------------------------------------------------------------
+# AVISO AO WORKER
+# ----------------------------------------------------------------------------
+def notify_worker():
+    """
+    Avisa os workers que a fila mudou, para que recarreguem os próximos horários na hora
+    em vez de esperar a próxima verificação. O aviso é um datagrama UDP sem resposta:
+    se nenhum worker estiver ouvindo, nada acontece.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as aviso:
+        for endereco in WORKER_NOTIFY_ADDRS:
+            try:
+                aviso.sendto(b'recarregar', endereco)
+            except OSError as e:
+                log_event('aviso_worker_falhou', f"Não foi possível avisar o worker em {endereco}: {e}",
+                          logging.WARNING, endereco=f"{endereco[0]}:{endereco[1]}")
+
+# ----------------------------------------------------------------------------
+# FUNÇÕES COMUNS PARA CRIAR UM AGENDAMENTO
+# ----------------------------------------------------------------------------
+def parse_schedule_fields(dados):
+    """
+    Lê os metadados do agendamento (do formulário ou de um JSON).
+    Retorna (campos, erro); se erro não for None, é a mensagem para o usuário.
+    """
+    scheduled_time_str = dados.get('scheduled_time')
+    if not scheduled_time_str:
+        return None, "Data e hora de agendamento são obrigatórias"
+    try:
+        prioridade = int(dados.get('priority') or 0)
+    except (TypeError, ValueError):
+        return None, "A prioridade precisa ser um número inteiro"
+    try:
+        scheduled_time = datetime.datetime.fromisoformat(str(scheduled_time_str).replace('Z', '+00:00'))
+    except ValueError:
+        return None, f"Data e hora de agendamento inválidas: {scheduled_time_str!r}"
+    campos = {
+        'title': dados.get('title', 'Vídeo sem título'),
+        'description': dados.get('description', ''),
+        'tags': dados.get('tags', ''), # Guarda como string separada por vírgulas
+        'scheduled_time': scheduled_time,
+        'priority': prioridade, # Maior primeiro quando a cota do YouTube não dá para todos
+    }
+    return campos, None
+
+
+def save_agendamento(campos, caminho_video, hash_video, tamanho, duplicado):
+    """
+    Cria o Agendamento de um vídeo que já está armazenado em uploads/.
+    Usada pelo envio simples e pela finalização do envio em partes. Retorna a resposta da rota.
+    """
+    session = Session()
+    try:
+        new_agendamento = Agendamento(
+            plataforma='youtube',
+            caminho_video=caminho_video,
+            titulo=campos['title'],
+            descricao=campos['description'],
+            hashtags=campos['tags'],
+            data_agendamento=campos['scheduled_time'],
+            status='agendado' if PREPARO_VIDEO == 'desligado' else 'preparando',
+            hash_video=hash_video,
+            bytes_total=tamanho,
+            prioridade=campos['priority']
+        )
+        with span('gravacao_agendamento'):
+            session.add(new_agendamento)
+            session.commit()
+        notify_worker()
+        AGENDAMENTOS_CRIADOS.inc(duplicado=str(duplicado).lower())
+        log_event('agendamento_criado', f"Agendamento {new_agendamento.id} criado: {campos['title']}",
+                  job_id=new_agendamento.id, data_agendamento=campos['scheduled_time'],
+                  caminho_video=caminho_video, bytes=tamanho, duplicado=duplicado)
+        return jsonify({"message": "Vídeo agendado com sucesso!", "id_agendamento": new_agendamento.id}), 201
+    except Exception as db_e:
+        session.rollback()
+        record_error('gravacao_agendamento', db_e)
+        log_event('agendamento_falhou', f"Erro ao salvar agendamento: {db_e}", logging.ERROR)
+        if not duplicado and os.path.exists(caminho_video):
+            os.remove(caminho_video)
+        return jsonify({"error": f"Erro ao salvar agendamento no banco de dados: {str(db_e)}"}), 500
+    finally:
+        session.close()
+
 # ----------------------------------------------------------------------------
 # ROTA: AGENDAR UPLOAD PARA O YOUTUBE (MODIFICADA)
 # ----------------------------------------------------------------------------
@@ -215,83 +896,819 @@ def auth_status():
 def schedule_youtube_post():
     """Salva o vídeo e seus metadados para agendamento futuro no YouTube"""
     temp_path = None
+    duplicado = True
     try:
+        # Confere o espaço pelo Content-Length antes de ler o formulário, que já grava o vídeo no disco.
+        # Sem Content-Length (envio chunked) só a cota é conferida aqui; a reserva de espaço livre
+        # é garantida pelo HashingFileWriter durante a gravação.
+        if request.content_length is not None:
+            motivo = check_disk_admission(request.content_length)
+        else:
+            motivo = check_disk_admission(0)
+        if motivo:
+            return jsonify({"error": motivo}), 507
         if 'video' not in request.files:
             return jsonify({"error": "Nenhum arquivo de vídeo foi enviado"}), 400
         
         video_file = request.files['video']
-        title = request.form.get('title', 'Vídeo sem título')
-        description = request.form.get('description', '')
         privacy = request.form.get('privacy', 'private')
         category = request.form.get('category', '22')
-        tags = request.form.get('tags', '') # Guarda como string separada por vírgulas
-        scheduled_time_str = request.form.get('scheduled_time')
 
         if video_file.filename == '':
             return jsonify({"error": "Arquivo inválido"}), 400
-        if not scheduled_time_str:
-            return jsonify({"error": "Data e hora de agendamento são obrigatórias"}), 400
+        campos, erro = parse_schedule_fields(request.form)
+        if erro:
+            return jsonify({"error": erro}), 400
 
-        scheduled_time = datetime.datetime.fromisoformat(scheduled_time_str.replace('Z', '+00:00'))
+        # O vídeo já foi gravado em disco durante a leitura da requisição; aqui só é movido para o nome definitivo
+        with span('armazenamento_video'):
+            temp_path, hash_video, tamanho, duplicado = store_by_hash(video_file.stream, video_file.filename)
+
+        return save_agendamento(campos, temp_path, hash_video, tamanho, duplicado)
+
+    except RequestEntityTooLarge as e:
+        return jsonify({"error": e.description}), 413
+    except InsufficientStorage as e:
+        RECUSAS_DISCO.inc()
+        log_event('envio_recusado_disco', e.description, logging.WARNING)
+        return jsonify({"error": e.description}), 507
+    except Exception as e:
+        # Só apaga o arquivo se ele foi criado por esta requisição (um vídeo reaproveitado pertence a outro agendamento)
+        if temp_path and not duplicado and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return jsonify({"error": str(e)}), 500
+
+# ----------------------------------------------------------------------------
+# ROTAS: ENVIO EM PARTES PELO NAVEGADOR (COM RETOMADA)
+# ----------------------------------------------------------------------------
+# Protocolo: POST /api/uploads inicia a sessão, PUT /api/uploads/<id>/chunks/<n> envia a parte n
+# (podem ir várias em paralelo), GET /api/uploads/<id> informa quais partes já chegaram e
+# POST /api/uploads/<id>/finalize confere o arquivo e cria o agendamento.
+def get_upload_session(upload_id):
+    """Retorna (pasta, meta) da sessão de envio, ou (None, None) se ela não existir."""
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+        return None, None
+    pasta = os.path.join(UPLOAD_SESSIONS_FOLDER, upload_id)
+    caminho_meta = os.path.join(pasta, 'meta.json')
+    if not os.path.exists(caminho_meta):
+        return None, None
+    with open(caminho_meta, 'r', encoding='utf-8') as arquivo_meta:
+        return pasta, json.load(arquivo_meta)
+
+
+def list_received_chunks(pasta):
+    """Números das partes que já foram gravadas por completo."""
+    return sorted(int(nome) for nome in os.listdir(os.path.join(pasta, 'partes')))
+
+
+def compress_ranges(numeros):
+    """Transforma [0, 1, 2, 5, 6] em [[0, 2], [5, 6]]."""
+    intervalos = []
+    for numero in numeros:
+        if intervalos and intervalos[-1][1] == numero - 1:
+            intervalos[-1][1] = numero
+        else:
+            intervalos.append([numero, numero])
+    return intervalos
+
+
+@app.route('/api/uploads', methods=['POST'])
+def init_upload_session():
+    """Inicia uma sessão de envio em partes e reserva o arquivo em disco"""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename', '')
+        size = int(data.get('size', 0))
+        if not filename or size <= 0:
+            return jsonify({"error": "Nome e tamanho do arquivo são obrigatórios"}), 400
+        if size > MAX_VIDEO_BYTES:
+            return jsonify({"error": f"O vídeo excede o tamanho máximo de {MAX_VIDEO_BYTES // (1024 * 1024)} MB."}), 413
+        motivo = check_disk_admission(size)
+        if motivo:
+            return jsonify({"error": motivo}), 507
+
+        upload_id = uuid.uuid4().hex
+        pasta = os.path.join(UPLOAD_SESSIONS_FOLDER, upload_id)
+        os.makedirs(os.path.join(pasta, 'partes'))
+        # As partes são gravadas direto na posição final, então não há etapa de juntar arquivos depois
+        with open(os.path.join(pasta, 'dados.part'), 'wb') as dados:
+            dados.truncate(size)
+
+        meta = {
+            'filename': filename,
+            'size': size,
+            'chunk_size': UPLOAD_SESSION_CHUNK_SIZE,
+            'total_chunks': (size + UPLOAD_SESSION_CHUNK_SIZE - 1) // UPLOAD_SESSION_CHUNK_SIZE,
+            'criado_em': datetime.datetime.now().isoformat(),
+        }
+        with open(os.path.join(pasta, 'meta.json'), 'w', encoding='utf-8') as arquivo_meta:
+            json.dump(meta, arquivo_meta)
+
+        log_event('sessao_envio_iniciada', f"Sessão de envio {upload_id} iniciada: {filename}",
+                  upload_id=upload_id, bytes=size, partes=meta['total_chunks'])
+        return jsonify({"upload_id": upload_id, "chunk_size": meta['chunk_size'], "total_chunks": meta['total_chunks']}), 201
+    except Exception as e:
+        return jsonify({"error": f"Erro ao iniciar envio: {str(e)}"}), 500
+
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:numero>', methods=['PUT'])
+def put_upload_chunk(upload_id, numero):
+    """Grava a parte <numero> do vídeo, lendo o corpo da requisição em blocos"""
+    pasta, meta = get_upload_session(upload_id)
+    if not meta:
+        return jsonify({"error": "Sessão de envio não encontrada"}), 404
+    if numero < 0 or numero >= meta['total_chunks']:
+        return jsonify({"error": "Número de parte inválido"}), 400
+
+    inicio = numero * meta['chunk_size']
+    esperado = min(meta['chunk_size'], meta['size'] - inicio)
+    recebido = 0
+    hash_parte = hashlib.sha256()
+    marcador = os.path.join(pasta, 'partes', str(numero))
+    try:
+        # Uma repetição da parte regrava os mesmos bytes: se ela cair no meio ou chegar corrompida,
+        # o marcador antigo não pode continuar dizendo que a parte está inteira
+        if os.path.exists(marcador):
+            os.remove(marcador)
+        with open(os.path.join(pasta, 'dados.part'), 'r+b') as dados:
+            dados.seek(inicio)
+            while True:
+                bloco = request.stream.read(1024 * 1024)
+                if not bloco:
+                    break
+                recebido += len(bloco)
+                if recebido > esperado:
+                    return jsonify({"error": "A parte é maior que o esperado"}), 400
+                hash_parte.update(bloco)
+                dados.write(bloco)
+            dados.flush()
+            os.fsync(dados.fileno())
+    except Exception as e:
+        return jsonify({"error": f"Erro ao gravar a parte {numero}: {str(e)}"}), 500
+
+    if recebido != esperado:
+        return jsonify({"error": f"Parte incompleta: recebidos {recebido} de {esperado} bytes"}), 400
+    # Conferência opcional de integridade enviada pelo navegador
+    hash_informado = request.headers.get('X-Chunk-Sha256')
+    if hash_informado and hash_informado.lower() != hash_parte.hexdigest():
+        return jsonify({"error": "A parte chegou corrompida (SHA-256 diferente)"}), 400
+
+    # A parte só conta como recebida depois de estar inteira no disco
+    open(marcador, 'wb').close()
+    return jsonify({"chunk": numero, "bytes": recebido}), 200
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload_status(upload_id):
+    """Informa quais partes da sessão já foram recebidas, para o navegador retomar o envio"""
+    pasta, meta = get_upload_session(upload_id)
+    if not meta:
+        return jsonify({"error": "Sessão de envio não encontrada"}), 404
+    recebidas = list_received_chunks(pasta)
+    return jsonify({
+        "upload_id": upload_id,
+        "chunk_size": meta['chunk_size'],
+        "total_chunks": meta['total_chunks'],
+        "received_ranges": compress_ranges(recebidas),
+        "missing_chunks": meta['total_chunks'] - len(recebidas),
+    }), 200
 
-        temp_path = os.path.join(UPLOAD_FOLDER, video_file.filename)
-        video_file.save(temp_path)
-        
-        print(f"📹 Arquivo salvo temporariamente para agendamento: {temp_path}")
-        print(f"📝 Título: {title}")
-        print(f"⏰ Agendado para: {scheduled_time}")
 
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session(upload_id):
+    """Confere se todas as partes chegaram, armazena o vídeo pelo hash e cria o agendamento"""
+    pasta, meta = get_upload_session(upload_id)
+    if not meta:
+        return jsonify({"error": "Sessão de envio não encontrada"}), 404
+    try:
+        campos, erro = parse_schedule_fields(request.get_json(silent=True) or request.form)
+        if erro:
+            return jsonify({"error": erro}), 400
+
+        faltando = meta['total_chunks'] - len(list_received_chunks(pasta))
+        if faltando:
+            return jsonify({"error": f"Ainda faltam {faltando} partes do vídeo"}), 409
+
+        caminho_dados = os.path.join(pasta, 'dados.part')
+        with span('armazenamento_video'):
+            hash_video = hashlib.sha256()
+            with open(caminho_dados, 'rb') as dados:
+                for bloco in iter(lambda: dados.read(1024 * 1024), b''):
+                    hash_video.update(bloco)
+            caminho_video, duplicado = store_file_by_hash(caminho_dados, hash_video.hexdigest(), meta['filename'])
+        shutil.rmtree(pasta, ignore_errors=True)
+
+        return save_agendamento(campos, caminho_video, hash_video.hexdigest(), meta['size'], duplicado)
+    except Exception as e:
+        return jsonify({"error": f"Erro ao finalizar envio: {str(e)}"}), 500
+
+# ----------------------------------------------------------------------------
+# ROTA: AGENDAMENTO EM LOTE (MANIFESTO CSV/JSON LINES OU PASTA DO SERVIDOR)
+# ----------------------------------------------------------------------------
+# O lote pode vir como um arquivo 'manifest' no formulário, como o próprio manifesto no corpo
+# (Content-Type text/csv ou application/x-ndjson) ou como um JSON com 'items' (lista de objetos)
+# ou 'directory' (pasta dentro de IMPORT_FOLDER). Todas as linhas são validadas antes de qualquer
+# gravação: se uma falhar, nada é agendado e a resposta traz o erro de cada linha.
+VALORES_VERDADEIROS = ('1', 'true', 'sim', 'yes', 'on')
+
+
+def read_bulk_request():
+    """Lê o lote da requisição. Retorna (linhas, opcoes), onde linhas é a lista de (numero, dicionário)."""
+    if request.is_json:
+        dados = request.get_json(silent=True)
+        if not isinstance(dados, dict):
+            raise ManifestError("O corpo JSON precisa ser um objeto com 'items' ou 'directory'")
+        opcoes = {**request.args.to_dict(), **dados}
+        if dados.get('directory'):
+            return directory_rows(opcoes), opcoes
+        return parse_items(dados.get('items')), opcoes
+
+    opcoes = {**request.args.to_dict(), **request.form.to_dict()}
+    arquivo = request.files.get('manifest')
+    if arquivo:
+        arquivo.stream.seek(0)
+        conteudo, nome, tipo = arquivo.stream.read(), arquivo.filename, arquivo.content_type or ''
+    else:
+        conteudo, nome, tipo = request.get_data(), '', request.content_type or ''
+    try:
+        texto = conteudo.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ManifestError("O manifesto precisa estar em UTF-8")
+    return parse_manifest(texto, opcoes.get('format') or detect_format(nome, tipo, texto)), opcoes
+
+
+def directory_rows(opcoes):
+    """
+    Uma linha por vídeo da pasta, em ordem alfabética, com o nome do arquivo como título.
+    O primeiro vídeo fica em 'scheduled_time' e os seguintes a cada 'interval_minutes' (padrão: 1 dia).
+    """
+    pasta = resolve_server_path(IMPORT_FOLDER, str(opcoes['directory']))
+    if not pasta or not os.path.isdir(pasta):
+        raise ManifestError(f"Pasta não encontrada dentro de {IMPORT_FOLDER}: {opcoes['directory']!r}")
+    campos, erro = parse_schedule_fields(opcoes)
+    if erro:
+        raise ManifestError(erro)
+    try:
+        intervalo = float(opcoes.get('interval_minutes', 1440))
+    except (TypeError, ValueError):
+        raise ManifestError("'interval_minutes' precisa ser um número")
+    if intervalo < 0:
+        raise ManifestError("'interval_minutes' não pode ser negativo")
+
+    nomes = list_videos(pasta)
+    if not nomes:
+        raise ManifestError(f"Nenhum vídeo encontrado em {opcoes['directory']!r}")
+    base = os.path.realpath(IMPORT_FOLDER)
+    return parse_items([
+        {
+            'file': os.path.relpath(os.path.join(pasta, nome), base),
+            'title': os.path.splitext(nome)[0],
+            'description': opcoes.get('description'),
+            'tags': opcoes.get('tags'),
+            'priority': opcoes.get('priority'),
+            'scheduled_time': (campos['scheduled_time'] + datetime.timedelta(minutes=intervalo * i)).isoformat(),
+        }
+        for i, nome in enumerate(nomes)
+    ])
+
+
+def validate_bulk_row(linha, gerar_metadados):
+    """
+    Confere uma linha do lote sem gravar nada. Retorna (item, erro); o item tem os campos do
+    agendamento, o caminho do vídeo na pasta de importação e o resumo a enviar para a IA (ou None).
+    """
+    referencia = linha.get('file')
+    if not referencia:
+        return None, "A coluna 'file' é obrigatória"
+    caminho = resolve_server_path(IMPORT_FOLDER, str(referencia))
+    if not caminho:
+        return None, f"O arquivo precisa estar dentro da pasta de importação ({IMPORT_FOLDER})"
+    if not os.path.isfile(caminho):
+        return None, f"Arquivo não encontrado: {referencia}"
+    if os.path.splitext(caminho)[1].lower() not in EXTENSOES_VIDEO:
+        return None, f"Extensão de vídeo não suportada: {referencia}"
+    tamanho = os.path.getsize(caminho)
+    if tamanho == 0:
+        return None, f"Arquivo vazio: {referencia}"
+    if tamanho > MAX_VIDEO_BYTES:
+        return None, f"O vídeo excede o tamanho máximo de {MAX_VIDEO_BYTES // (1024 * 1024)} MB."
+
+    campos, erro = parse_schedule_fields(linha)
+    if erro:
+        return None, erro
+    if len(campos['title']) > 100:
+        return None, "O título passa de 100 caracteres (limite do YouTube)"
+
+    resumo = None
+    if gerar_metadados and 'title' not in linha:
+        resumo = linha.get('summary')
+        if not resumo:
+            return None, "Linha sem título: informe 'summary' para gerar os metadados com IA"
+    return {'campos': campos, 'caminho': caminho, 'tamanho': tamanho, 'resumo': resumo}, None
+
+
+def import_server_file(caminho_origem, protecao):
+    """
+    Traz um vídeo da pasta de importação para uploads/ sem copiar os bytes: cria um hard link
+    (o original continua onde estava e o espaço em disco não dobra) e calcula o SHA-256 lendo o arquivo.
+    Se o link não for possível (pastas em sistemas de arquivos diferentes, por exemplo), copia
+    calculando o hash durante a cópia. Retorna (caminho, hash, tamanho, duplicado).
+    O link e o arquivo final são registrados em `protecao` (disk_manager.protect): com a data do
+    original, a limpeza os apagaria antes de o lote chegar ao banco. A data não é renovada com
+    os.utime porque o link é o mesmo arquivo do original.
+    Como o link é o próprio arquivo, regravar o original no mesmo nome (ffmpeg -y, por exemplo)
+    muda o vídeo armazenado sem mudar o hash; só o README avisa, não há como detectar aqui.
+    """
+    nome_original = os.path.basename(caminho_origem)
+    caminho_link = os.path.join(UPLOAD_FOLDER, f".importando-{uuid.uuid4().hex}")
+    protecao.add(caminho_link)
+    try:
+        os.link(caminho_origem, caminho_link)
+    except OSError:
+        destino = HashingFileWriter(UPLOAD_FOLDER, MAX_VIDEO_BYTES)
+        try:
+            with open(caminho_origem, 'rb') as origem:
+                for bloco in iter(lambda: origem.read(1024 * 1024), b''):
+                    destino.write(bloco)
+            # A cópia é um arquivo novo, com a data de agora: basta registrá-la depois de armazenada
+            armazenado = store_by_hash(destino, nome_original)
+            protecao.add(armazenado[0])
+            return armazenado
+        finally:
+            destino.close()
+    try:
+        tamanho = os.path.getsize(caminho_link)
+        hash_video = file_sha256(caminho_link)
+        protecao.add(hashed_path(hash_video, nome_original))
+        caminho_final, duplicado = store_file_by_hash(caminho_link, hash_video, nome_original, renovar=False)
+    except Exception:
+        if os.path.exists(caminho_link):
+            os.remove(caminho_link)
+        raise
+    return caminho_final, hash_video, tamanho, duplicado
+
+
+def queue_metadata_generation(pendentes):
+    """
+    Gera em segundo plano, pelo metadata_service, os metadados das linhas do lote sem título.
+    pendentes: lista de (id do agendamento, resumo, colunas informadas no manifesto). O título é
+    sempre substituído; descrição e tags, só se não vieram no manifesto. Agendamentos que já
+    foram postados (ou deram erro) antes de a IA responder ficam como estão.
+    """
+    def gerar():
+        resultados = metadata_service.generate_batch([resumo for _, resumo, _ in pendentes])
         session = Session()
         try:
-            new_agendamento = Agendamento(
-                plataforma='youtube',
-                caminho_video=temp_path,
-                titulo=title,
-                descricao=description,
-                hashtags=tags,
-                data_agendamento=scheduled_time,
-                status='agendado'
-            )
-            session.add(new_agendamento)
+            for (agendamento_id, _, informados), resultado in zip(pendentes, resultados):
+                if not resultado['ok']:
+                    log_event('metadados_lote_falhou', f"IA não gerou os metadados do agendamento {agendamento_id}: "
+                              f"{resultado['error']}", logging.WARNING, job_id=agendamento_id)
+                    continue
+                valores = {'titulo': resultado['title'] or 'Vídeo sem título'}
+                if 'description' not in informados:
+                    valores['descricao'] = resultado['description']
+                if 'tags' not in informados:
+                    valores['hashtags'] = resultado['tags']
+                session.execute(
+                    update(Agendamento)
+                    .where(Agendamento.id == agendamento_id,
+                           Agendamento.status.in_(('preparando', 'agendado')))
+                    .values(**valores)
+                )
             session.commit()
-            return jsonify({"message": "Vídeo agendado com sucesso!", "id_agendamento": new_agendamento.id}), 201
-        except Exception as db_e:
+        except Exception as e:
             session.rollback()
-            return jsonify({"error": f"Erro ao salvar agendamento no banco de dados: {str(db_e)}"}), 500
+            record_error('metadados_lote', e)
+            log_event('metadados_lote_falhou', f"Erro ao gravar os metadados do lote: {e}", logging.ERROR)
         finally:
             session.close()
 
-    except Exception as e:
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
-        return jsonify({"error": str(e)}), 500
+    threading.Thread(target=gerar, name='ia-lote', daemon=True).start()
+
+
+@app.route('/api/schedule/youtube/bulk', methods=['POST'])
+def schedule_youtube_bulk():
+    """Agenda vários vídeos de uma vez a partir de um manifesto ou de uma pasta do servidor"""
+    try:
+        linhas, opcoes = read_bulk_request()
+    except ManifestError as e:
+        return jsonify({"error": str(e)}), 400
+    except RequestEntityTooLarge as e:
+        return jsonify({"error": e.description}), 413
+    if not linhas:
+        return jsonify({"error": "O manifesto não tem nenhuma linha"}), 400
+    if len(linhas) > BULK_MAX_ROWS:
+        return jsonify({"error": f"Envie no máximo {BULK_MAX_ROWS} vídeos por lote."}), 400
+    gerar_metadados = str(opcoes.get('generate_metadata', '')).lower() in VALORES_VERDADEIROS
+    if gerar_metadados and not metadata_service:
+        return jsonify({"error": "A chave da API Gemini não foi configurada no servidor. Verifique o arquivo .env."}), 400
+
+    resultados = []
+    validas = []
+    with span('validacao_lote', linhas=len(linhas)):
+        for numero, linha in linhas:
+            item, erro = validate_bulk_row(linha, gerar_metadados)
+            resultado = {"linha": numero, "file": linha.get('file'), "ok": erro is None}
+            if erro:
+                resultado["error"] = erro
+            else:
+                item['informados'] = set(linha)
+                validas.append((resultado, item))
+            resultados.append(resultado)
+    if len(validas) < len(linhas):
+        return jsonify({
+            "error": f"{len(linhas) - len(validas)} de {len(linhas)} linhas têm erros; nenhum vídeo foi agendado.",
+            "resultados": resultados,
+        }), 400
+    # Só ocupam espaço novo os vídeos de outro disco: os do mesmo disco entram por hard link
+    dispositivo_uploads = os.stat(UPLOAD_FOLDER).st_dev
+    copiados = sum(item['tamanho'] for _, item in validas if os.stat(item['caminho']).st_dev != dispositivo_uploads)
+    motivo = check_disk_admission(sum(item['tamanho'] for _, item in validas), bytes_gravados=copiados)
+    if motivo:
+        return jsonify({"error": motivo}), 507
+
+    criados = []  # Arquivos novos em uploads/, apagados se a gravação no banco falhar
+    session = Session()
+    try:
+        with span('armazenamento_video', linhas=len(validas)), disk_manager.protect() as protecao:
+            for resultado, item in validas:
+                caminho_video, hash_video, tamanho, duplicado = import_server_file(item['caminho'], protecao)
+                if not duplicado:
+                    criados.append(caminho_video)
+                item['agendamento'] = Agendamento(
+                    plataforma='youtube',
+                    caminho_video=caminho_video,
+                    titulo=item['campos']['title'],
+                    descricao=item['campos']['description'],
+                    hashtags=item['campos']['tags'],
+                    data_agendamento=item['campos']['scheduled_time'],
+                    status='agendado' if PREPARO_VIDEO == 'desligado' else 'preparando',
+                    hash_video=hash_video,
+                    bytes_total=tamanho,
+                    prioridade=item['campos']['priority']
+                )
+                resultado["duplicado"] = duplicado
+
+        # Todas as linhas em uma única transação; os ids são lidos antes do commit para não recarregar cada linha
+        with span('gravacao_agendamento', linhas=len(validas)):
+            session.add_all([item['agendamento'] for _, item in validas])
+            session.flush()
+            for resultado, item in validas:
+                resultado["id_agendamento"] = item['agendamento'].id
+            session.commit()
+    except Exception as db_e:
+        session.rollback()
+        record_error('gravacao_agendamento', db_e)
+        log_event('lote_falhou', f"Erro ao salvar o lote de agendamentos: {db_e}", logging.ERROR, linhas=len(validas))
+        for caminho_video in criados:
+            if os.path.exists(caminho_video):
+                os.remove(caminho_video)
+        return jsonify({"error": f"Erro ao salvar agendamentos no banco de dados: {str(db_e)}"}), 500
+    finally:
+        session.close()
+
+    notify_worker()
+    pendentes = []
+    for resultado, item in validas:
+        AGENDAMENTOS_CRIADOS.inc(duplicado=str(resultado["duplicado"]).lower())
+        if item['resumo']:
+            resultado["metadados"] = 'na_fila'
+            pendentes.append((resultado["id_agendamento"], item['resumo'], item['informados']))
+    if pendentes:
+        queue_metadata_generation(pendentes)
+    log_event('lote_agendado', f"{len(validas)} agendamentos criados em lote", linhas=len(validas),
+              duplicados=sum(1 for resultado, _ in validas if resultado["duplicado"]), metadados_ia=len(pendentes))
+    return jsonify({"message": f"{len(validas)} vídeos agendados com sucesso!", "resultados": resultados}), 201
 
 # ----------------------------------------------------------------------------
 # ROTA: LISTAR AGENDAMENTOS
 # ----------------------------------------------------------------------------
+# Apenas as colunas devolvidas pela listagem (a descrição, que pode ser grande, fica de fora)
+LISTING_COLUMNS = (
+    Agendamento.id,
+    Agendamento.plataforma,
+    Agendamento.titulo,
+    Agendamento.data_agendamento,
+    Agendamento.status,
+    Agendamento.id_video_postado,
+    Agendamento.mensagem_erro,
+    Agendamento.bytes_enviados,
+    Agendamento.bytes_total,
+    Agendamento.taxa_upload,
+    Agendamento.taxa_alocada,
+    Agendamento.tentativas,
+    Agendamento.proxima_tentativa_em,
+    Agendamento.versao,
+    Agendamento.prioridade,
+)
+LISTING_DEFAULT_LIMIT = 100
+LISTING_MAX_LIMIT = 500
+# Transações que começaram antes podem gravar uma versão menor depois que uma maior já foi lida.
+# Por isso as consultas incrementais voltam esta janela (em microssegundos) e o cliente ignora repetidos.
+DELTA_WINDOW_MICROS = 5 * 1_000_000
+DELTA_MAX_ROWS = 1000
+
+
+def serialize_agendamento(agendamento):
+    """Converte uma linha da listagem (LISTING_COLUMNS) no JSON devolvido ao dashboard."""
+    return {
+        'id': agendamento.id,
+        'plataforma': agendamento.plataforma,
+        'titulo': agendamento.titulo,
+        'data_agendamento': agendamento.data_agendamento.isoformat(),
+        'status': agendamento.status,
+        'id_video_postado': agendamento.id_video_postado,
+        'mensagem_erro': agendamento.mensagem_erro,
+        'bytes_enviados': agendamento.bytes_enviados,
+        'bytes_total': agendamento.bytes_total,
+        'taxa_upload': agendamento.taxa_upload,
+        'taxa_alocada': agendamento.taxa_alocada,
+        'tentativas': agendamento.tentativas,
+        'proxima_tentativa_em': agendamento.proxima_tentativa_em.isoformat() if agendamento.proxima_tentativa_em else None,
+        'versao': agendamento.versao,
+        'prioridade': agendamento.prioridade
+    }
+
+
+def query_changed_since(session, versao, janela=True):
+    """
+    Linhas alteradas depois de `versao` (com a janela de segurança), em ordem de versão, no máximo
+    DELTA_MAX_ROWS. Retorna (linhas, mais). Com mais=True a resposta foi cortada: a próxima consulta
+    continua de linhas[-1].versao com janela=False, senão a janela devolveria as mesmas linhas outra vez.
+    """
+    limite_inferior = versao - DELTA_WINDOW_MICROS if janela else versao
+    linhas = session.query(*LISTING_COLUMNS).filter(
+        Agendamento.versao > limite_inferior
+    ).order_by(Agendamento.versao.asc()).limit(DELTA_MAX_ROWS + 1).all()
+    if len(linhas) <= DELTA_MAX_ROWS:
+        return linhas, False
+    # Linhas com a mesma versão da primeira que ficou de fora saem juntas, para a continuação não pulá-las
+    corte = linhas[DELTA_MAX_ROWS].versao
+    return [linha for linha in linhas[:DELTA_MAX_ROWS] if linha.versao < corte] or linhas[:DELTA_MAX_ROWS], True
+
+
+def parse_listing_cursor(cursor):
+    """O cursor é '<data_agendamento ISO>|<id>' do último item da página anterior."""
+    data_texto, id_texto = cursor.rsplit('|', 1)
+    return datetime.datetime.fromisoformat(data_texto), int(id_texto)
+
+
 @app.route('/api/agendamentos', methods=['GET'])
 def list_agendamentos():
-    """Lista todos os agendamentos no banco de dados"""
+    """
+    Lista os agendamentos em páginas, ordenados por (data_agendamento, id).
+    Parâmetros opcionais: limit, cursor (devolvido como proximo_cursor na página anterior),
+    status (um ou mais, separados por vírgula), de e ate (datas ISO).
+    Com since=<versao>, devolve apenas as linhas alteradas depois dessa versão. Se forem mais que
+    DELTA_MAX_ROWS, a resposta vem com mais=true e versao da última linha entregue; o cliente
+    continua com since=<versao>&continuar=1 até mais=false.
+    Responde 304 se o If-None-Match ainda corresponde à versão atual da tabela.
+    """
+    try:
+        since = request.args.get('since')
+        since = int(since) if since else None
+        continuar = request.args.get('continuar') == '1'
+        limit = min(max(int(request.args.get('limit', LISTING_DEFAULT_LIMIT)), 1), LISTING_MAX_LIMIT)
+        status = [s.strip() for s in request.args.get('status', '').split(',') if s.strip()]
+        de = request.args.get('de')
+        ate = request.args.get('ate')
+        cursor = request.args.get('cursor')
+        de = datetime.datetime.fromisoformat(de) if de else None
+        ate = datetime.datetime.fromisoformat(ate) if ate else None
+        cursor = parse_listing_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": f"Parâmetro inválido: {str(e)}"}), 400
+
     session = Session()
     try:
-        agendamentos = session.query(Agendamento).order_by(Agendamento.data_agendamento.asc()).all()
-        agendamentos_list = []
-        for agendamento in agendamentos:
-            agendamentos_list.append({
-                'id': agendamento.id,
-                'plataforma': agendamento.plataforma,
-                'titulo': agendamento.titulo,
-                'data_agendamento': agendamento.data_agendamento.isoformat(),
-                'status': agendamento.status,
-                'id_video_postado': agendamento.id_video_postado,
-                'mensagem_erro': agendamento.mensagem_erro
-            })
-        return jsonify({"agendamentos": agendamentos_list}), 200
+        # A versão mais alta identifica o estado atual da tabela; vem do índice, sem ler as linhas
+        versao_atual = session.query(func.max(Agendamento.versao)).scalar() or 0
+        etag = hashlib.sha1(f"{versao_atual}?{request.query_string.decode()}".encode()).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers={'ETag': f'W/"{etag}"'})
+
+        if since is not None:
+            linhas, mais = query_changed_since(session, since, janela=not continuar)
+            resposta = jsonify({"agendamentos": [serialize_agendamento(linha) for linha in linhas],
+                                "versao": linhas[-1].versao if mais else versao_atual, "mais": mais})
+            resposta.set_etag(etag, weak=True)
+            return resposta, 200
+
+        query = session.query(*LISTING_COLUMNS)
+        if status:
+            query = query.filter(Agendamento.status.in_(status))
+        if de:
+            query = query.filter(Agendamento.data_agendamento >= de)
+        if ate:
+            query = query.filter(Agendamento.data_agendamento <= ate)
+        if cursor:
+            # Paginação por chave: continua logo depois do último item visto, sem OFFSET
+            cursor_data, cursor_id = cursor
+            query = query.filter(or_(
+                Agendamento.data_agendamento > cursor_data,
+                and_(Agendamento.data_agendamento == cursor_data, Agendamento.id > cursor_id)
+            ))
+        # Busca um item a mais só para saber se existe próxima página
+        linhas = query.order_by(Agendamento.data_agendamento.asc(), Agendamento.id.asc()).limit(limit + 1).all()
+
+        proximo_cursor = None
+        if len(linhas) > limit:
+            linhas = linhas[:limit]
+            proximo_cursor = f"{linhas[-1].data_agendamento.isoformat()}|{linhas[-1].id}"
+
+        agendamentos_list = [serialize_agendamento(linha) for linha in linhas]
+        resposta = jsonify({"agendamentos": agendamentos_list, "proximo_cursor": proximo_cursor, "versao": versao_atual})
+        resposta.set_etag(etag, weak=True)
+        return resposta, 200
     except Exception as e:
         return jsonify({"error": f"Erro ao buscar agendamentos: {str(e)}"}), 500
     finally:
         session.close()
 
+# ----------------------------------------------------------------------------
+# ROTAS: RECOLOCAR NA FILA E CANCELAR AGENDAMENTOS
+# ----------------------------------------------------------------------------
+# Status a partir dos quais cada ação é permitida. As mudanças são UPDATEs condicionais,
+# como a reserva do worker, então não há corrida com um worker pegando o mesmo agendamento.
+STATUS_RECOLOCAVEIS = ('erro', 'esgotado', 'cancelado')
+STATUS_CANCELAVEIS = ('preparando', 'agendado', 'processando', 'erro', 'esgotado')
+
+
+@app.route('/api/agendamentos/<int:agendamento_id>/requeue', methods=['POST'])
+def requeue_agendamento(agendamento_id):
+    """
+    Devolve para a fila um agendamento com erro, esgotado ou cancelado, zerando as tentativas.
+    Um vídeo que ainda não passou pela preparação (cancelado enquanto 'preparando', por exemplo)
+    volta para 'preparando' em vez de ir direto para o upload.
+    """
+    session = Session()
+    try:
+        atual = session.query(Agendamento.caminho_video, Agendamento.preparo).filter(
+            Agendamento.id == agendamento_id).first()
+        if atual is None:
+            return jsonify({"error": "Agendamento não encontrado"}), 404
+        if not os.path.exists(atual.caminho_video):
+            return jsonify({"error": "O arquivo do vídeo não existe mais; agende o vídeo de novo"}), 409
+        # preparo só é gravado quando a análise termina; sem ele o vídeo nunca foi preparado
+        novo_status = 'preparando' if PREPARO_VIDEO != 'desligado' and atual.preparo is None else 'agendado'
+        resultado = session.execute(
+            update(Agendamento)
+            .where(Agendamento.id == agendamento_id, Agendamento.status.in_(STATUS_RECOLOCAVEIS))
+            .values(status=novo_status, tentativas=0, proxima_tentativa_em=None, mensagem_erro=None,
+                    worker_id=None, lease_expira_em=None)
+        )
+        session.commit()
+        if resultado.rowcount != 1:
+            return jsonify({"error": f"Só é possível recolocar na fila agendamentos com status {', '.join(STATUS_RECOLOCAVEIS)}"}), 409
+        notify_worker()
+        log_event('agendamento_recolocado', f"Agendamento {agendamento_id} recolocado na fila.", job_id=agendamento_id,
+                  status=novo_status)
+        return jsonify({"message": "Agendamento recolocado na fila!", "id_agendamento": agendamento_id, "status": novo_status}), 200
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": f"Erro ao recolocar agendamento na fila: {str(e)}"}), 500
+    finally:
+        session.close()
+
+
+@app.route('/api/agendamentos/<int:agendamento_id>/cancel', methods=['POST'])
+def cancel_agendamento(agendamento_id):
+    """
+    Cancela um agendamento que ainda não foi postado. Um upload em andamento para na próxima parte:
+    o worker percebe que o agendamento não é mais dele, como quando perde o lease.
+    """
+    session = Session()
+    try:
+        atual = session.query(Agendamento.status, Agendamento.worker_id, Agendamento.caminho_video).filter(
+            Agendamento.id == agendamento_id).first()
+        if atual is None:
+            return jsonify({"error": "Agendamento não encontrado"}), 404
+        resultado = session.execute(
+            update(Agendamento)
+            .where(Agendamento.id == agendamento_id, Agendamento.status.in_(STATUS_CANCELAVEIS))
+            .values(status='cancelado', proxima_tentativa_em=None, upload_sessao_uri=None,
+                    worker_id=None, lease_expira_em=None, mensagem_erro="Cancelado pelo usuário.")
+        )
+        session.commit()
+        if resultado.rowcount != 1:
+            return jsonify({"error": f"Só é possível cancelar agendamentos com status {', '.join(STATUS_CANCELAVEIS)}"}), 409
+        # Enquanto um worker ainda usa o arquivo (enviando ou preparando), ele fica no disco
+        if not atual.worker_id:
+            remove_video_if_unused(session, atual.caminho_video)
+        notify_worker()
+        log_event('agendamento_cancelado', f"Agendamento {agendamento_id} cancelado.", job_id=agendamento_id,
+                  status_anterior=atual.status)
+        return jsonify({"message": "Agendamento cancelado!", "id_agendamento": agendamento_id, "status": 'cancelado'}), 200
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": f"Erro ao cancelar agendamento: {str(e)}"}), 500
+    finally:
+        session.close()
+
+# ----------------------------------------------------------------------------
+# ROTA: EVENTOS EM TEMPO REAL (SERVER-SENT EVENTS)
+# ----------------------------------------------------------------------------
+class AgendamentoEventBroadcaster:
+    """
+    Uma única thread por processo consulta a versão mais alta da tabela a cada segundo e,
+    quando ela muda, busca só as linhas alteradas e as repassa para todos os dashboards
+    conectados. Assim, mudanças feitas pelo worker (status e progresso do upload) chegam
+    ao navegador sem que cada conexão consulte o banco por conta própria.
+    """
+
+    INTERVALO_SEGUNDOS = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinantes = set()
+        self._thread = None
+        self._ultima_versao = None
+        self._continuar = False # a última consulta foi cortada em DELTA_MAX_ROWS e ainda há linhas
+        self._enviadas = {} # id -> versão já enviada, para não repetir linhas da janela de segurança
+
+    def subscribe(self):
+        fila = queue.Queue(maxsize=1000)
+        with self._lock:
+            self._assinantes.add(fila)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='eventos-agendamentos', daemon=True)
+                self._thread.start()
+        return fila
+
+    def unsubscribe(self, fila):
+        with self._lock:
+            self._assinantes.discard(fila)
+
+    def _run(self):
+        while True:
+            if not self._continuar:
+                time.sleep(self.INTERVALO_SEGUNDOS)
+            with self._lock:
+                sem_assinantes = not self._assinantes
+            if sem_assinantes:
+                # Sem ninguém ouvindo a continuação perde o sentido; a próxima volta recomeça com a janela
+                self._continuar = False
+                continue
+            session = Session()
+            try:
+                versao_atual = session.query(func.max(Agendamento.versao)).scalar() or 0
+                if self._ultima_versao is None:
+                    self._ultima_versao = versao_atual
+                    continue
+                if versao_atual == self._ultima_versao:
+                    continue
+                linhas, self._continuar = query_changed_since(session, self._ultima_versao, janela=not self._continuar)
+                # Cortada, a consulta só avança até a última linha entregue; o resto vem na próxima volta
+                self._ultima_versao = linhas[-1].versao if self._continuar else versao_atual
+            except Exception as e:
+                record_error('eventos', e)
+                log_event('eventos_falhou', f"Erro ao buscar eventos dos agendamentos: {e}", logging.ERROR)
+                # Volta ao intervalo normal: repetir na hora só martelaria o banco e o log de erros
+                self._continuar = False
+                continue
+            finally:
+                session.close()
+
+            novas = [linha for linha in linhas if self._enviadas.get(linha.id) != linha.versao]
+            for linha in novas:
+                self._enviadas[linha.id] = linha.versao
+            if len(self._enviadas) > 10 * DELTA_MAX_ROWS:
+                self._enviadas.clear()
+            with self._lock:
+                assinantes = list(self._assinantes)
+            for linha in novas:
+                evento = serialize_agendamento(linha)
+                for fila in assinantes:
+                    try:
+                        fila.put_nowait(evento)
+                    except queue.Full:
+                        pass # dashboard lento: ele se recupera com since=<versao> ao reconectar
+
+
+event_broadcaster = AgendamentoEventBroadcaster()
+
+
+@app.route('/api/agendamentos/eventos', methods=['GET'])
+def stream_agendamento_events():
+    """Envia ao dashboard, via Server-Sent Events, cada agendamento que mudar de status ou de progresso"""
+    fila = event_broadcaster.subscribe()
+
+    def gerar():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento = fila.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n" # mantém a conexão aberta em proxies
+                    continue
+                yield f"id: {evento['versao']}\nevent: agendamento\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            event_broadcaster.unsubscribe(fila)
+
+    return Response(gerar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ----------------------------------------------------------------------------
 # ROTA: SERVIR O FRONTEND
 # ----------------------------------------------------------------------------
@@ -301,6 +1718,11 @@ def index():
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     return send_from_directory('.', 'index.html')
 
+@app.route('/Script.js')
+def script():
+    """Serve o JavaScript do dashboard"""
+    return send_from_directory('.', 'Script.js')
+
 # --- NOVA ROTA PARA A IA ---
 @app.route('/api/generate-content', methods=['POST'])
 def handle_generate_content():
@@ -317,33 +1739,605 @@ def handle_generate_content():
     except Exception as e:
         return jsonify({"error": f"Erro ao gerar conteúdo com IA: {str(e)}"}), 500
 
+@app.route('/api/generate-content/batch', methods=['POST'])
+def handle_generate_content_batch():
+    """Gera metadados para vários resumos em uma chamada, respeitando os limites de concorrência e de tokens"""
+    try:
+        data = request.get_json(silent=True)
+        summaries = data.get('summaries') if data else None
+        if not isinstance(summaries, list) or not summaries:
+            return jsonify({"error": "A lista de resumos (summaries) é obrigatória."}), 400
+        if len(summaries) > GEMINI_MAX_LOTE:
+            return jsonify({"error": f"Envie no máximo {GEMINI_MAX_LOTE} resumos por vez."}), 400
+        if not all(isinstance(summary, str) and summary.strip() for summary in summaries):
+            return jsonify({"error": "Todos os resumos precisam ser textos não vazios."}), 400
+        if not metadata_service:
+            raise Exception("A chave da API Gemini não foi configurada no servidor. Verifique o arquivo .env.")
+
+        return jsonify({"resultados": metadata_service.generate_batch(summaries)}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Erro ao gerar conteúdo com IA: {str(e)}"}), 500
+
+# ----------------------------------------------------------------------------
+# COTA DIÁRIA DA API DO YOUTUBE
+# ----------------------------------------------------------------------------
+# O Google zera a cota à meia-noite do horário do Pacífico. O fuso é calculado pelas regras
+# dos EUA em vez de zoneinfo, que no Windows depende do pacote tzdata.
+def pacific_dst_bounds(ano):
+    """Início e fim do horário de verão do Pacífico em UTC (2º domingo de março e 1º de novembro, às 2h locais)."""
+    marco = datetime.datetime(ano, 3, 8)
+    novembro = datetime.datetime(ano, 11, 1)
+    inicio = marco + datetime.timedelta(days=(6 - marco.weekday()) % 7, hours=10)
+    fim = novembro + datetime.timedelta(days=(6 - novembro.weekday()) % 7, hours=9)
+    return inicio, fim
+
+
+def pacific_offset(utc):
+    """Diferença entre o horário do Pacífico e o UTC no instante `utc` (UTC sem fuso)."""
+    inicio, fim = pacific_dst_bounds(utc.year)
+    return datetime.timedelta(hours=-7 if inicio <= utc < fim else -8)
+
+
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def pacific_quota_day(utc=None):
+    """Retorna (dia da cota, instante UTC do próximo reset) para o instante `utc` (padrão: agora)."""
+    utc = utc or utc_now()
+    dia = (utc + pacific_offset(utc)).date()
+    meia_noite = datetime.datetime.combine(dia + datetime.timedelta(days=1), datetime.time())
+    # O horário de verão muda às 2h, então o fuso de 8h depois da meia-noite (em UTC) é o da meia-noite
+    return dia, meia_noite - pacific_offset(meia_noite + datetime.timedelta(hours=8))
+
+
+def read_project_id(client_secret_file):
+    """project_id do client_secret.json: cada projeto do Google Cloud tem a sua cota."""
+    try:
+        with open(client_secret_file, 'r', encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        return (dados.get('installed') or dados.get('web') or {}).get('project_id') or 'padrao'
+    except (OSError, ValueError):
+        return 'padrao'
+
+
+class QuotaLedger:
+    """
+    Registro das unidades da API do YouTube gastas por projeto em cada dia do Pacífico.
+    O worker reserva o custo do upload antes de reservar o agendamento: sem saldo, o
+    agendamento continua 'agendado' e volta a ser considerado quando a cota zerar.
+    As reservas são UPDATEs condicionais, então vários workers dividem a mesma cota.
+    """
+
+    def __init__(self, projeto, limite_diario, custo_upload):
+        self.projeto = projeto
+        self.limite_diario = limite_diario
+        self.custo_upload = max(custo_upload, 1)
+
+    def _ensure_row(self, session, dia):
+        if session.query(CotaYoutube.projeto).filter_by(projeto=self.projeto, dia=dia).first() is None:
+            try:
+                session.add(CotaYoutube(projeto=self.projeto, dia=dia, unidades_usadas=0))
+                session.commit()
+            except IntegrityError:
+                # Outro worker criou a linha do dia ao mesmo tempo
+                session.rollback()
+
+    def _add(self, unidades, dia=None, respeitar_limite=True):
+        dia = dia or pacific_quota_day()[0]
+        session = Session()
+        try:
+            self._ensure_row(session, dia)
+            condicoes = [CotaYoutube.projeto == self.projeto, CotaYoutube.dia == dia]
+            if respeitar_limite:
+                condicoes.append(CotaYoutube.unidades_usadas + unidades <= self.limite_diario)
+            resultado = session.execute(
+                update(CotaYoutube).where(*condicoes)
+                .values(unidades_usadas=CotaYoutube.unidades_usadas + unidades)
+            )
+            session.commit()
+            return dia if resultado.rowcount == 1 else None
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def reserve(self, unidades):
+        """Soma as unidades ao gasto do dia se couberem na cota. Retorna o dia reservado ou None se não couber."""
+        return self._add(unidades)
+
+    def release(self, dia, unidades):
+        """Devolve uma reserva que não foi usada (ex.: outro worker pegou o agendamento antes)."""
+        self._add(-unidades, dia, respeitar_limite=False)
+
+    def record(self, unidades):
+        """Registra unidades já gastas, mesmo acima do limite (ex.: upload reiniciado do zero)."""
+        self._add(unidades, respeitar_limite=False)
+
+    def mark_exhausted(self):
+        """O YouTube recusou por cota (parte dela pode ter sido gasta fora deste app): encerra o dia."""
+        dia = pacific_quota_day()[0]
+        session = Session()
+        try:
+            self._ensure_row(session, dia)
+            session.execute(
+                update(CotaYoutube)
+                .where(CotaYoutube.projeto == self.projeto, CotaYoutube.dia == dia,
+                       CotaYoutube.unidades_usadas < self.limite_diario)
+                .values(unidades_usadas=self.limite_diario)
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def seconds_until_reset(self):
+        return max((pacific_quota_day()[1] - utc_now()).total_seconds(), 0)
+
+    def status(self):
+        """Uso da cota hoje. O próximo reset é devolvido no horário local, como as demais datas do app."""
+        dia, reset = pacific_quota_day()
+        session = Session()
+        try:
+            usadas = session.query(CotaYoutube.unidades_usadas).filter_by(projeto=self.projeto, dia=dia).scalar() or 0
+        finally:
+            session.close()
+        return {
+            'projeto': self.projeto,
+            'dia': dia.isoformat(),
+            'limite': self.limite_diario,
+            'unidades_usadas': usadas,
+            'unidades_restantes': max(self.limite_diario - usadas, 0),
+            'custo_upload': self.custo_upload,
+            'proximo_reset': reset.replace(tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None),
+        }
+
+    def project_drain(self, uploads_pendentes):
+        """
+        Previsão, limitada só pela cota, de quando os uploads pendentes terminam: quantos ainda
+        cabem hoje, quantos cabem por dia e a partir de qual reset o último deles cabe na cota.
+        """
+        situacao = self.status()
+        hoje = situacao['unidades_restantes'] // self.custo_upload
+        por_dia = self.limite_diario // self.custo_upload
+        dias, previsao = 0, None
+        if uploads_pendentes > hoje:
+            if por_dia:
+                dias = math.ceil((uploads_pendentes - hoje) / por_dia)
+                previsao = situacao['proximo_reset'] + datetime.timedelta(days=dias - 1)
+            else:
+                dias = None
+        situacao.update({
+            'proximo_reset': situacao['proximo_reset'].isoformat(),
+            'uploads_pendentes': uploads_pendentes,
+            'uploads_restantes_hoje': hoje,
+            'uploads_por_dia': por_dia,
+            'dias_para_esvaziar': dias,
+            'fila_cabe_na_cota_a_partir_de': previsao.isoformat() if previsao else None,
+        })
+        return situacao
+
+
+YOUTUBE_PROJETO = os.getenv('YOUTUBE_PROJETO') or read_project_id(CLIENT_SECRET_FILE)
+quota_ledger = QuotaLedger(YOUTUBE_PROJETO, YOUTUBE_COTA_DIARIA, YOUTUBE_CUSTO_UPLOAD)
+
+
+def count_quota_backlog(session):
+    """Agendamentos vencidos que ainda vão gastar cota (os que já têm sessão de upload aberta não gastam)."""
+    return session.query(func.count(Agendamento.id)).filter(
+        Agendamento.status.in_(('agendado', 'processando')),
+        Agendamento.data_agendamento <= datetime.datetime.now(),
+        Agendamento.upload_sessao_uri.is_(None)
+    ).scalar()
+
+
+def quota_error_reason(erro):
+    """Motivo do HttpError se ele indicar cota esgotada, senão None."""
+    try:
+        dados = json.loads(erro.content.decode('utf-8'))
+        motivos = [item.get('reason') for item in dados.get('error', {}).get('errors', [])]
+    except (ValueError, AttributeError):
+        return None
+    return next((motivo for motivo in motivos if motivo in MOTIVOS_COTA_ESGOTADA), None)
+
+
+@app.route('/api/cota', methods=['GET'])
+def quota_status():
+    """Uso da cota do YouTube hoje e previsão de quando os uploads vencidos terminam de ser postados"""
+    session = Session()
+    try:
+        pendentes = count_quota_backlog(session)
+        return jsonify(quota_ledger.project_drain(pendentes)), 200
+    except Exception as e:
+        return jsonify({"error": f"Erro ao consultar a cota: {str(e)}"}), 500
+    finally:
+        session.close()
+
+# ----------------------------------------------------------------------------
+# ROTA: MÉTRICAS (FORMATO DO PROMETHEUS)
+# ----------------------------------------------------------------------------
+def count_agendamentos_by_status():
+    session = Session()
+    try:
+        contagens = session.query(Agendamento.status, func.count(Agendamento.id)).group_by(Agendamento.status).all()
+    finally:
+        session.close()
+    return [({'status': status}, total) for status, total in contagens]
+
+
+def quota_metrics():
+    session = Session()
+    try:
+        cota = quota_ledger.project_drain(count_quota_backlog(session))
+    finally:
+        session.close()
+    medidas = ('limite', 'unidades_usadas', 'unidades_restantes', 'uploads_pendentes', 'uploads_restantes_hoje',
+               'dias_para_esvaziar')
+    return [({'medida': medida}, cota[medida]) for medida in medidas]
+
+
+# Calculadas na hora da coleta, direto do banco
+REGISTRY.gauge('postador_agendamentos', 'Agendamentos por status.', ('status',)).set_function(count_agendamentos_by_status)
+REGISTRY.gauge('postador_cota_youtube', 'Uso da cota do YouTube hoje e previsão de esvaziamento da fila.',
+               ('medida',)).set_function(quota_metrics)
+
+
+@app.before_request
+def start_request_timer():
+    g.inicio_requisicao = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+    inicio = getattr(g, 'inicio_requisicao', None)
+    if inicio is not None:
+        HTTP_DURACAO.observe(time.perf_counter() - inicio, rota=rota, metodo=request.method)
+    HTTP_REQUISICOES.inc(rota=rota, metodo=request.method, status=str(response.status_code))
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas do servidor para o Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE_METRICAS)
+
+# ----------------------------------------------------------------------------
+# RESULTADO DA PREPARAÇÃO DO VÍDEO (Será chamada pelo Worker)
+# ----------------------------------------------------------------------------
+CAMPOS_ANALISE = ('duracao_segundos', 'codec_video', 'codec_audio', 'taxa_bits', 'largura', 'altura',
+                  'moov_no_inicio', 'preparo')
+
+
+def apply_preparation_result(agendamento_id, worker_id, resultado=None, erro=None):
+    """
+    Grava no agendamento o resultado de media_prep.prepare_video. Se um arquivo novo foi gerado,
+    ele é armazenado pelo conteúdo e passa a ser o vídeo do agendamento. O status vai para
+    'agendado' (pronto para o upload), ou para 'erro' se o vídeo foi recusado.
+    Outros erros da preparação não impedem o upload do arquivo original.
+    Retorna o novo status, ou None se o agendamento não está mais reservado para este worker.
+    """
+    caminho_saida = resultado.get('caminho_saida') if resultado else None
+    session = Session()
+    try:
+        agendamento = session.query(Agendamento).filter_by(id=agendamento_id).first()
+        if not agendamento or agendamento.status != 'preparando' or agendamento.worker_id != worker_id:
+            if caminho_saida and os.path.exists(caminho_saida):
+                os.remove(caminho_saida)
+            return None
+
+        caminho_antigo = None
+        if isinstance(erro, MediaRejectedError):
+            agendamento.status = 'erro'
+            agendamento.mensagem_erro = f"Vídeo recusado na preparação: {erro}"
+        else:
+            if erro is not None:
+                agendamento.mensagem_erro = f"Preparação do vídeo ignorada: {erro}"
+            else:
+                for campo in CAMPOS_ANALISE:
+                    if campo in resultado:
+                        setattr(agendamento, campo, resultado[campo])
+                agendamento.mensagem_erro = f"Aviso da preparação: {resultado['aviso']}" if resultado['aviso'] else None
+                if caminho_saida:
+                    caminho_antigo = agendamento.caminho_video
+                    agendamento.caminho_video, _ = store_file_by_hash(
+                        caminho_saida, resultado['hash_saida'], os.path.basename(caminho_saida))
+                    agendamento.hash_video = resultado['hash_saida']
+                    agendamento.bytes_total = resultado['tamanho_saida']
+            agendamento.status = 'agendado'
+        agendamento.worker_id = None
+        agendamento.lease_expira_em = None
+        session.commit()
+        if caminho_antigo:
+            remove_video_if_unused(session, caminho_antigo)
+        return agendamento.status
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+# ----------------------------------------------------------------------------
+# NOVAS TENTATIVAS E AGENDAMENTOS ESGOTADOS
+# ----------------------------------------------------------------------------
+def is_transient_error(erro):
+    """
+    Classifica a falha de um upload: True se vale tentar de novo mais tarde (rede, 5xx, limite de taxa,
+    token expirado), False se tentar de novo daria o mesmo resultado (vídeo recusado, arquivo ausente,
+    pedido inválido, token revogado ou credenciais ausentes: só uma nova autenticação resolve).
+    Erros desconhecidos contam como temporários; o limite de tentativas evita repetir para sempre.
+    """
+    if isinstance(erro, HttpError):
+        if erro.resp.status in STATUS_HTTP_TEMPORARIOS:
+            return True
+        if erro.resp.status == 403:
+            try:
+                dados = json.loads(erro.content.decode('utf-8'))
+                motivos = [item.get('reason') for item in dados.get('error', {}).get('errors', [])]
+            except (ValueError, AttributeError):
+                return False
+            return any(motivo in MOTIVOS_403_TEMPORARIOS for motivo in motivos)
+        return False
+    if isinstance(erro, ERROS_DE_REDE_RETENTAVEIS):
+        return True
+    if isinstance(erro, (MediaRejectedError, FileNotFoundError, PermissionError, ValueError,
+                         RefreshError, AuthenticationError)):
+        return False
+    return True
+
+
+def retry_delay(tentativa):
+    """Espera antes da tentativa seguinte: exponencial a partir de RETENTATIVA_BASE_SEGUNDOS, com metade aleatória."""
+    espera = min(RETENTATIVA_MAXIMA_SEGUNDOS, RETENTATIVA_BASE_SEGUNDOS * 2 ** (tentativa - 1))
+    return espera / 2 + random.uniform(0, espera / 2)
+
+
+def reserved_condition(worker_id):
+    """
+    Condição de dono do upload: reservado para worker_id e 'processando' ou, na chamada direta
+    (sem worker_id), ainda 'agendado' e sem worker. Um agendamento cancelado ou assumido por outro
+    worker depois do lease deixa de atender a condição.
+    """
+    if worker_id is None:
+        return and_(Agendamento.status == 'agendado', Agendamento.worker_id.is_(None))
+    return and_(Agendamento.status == 'processando', Agendamento.worker_id == worker_id)
+
+
+def update_if_reserved(session, agendamento_id, worker_id, valores):
+    """
+    Grava `valores` com um UPDATE condicional (reserved_condition) e faz o commit.
+    Retorna False, sem alterar nada, se o agendamento já não pertence a este upload.
+    """
+    resultado = session.execute(
+        update(Agendamento)
+        .where(Agendamento.id == agendamento_id, reserved_condition(worker_id))
+        .values(**valores)
+    )
+    session.commit()
+    return resultado.rowcount == 1
+
+
+def apply_failure_policy(session, agendamento, worker_id, erro, mensagem):
+    """
+    Registra a falha no agendamento e decide o próximo status: 'agendado' com proxima_tentativa_em
+    para erros temporários, 'esgotado' quando as tentativas acabam e 'erro' para erros permanentes.
+    A gravação usa update_if_reserved (com commit), para não ressuscitar um agendamento cancelado
+    nem sobrescrever o worker que assumiu o lease. Retorna o novo status, ou None nesses casos.
+    """
+    # Descarta o que a tentativa deixou pendente na sessão; os valores de partida vêm do banco
+    session.rollback()
+    agora = datetime.datetime.now()
+    temporario = is_transient_error(erro)
+    tentativas = (agendamento.tentativas or 0) + 1
+    historico = json.loads(agendamento.historico_erros or '[]')
+    historico.append({'em': agora.isoformat(timespec='seconds'), 'tipo': type(erro).__name__,
+                      'erro': mensagem[:500], 'temporario': temporario})
+    valores = {
+        'tentativas': tentativas,
+        'historico_erros': json.dumps(historico[-HISTORICO_ERROS_MAXIMO:], ensure_ascii=False),
+        'worker_id': None,
+        'lease_expira_em': None,
+        'proxima_tentativa_em': None,
+        'mensagem_erro': mensagem,
+    }
+
+    if not temporario:
+        valores['status'] = 'erro'
+    elif tentativas >= RETENTATIVAS_MAXIMAS:
+        valores['status'] = 'esgotado'
+        valores['mensagem_erro'] = f"Desistimos após {tentativas} tentativas. Último erro: {mensagem}"
+    else:
+        # A sessão de upload salva é mantida: a próxima tentativa continua de onde parou
+        valores['status'] = 'agendado'
+        valores['proxima_tentativa_em'] = agora + datetime.timedelta(seconds=retry_delay(tentativas))
+        valores['mensagem_erro'] = (f"Tentativa {tentativas}/{RETENTATIVAS_MAXIMAS} falhou ({mensagem}). "
+                                    f"Nova tentativa às {valores['proxima_tentativa_em']:%H:%M:%S}.")
+    if not update_if_reserved(session, agendamento.id, worker_id, valores):
+        return None
+    return valores['status']
+
+
+def fail_agendamento(agendamento_id, worker_id, erro, mensagem):
+    """
+    Aplica a política de falhas a um agendamento que ainda está reservado para `worker_id`
+    (usada pelo worker quando o upload falha fora do perform_youtube_upload).
+    Retorna o novo status, ou None se o agendamento já não pertence a este worker.
+    """
+    session = Session()
+    try:
+        agendamento = session.query(Agendamento).filter_by(id=agendamento_id).first()
+        if not agendamento:
+            return None
+        status = apply_failure_policy(session, agendamento, worker_id, erro, mensagem)
+        if status == 'agendado':
+            notify_worker()
+        return status
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+# ----------------------------------------------------------------------------
+# ENVIO EM PARTES (CHUNKS) COM RETOMADA
+# ----------------------------------------------------------------------------
+class LeaseLostError(Exception):
+    """O lease do agendamento expirou e outro worker assumiu o upload."""
+
+
+def send_upload_chunks(session, agendamento, request_upload, worker_id=None):
+    """
+    Envia o vídeo parte por parte com next_chunk(), salvando no banco a URI da sessão
+    de upload e os bytes já enviados depois de cada parte. Se o worker cair, o próximo
+    upload deste agendamento continua de onde parou em vez de recomeçar do zero.
+    Erros 5xx e de rede são repetidos com espera exponencial; os demais sobem para quem chamou.
+    O progresso é gravado com update_if_reserved: se o agendamento for cancelado ou outro worker
+    assumir o lease, o envio é interrompido (LeaseLostError) sem sobrescrever o novo dono.
+    """
+    if agendamento.upload_sessao_uri:
+        # Retoma a sessão salva. Com _in_error_state o cliente pergunta ao YouTube
+        # quantos bytes já chegaram antes de enviar a próxima parte.
+        request_upload.resumable_uri = agendamento.upload_sessao_uri
+        request_upload._in_error_state = True
+        log_event('upload_retomado', f"Retomando upload a partir de ~{agendamento.bytes_enviados or 0} bytes",
+                  bytes_enviados=agendamento.bytes_enviados or 0)
+
+    bytes_total = request_upload.resumable.size()
+    ultimo_progresso = agendamento.bytes_enviados or 0
+    ultimo_instante = time.monotonic()
+    tentativa = 0
+    response = None
+
+    while response is None:
+        # Espera a vez e a banda antes de cada parte (a retomada só consulta o YouTube e não envia bytes)
+        if not request_upload._in_error_state:
+            with span('espera_banda'):
+                bandwidth_manager.acquire(agendamento.id, min(UPLOAD_CHUNK_SIZE,
+                                                              bytes_total - request_upload.resumable_progress))
+        try:
+            with span('envio_parte'):
+                status, response = request_upload.next_chunk()
+        except HttpError as e:
+            if e.resp.status in (404, 410) and request_upload.resumable_uri:
+                # A sessão de upload expirou no YouTube: começa uma nova do zero
+                UPLOAD_RETENTATIVAS.inc(motivo='sessao_expirada')
+                log_event('sessao_upload_expirada', "Sessão de upload expirada no YouTube, reiniciando o envio.",
+                          logging.WARNING)
+                request_upload.resumable_uri = None
+                request_upload.resumable_progress = 0
+                request_upload._in_error_state = False
+                if not update_if_reserved(session, agendamento.id, worker_id,
+                                          {'upload_sessao_uri': None, 'bytes_enviados': 0}):
+                    raise LeaseLostError(f"Agendamento {agendamento.id} não pertence mais a este upload")
+                # A nova sessão é um novo videos().insert e gasta cota outra vez
+                quota_ledger.record(quota_ledger.custo_upload)
+                ultimo_progresso = 0
+                continue
+            if e.resp.status not in STATUS_HTTP_RETENTAVEIS:
+                raise
+            erro = e
+            UPLOAD_RETENTATIVAS.inc(motivo=f"http_{e.resp.status}")
+        except ERROS_DE_REDE_RETENTAVEIS as e:
+            erro = e
+            UPLOAD_RETENTATIVAS.inc(motivo=type(e).__name__)
+        else:
+            tentativa = 0
+            agora = time.monotonic()
+            progresso = bytes_total if response is not None else request_upload.resumable_progress
+            taxa = max(progresso - ultimo_progresso, 0) / max(agora - ultimo_instante, 1e-6)
+            reservado = update_if_reserved(session, agendamento.id, worker_id, {
+                'upload_sessao_uri': request_upload.resumable_uri,
+                'bytes_enviados': progresso,
+                'bytes_total': bytes_total,
+                'taxa_upload': taxa,
+                'taxa_alocada': bandwidth_manager.share(agendamento.id),
+            })
+            UPLOAD_BYTES.inc(max(progresso - ultimo_progresso, 0))
+            UPLOAD_TAXA.observe(taxa)
+            ultimo_progresso, ultimo_instante = progresso, agora
+            # Com o vídeo já no YouTube a resposta segue adiante mesmo assim, para o id não se perder
+            if not reservado and response is None:
+                raise LeaseLostError(f"Agendamento {agendamento.id} não pertence mais a este upload "
+                                     f"(cancelado ou assumido por outro worker)")
+            if status is not None:
+                log_event('upload_progresso', f"{int(status.progress() * 100)}% enviado",
+                          bytes_enviados=progresso, bytes_total=bytes_total,
+                          bytes_por_segundo=round(taxa))
+            continue
+
+        tentativa += 1
+        if tentativa > UPLOAD_MAX_TENTATIVAS:
+            raise erro
+        espera = min(UPLOAD_BACKOFF_MAXIMO, 2 ** tentativa) + random.random()
+        log_event('upload_falha_temporaria', f"Falha temporária no upload ({erro}). "
+                  f"Tentativa {tentativa}/{UPLOAD_MAX_TENTATIVAS} em {espera:.1f}s.", logging.WARNING,
+                  tentativa=tentativa, espera_segundos=round(espera, 1), erro=repr(erro))
+        time.sleep(espera)
+
+    return response
+
 # ----------------------------------------------------------------------------
 # FUNÇÃO PARA REALIZAR O UPLOAD NO YOUTUBE (Será chamada pelo Worker)
 # ----------------------------------------------------------------------------
-def perform_youtube_upload(agendamento_id):
+def perform_youtube_upload(agendamento_id, worker_id=None):
     """
     Função que executa o upload de um vídeo agendado para o YouTube.
     Esta função será chamada por um 'worker' em segundo plano, não por uma rota direta.
+    Cada chamada abre sua própria sessão do banco e seu próprio serviço do YouTube,
+    então pode rodar em paralelo em várias threads.
+    O worker passa o seu worker_id depois de reservar o agendamento (status 'processando')
+    e da cota do upload; sem worker_id, só agendamentos com status 'agendado' são aceitos
+    e o custo é apenas registrado na cota.
+    Se o YouTube recusar por cota esgotada, o agendamento volta para 'agendado' em vez de ir para 'erro'.
+    Outras falhas passam por apply_failure_policy: erros temporários voltam para a fila com espera.
+    Retorna True se o vídeo foi postado, False caso contrário.
     """
+    # Todos os logs e spans do upload levam o job_id do agendamento
+    with job_context(agendamento_id):
+        with span('upload_total'):
+            return _perform_youtube_upload(agendamento_id, worker_id)
+
+
+def report_lost_ownership(agendamento_id):
+    """A falha não foi gravada: o agendamento foi cancelado ou outro worker assumiu o lease no meio do upload."""
+    UPLOADS.inc(resultado='lease_perdido')
+    log_event('upload_interrompido', f"Falha do agendamento {agendamento_id} descartada: ele já não pertence "
+              f"a este upload (cancelado ou assumido por outro worker).", logging.WARNING)
+
+
+def _perform_youtube_upload(agendamento_id, worker_id):
     session = Session()
     agendamento = session.query(Agendamento).filter_by(id=agendamento_id).first()
 
     if not agendamento:
-        print(f"Worker: Agendamento ID {agendamento_id} não encontrado.")
+        log_event('agendamento_nao_encontrado', f"Agendamento ID {agendamento_id} não encontrado.", logging.WARNING)
         session.close()
-        return
+        return False
 
-    if agendamento.status != 'agendado':
-        print(f"Worker: Agendamento ID {agendamento_id} não está no status 'agendado'. Status atual: {agendamento.status}")
+    if worker_id is not None:
+        pronto = agendamento.status == 'processando' and agendamento.worker_id == worker_id
+    else:
+        pronto = agendamento.status == 'agendado'
+    if not pronto:
+        log_event('agendamento_nao_reservado', f"Agendamento não está reservado para este worker. "
+                  f"Status atual: {agendamento.status} (worker {agendamento.worker_id})", logging.WARNING,
+                  status=agendamento.status, dono=agendamento.worker_id)
         session.close()
-        return
+        return False
 
-    print(f"Worker: Iniciando upload para agendamento ID {agendamento.id} - Título: {agendamento.titulo}")
+    log_event('upload_iniciado', f"Iniciando upload: {agendamento.titulo}", worker_id=worker_id)
 
     try:
-        youtube, error = get_authenticated_service()
+        with span('autenticacao'):
+            youtube, error = get_authenticated_service()
         if error:
-            raise Exception(f"Erro de autenticação: {error}")
+            raise AuthenticationError(f"Erro de autenticação: {error}")
+        if worker_id is None and not agendamento.upload_sessao_uri:
+            quota_ledger.record(quota_ledger.custo_upload)
 
         body = {
             'snippet': {
@@ -358,7 +2352,7 @@ def perform_youtube_upload(agendamento_id):
             }
         }
         
-        media = MediaFileUpload(agendamento.caminho_video, chunksize=-1, resumable=True)
+        media = MediaFileUpload(agendamento.caminho_video, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
         
         request_upload = youtube.videos().insert(
             part='snippet,status',
@@ -366,30 +2360,76 @@ def perform_youtube_upload(agendamento_id):
             media_body=media
         )
         
-        response = request_upload.execute()
+        with span('envio'), bandwidth_manager.job(agendamento.id, agendamento.prioridade,
+                                                   to_local_naive(agendamento.data_agendamento)):
+            response = send_upload_chunks(session, agendamento, request_upload, worker_id)
         
-        agendamento.id_video_postado = response['id']
-        agendamento.status = 'postado'
-        agendamento.mensagem_erro = None
-        session.commit()
-        
-        if os.path.exists(agendamento.caminho_video):
-            os.remove(agendamento.caminho_video)
+        postado = {'id_video_postado': response['id'], 'status': 'postado', 'mensagem_erro': None,
+                   'proxima_tentativa_em': None, 'upload_sessao_uri': None, 'worker_id': None, 'lease_expira_em': None}
+        if not update_if_reserved(session, agendamento_id, worker_id, postado):
+            # O vídeo está no YouTube, mas o agendamento foi cancelado ou outro worker assumiu o lease
+            # (e vai receber a mesma resposta ao retomar a sessão); o id fica ao menos no log
+            UPLOADS.inc(resultado='lease_perdido')
+            log_event('upload_concluido_sem_dono', f"Upload concluído, mas o agendamento não pertence mais a este "
+                      f"upload. URL: https://www.youtube.com/watch?v={response['id']}", logging.WARNING,
+                      id_video=response['id'])
+            return False
+
+        remove_video_if_unused(session, agendamento.caminho_video)
 
-        print(f"Worker: ✅ Upload concluído para ID {agendamento.id}! URL: https://www.youtube.com/watch?v={response['id']}")
+        atraso = (datetime.datetime.now() - to_local_naive(agendamento.data_agendamento)).total_seconds()
+        ATRASO_POSTAGEM.observe(max(atraso, 0))
+        UPLOADS.inc(resultado='postado')
+        log_event('upload_concluido', f"Upload concluído! URL: https://www.youtube.com/watch?v={response['id']}",
+                  id_video=response['id'], atraso_segundos=round(atraso, 1), bytes_total=agendamento.bytes_total)
+        return True
 
+    except LeaseLostError as e:
+        # O outro worker continua a mesma sessão de upload; aqui só paramos sem mexer no status
+        session.rollback()
+        UPLOADS.inc(resultado='lease_perdido')
+        log_event('upload_interrompido', f"Upload interrompido: {e}", logging.WARNING)
     except HttpError as e:
-        agendamento.status = 'erro'
-        agendamento.mensagem_erro = f"Erro da API do YouTube: {e.resp.status} - {e.content}"
-        session.commit()
-        print(f"Worker: ❌ Erro HttpError no upload para ID {agendamento.id}: {e}")
+        motivo = quota_error_reason(e) if e.resp.status == 403 else None
+        if motivo:
+            # Sem cota: o dia é encerrado no registro e o agendamento volta para a fila até o reset
+            quota_ledger.mark_exhausted()
+            session.rollback()
+            adiado = {'status': 'agendado', 'worker_id': None, 'lease_expira_em': None,
+                      'mensagem_erro': f"Adiado: cota da API do YouTube esgotada ({motivo}). Será postado quando a cota zerar."}
+            if not update_if_reserved(session, agendamento_id, worker_id, adiado):
+                report_lost_ownership(agendamento_id)
+                return False
+            notify_worker()
+            UPLOADS.inc(resultado='adiado_cota')
+            log_event('upload_adiado_cota', f"Cota do YouTube esgotada ({motivo}); agendamento adiado.",
+                      logging.WARNING, motivo=motivo)
+            return False
+        status = apply_failure_policy(session, agendamento, worker_id, e,
+                                      f"Erro da API do YouTube: {e.resp.status} - {e.content}")
+        record_error('upload', e)
+        if status is None:
+            report_lost_ownership(agendamento_id)
+            return False
+        if status == 'agendado':
+            notify_worker()
+        UPLOADS.inc(resultado='nova_tentativa' if status == 'agendado' else status)
+        log_event('upload_falhou', f"Erro da API do YouTube: {e}", logging.ERROR, status_http=e.resp.status,
+                  status=status, tentativas=agendamento.tentativas)
     except Exception as e:
-        agendamento.status = 'erro'
-        agendamento.mensagem_erro = str(e)
-        session.commit()
-        print(f"Worker: ❌ Erro geral no upload para ID {agendamento.id}: {e}")
+        status = apply_failure_policy(session, agendamento, worker_id, e, str(e))
+        record_error('upload', e)
+        if status is None:
+            report_lost_ownership(agendamento_id)
+            return False
+        if status == 'agendado':
+            notify_worker()
+        UPLOADS.inc(resultado='nova_tentativa' if status == 'agendado' else status)
+        log_event('upload_falhou', f"Erro geral no upload: {e}", logging.ERROR, exc_info=True,
+                  status=status, tentativas=agendamento.tentativas)
     finally:
         session.close()
+    return False
 
 
 # ----------------------------------------------------------------------------
@@ -13,10 +13,25 @@ document.addEventListener('DOMContentLoaded', () => {
     const notificationArea = document.getElementById('notification-area');
     const generateAiButton = document.getElementById('generate-ai-button');
     const agendamentosTableBody = document.querySelector('#agendamentos-table tbody');
+    const loadMoreButton = document.getElementById('load-more-button');
     
     // URL base do nosso servidor backend (app.py)
     const API_URL = 'http://localhost:5000';
 
+    // Envio em partes: quantas partes sobem ao mesmo tempo e quantas vezes cada parte é repetida se falhar
+    const PARALLEL_CHUNKS = 4;
+    const CHUNK_MAX_RETRIES = 5;
+
+    // Quantos agendamentos são carregados por página e o cursor da próxima página (null = não há mais)
+    const PAGE_SIZE = 100;
+    let nextCursor = null;
+
+    // Estado da tabela: linhas por id, última versão vista, ETag da última consulta incremental e fluxo de eventos
+    const rowsById = new Map();
+    let currentVersion = null;
+    let listEtag = null;
+    let eventSource = null;
+
     // --- FUNÇÕES AUXILIARES ---
 
     /**
@@ -33,6 +48,144 @@ document.addEventListener('DOMContentLoaded', () => {
         }, 5000);
     }
 
+    /**
+     * Monta o texto de progresso de um upload em andamento (ex.: "45% · 3.20 MB/s (fatia 4.00 MB/s)").
+     * @param {object} item - O agendamento retornado pela API.
+     * @returns {string} O texto do progresso, ou vazio se não houver upload em andamento.
+     */
+    function formatUploadProgress(item) {
+        if (item.status !== 'processando' || !item.bytes_total) return '';
+        const percent = Math.floor(100 * (item.bytes_enviados || 0) / item.bytes_total);
+        const rate = ((item.taxa_upload || 0) / 1000000).toFixed(2);
+        // Com limite de banda no worker, mostra também a fatia que este upload recebeu
+        if (item.taxa_alocada) {
+            return `${percent}% · ${rate} MB/s (fatia ${(item.taxa_alocada / 1000000).toFixed(2)} MB/s)`;
+        }
+        return `${percent}% · ${rate} MB/s`;
+    }
+
+    /**
+     * Ação disponível para o agendamento na tabela: recolocar na fila ou cancelar.
+     * @param {object} item - O agendamento retornado pela API.
+     * @returns {{action: string, label: string}|null} A ação, ou null se não houver nenhuma.
+     */
+    function rowAction(item) {
+        if (['erro', 'esgotado', 'cancelado'].includes(item.status)) return { action: 'requeue', label: 'Tentar de novo' };
+        if (['preparando', 'agendado', 'processando'].includes(item.status)) return { action: 'cancel', label: 'Cancelar' };
+        return null;
+    }
+
+    /**
+     * Chave usada no localStorage para lembrar a sessão de envio de um arquivo,
+     * permitindo retomar o envio depois de recarregar a página.
+     * @param {File} file - O arquivo de vídeo selecionado.
+     * @returns {string} A chave do arquivo.
+     */
+    function uploadStorageKey(file) {
+        return `upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    /**
+     * Calcula o SHA-256 de uma parte para o servidor conferir a integridade.
+     * Só funciona em contexto seguro (https ou localhost); fora dele a conferência é omitida.
+     * @param {Blob} blob - A parte do arquivo.
+     * @returns {Promise<string|null>} O hash em hexadecimal, ou null se não for possível calcular.
+     */
+    async function sha256Hex(blob) {
+        if (!window.crypto || !window.crypto.subtle) return null;
+        const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    /**
+     * Inicia uma sessão de envio no servidor ou retoma a sessão salva para este arquivo.
+     * @param {File} file - O arquivo de vídeo.
+     * @returns {Promise<object>} O estado da sessão (upload_id, chunk_size, total_chunks, partes recebidas).
+     */
+    async function openUploadSession(file) {
+        const savedId = localStorage.getItem(uploadStorageKey(file));
+        if (savedId) {
+            const response = await fetch(`${API_URL}/api/uploads/${savedId}`);
+            if (response.ok) return response.json();
+            localStorage.removeItem(uploadStorageKey(file)); // sessão expirou ou já foi finalizada
+        }
+        const response = await fetch(`${API_URL}/api/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error);
+        localStorage.setItem(uploadStorageKey(file), data.upload_id);
+        return { ...data, received_ranges: [] };
+    }
+
+    /**
+     * Envia uma parte, repetindo com espera crescente se a rede falhar.
+     */
+    async function sendChunk(file, session, index) {
+        const start = index * session.chunk_size;
+        const blob = file.slice(start, Math.min(start + session.chunk_size, file.size));
+        const checksum = await sha256Hex(blob);
+        for (let attempt = 0; ; attempt++) {
+            let response = null;
+            try {
+                response = await fetch(`${API_URL}/api/uploads/${session.upload_id}/chunks/${index}`, {
+                    method: 'PUT',
+                    headers: checksum ? { 'X-Chunk-Sha256': checksum } : {},
+                    body: blob,
+                });
+            } catch (error) {
+                if (attempt >= CHUNK_MAX_RETRIES) throw error; // falha de rede
+            }
+            if (response && response.ok) return;
+            // Erros 4xx não melhoram com nova tentativa
+            if (response && response.status < 500) throw new Error((await response.json()).error);
+            if (attempt >= CHUNK_MAX_RETRIES) throw new Error(`Falha ao enviar a parte ${index}.`);
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+    }
+
+    /**
+     * Envia o vídeo em partes paralelas (pulando as que o servidor já tem) e finaliza o agendamento.
+     * @param {File} file - O arquivo de vídeo.
+     * @param {object} fields - Título, descrição, tags e data do agendamento.
+     * @param {function} onProgress - Recebe a fração enviada (0 a 1).
+     * @returns {Promise<object>} A resposta da finalização (com id_agendamento).
+     */
+    async function uploadInChunks(file, fields, onProgress) {
+        const session = await openUploadSession(file);
+        const received = new Set();
+        session.received_ranges.forEach(([first, last]) => {
+            for (let i = first; i <= last; i++) received.add(i);
+        });
+        const pending = [];
+        for (let i = 0; i < session.total_chunks; i++) {
+            if (!received.has(i)) pending.push(i);
+        }
+
+        let done = received.size;
+        onProgress(done / session.total_chunks);
+        const senders = Array.from({ length: Math.min(PARALLEL_CHUNKS, pending.length) }, async () => {
+            while (pending.length > 0) {
+                await sendChunk(file, session, pending.shift());
+                done++;
+                onProgress(done / session.total_chunks);
+            }
+        });
+        await Promise.all(senders);
+
+        const response = await fetch(`${API_URL}/api/uploads/${session.upload_id}/finalize`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(fields),
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error);
+        localStorage.removeItem(uploadStorageKey(file));
+        return data;
+    }
+
     // --- FUNÇÕES PRINCIPAIS ---
 
     /**
@@ -48,6 +201,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 authButton.style.display = 'none';
                 submitButton.disabled = false;
                 loadAgendamentos(); // Carrega a lista de agendamentos se autenticado
+                connectAgendamentoEvents(); // E passa a receber as mudanças em tempo real
             } else {
                 authIndicator.className = 'status-indicator disconnected';
                 authText.textContent = 'Desconectado';
@@ -61,39 +215,169 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     /**
-     * Carrega a lista de agendamentos do backend e preenche a tabela.
+     * Compara dois agendamentos na ordem da listagem (data_agendamento, id).
+     * @returns {number} Negativo se `a` vem antes de `b`.
      */
-    async function loadAgendamentos() {
+    function compareAgendamentos(a, b) {
+        const byDate = new Date(a.data_agendamento) - new Date(b.data_agendamento);
+        return byDate !== 0 ? byDate : a.id - b.id;
+    }
+
+    /**
+     * Preenche (ou atualiza) as células de uma linha da tabela. Usa textContent em vez de
+     * innerHTML, então o navegador não precisa reinterpretar HTML a cada atualização.
+     * @param {HTMLTableRowElement} tr - A linha da tabela.
+     * @param {object} item - O agendamento retornado pela API.
+     */
+    function fillRow(tr, item) {
+        if (tr.cells.length === 0) {
+            for (let i = 0; i < 4; i++) tr.insertCell();
+            const badge = document.createElement('span');
+            const progress = document.createElement('span');
+            progress.className = 'upload-progress';
+            const actionButton = document.createElement('button');
+            actionButton.type = 'button';
+            actionButton.className = 'row-action';
+            tr.cells[3].append(badge, progress, actionButton);
+        }
+        tr.item = item;
+        tr.cells[0].textContent = item.id;
+        tr.cells[1].textContent = item.titulo;
+        tr.cells[2].textContent = new Date(item.data_agendamento).toLocaleString('pt-BR');
+        const [badge, progress, actionButton] = tr.cells[3].children;
+        badge.className = `status-badge status-${item.status}`;
+        badge.textContent = item.status;
+        // A última mensagem de erro (ou da próxima tentativa) aparece ao passar o mouse
+        badge.title = item.mensagem_erro || '';
+        progress.textContent = formatUploadProgress(item);
+        const action = rowAction(item);
+        actionButton.style.display = action ? '' : 'none';
+        actionButton.dataset.action = action ? action.action : '';
+        actionButton.textContent = action ? action.label : '';
+    }
+
+    /**
+     * Mostra a mensagem de tabela vazia (ou a remove, se já houver linhas).
+     */
+    function updateEmptyMessage() {
+        const empty = agendamentosTableBody.querySelector('.empty-row');
+        if (rowsById.size === 0 && !empty) {
+            agendamentosTableBody.innerHTML = `<tr class="empty-row"><td colspan="4" style="text-align: center;">Nenhum vídeo agendado.</td></tr>`;
+        } else if (rowsById.size > 0 && empty) {
+            empty.remove();
+        }
+    }
+
+    /**
+     * Aplica na tabela um agendamento novo ou alterado, sem reconstruir as outras linhas.
+     * Agendamentos novos só entram se estiverem dentro do trecho já carregado da lista.
+     * @param {object} item - O agendamento retornado pela API ou recebido por evento.
+     */
+    function upsertRow(item) {
+        currentVersion = Math.max(currentVersion || 0, item.versao || 0);
+        const existing = rowsById.get(item.id);
+        if (existing) {
+            if ((existing.item.versao || 0) > (item.versao || 0)) return; // evento atrasado
+            const moved = existing.item.data_agendamento !== item.data_agendamento;
+            fillRow(existing, item);
+            if (!moved) return;
+            existing.remove();
+            rowsById.delete(item.id);
+        }
+        const rows = Array.from(agendamentosTableBody.rows).filter(row => row.item);
+        const last = rows[rows.length - 1];
+        if (nextCursor && last && compareAgendamentos(item, last.item) > 0) return; // ainda não foi carregado
+        const tr = existing || document.createElement('tr');
+        if (!existing) fillRow(tr, item);
+        const next = rows.find(row => compareAgendamentos(item, row.item) < 0);
+        agendamentosTableBody.insertBefore(tr, next || null);
+        rowsById.set(item.id, tr);
+        updateEmptyMessage();
+    }
+
+    /**
+     * Carrega uma página de agendamentos do backend e preenche a tabela.
+     * @param {string|null} cursor - Cursor da próxima página; sem cursor, recarrega a tabela desde o início.
+     */
+    async function loadAgendamentos(cursor = null) {
         try {
-            const response = await fetch(`${API_URL}/api/agendamentos`);
+            const params = new URLSearchParams({ limit: PAGE_SIZE });
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(`${API_URL}/api/agendamentos?${params}`);
             const data = await response.json();
             if (!response.ok) {
                 throw new Error(data.error || 'Erro desconhecido do servidor.');
             }
 
-            agendamentosTableBody.innerHTML = ''; // Limpa a tabela antes de preencher
-            if (data.agendamentos.length === 0) {
-                agendamentosTableBody.innerHTML = `<tr><td colspan="4" style="text-align: center;">Nenhum vídeo agendado.</td></tr>`;
+            nextCursor = data.proximo_cursor;
+            currentVersion = Math.max(currentVersion || 0, data.versao || 0);
+            loadMoreButton.style.display = nextCursor ? 'block' : 'none';
+
+            // Monta as linhas fora da página e insere todas de uma vez
+            const fragment = document.createDocumentFragment();
+            if (!cursor) rowsById.clear();
+            data.agendamentos.forEach(item => {
+                const tr = document.createElement('tr');
+                fillRow(tr, item);
+                rowsById.set(item.id, tr);
+                fragment.appendChild(tr);
+            });
+            if (cursor) {
+                agendamentosTableBody.appendChild(fragment);
             } else {
-                data.agendamentos.forEach(item => {
-                    const row = `
-                        <tr>
-                            <td>${item.id}</td>
-                            <td>${item.titulo}</td>
-                            <td>${new Date(item.data_agendamento).toLocaleString('pt-BR')}</td>
-                            <td><span class="status-badge status-${item.status}">${item.status}</span></td>
-                        </tr>
-                    `;
-                    agendamentosTableBody.innerHTML += row;
-                });
+                agendamentosTableBody.replaceChildren(fragment);
             }
+            updateEmptyMessage();
         } catch (error) {
             const friendlyErrorMessage = `<tr><td colspan="4" style="color: red; text-align: center;">Falha ao carregar agendamentos. Verifique a conexão com o banco de dados.</td></tr>`;
             agendamentosTableBody.innerHTML = friendlyErrorMessage;
+            rowsById.clear();
             console.error("Erro detalhado ao carregar agendamentos:", error);
         }
     }
 
+    /**
+     * Busca só o que mudou desde a última versão vista e aplica na tabela.
+     * O ETag evita até o download da resposta quando nada mudou. Se o servidor cortar a resposta
+     * (mais = true), continua a partir da última versão entregue até alcançar a versão atual.
+     */
+    async function refreshAgendamentos() {
+        if (currentVersion === null) return loadAgendamentos();
+        try {
+            let params = new URLSearchParams({ since: currentVersion });
+            while (true) {
+                const response = await fetch(`${API_URL}/api/agendamentos?${params}`, {
+                    headers: listEtag && !params.has('continuar') ? { 'If-None-Match': listEtag } : {},
+                });
+                if (response.status === 304) return;
+                const data = await response.json();
+                if (!response.ok) throw new Error(data.error || 'Erro desconhecido do servidor.');
+                listEtag = response.headers.get('ETag');
+                data.agendamentos.forEach(upsertRow);
+                if (!data.mais) {
+                    currentVersion = Math.max(currentVersion, data.versao || 0);
+                    return;
+                }
+                // Um evento pode ter avançado currentVersion; a continuação segue o cursor da resposta
+                params = new URLSearchParams({ since: data.versao, continuar: 1 });
+            }
+        } catch (error) {
+            console.error("Erro ao atualizar agendamentos:", error);
+        }
+    }
+
+    /**
+     * Conecta ao fluxo de eventos do servidor: cada mudança de status ou progresso de upload
+     * chega na hora e atualiza só a linha correspondente.
+     */
+    function connectAgendamentoEvents() {
+        if (!window.EventSource || eventSource) return;
+        eventSource = new EventSource(`${API_URL}/api/agendamentos/eventos`);
+        eventSource.addEventListener('agendamento', (event) => upsertRow(JSON.parse(event.data)));
+        // Ao (re)conectar, busca o que pode ter mudado enquanto a conexão estava fechada
+        eventSource.addEventListener('open', () => refreshAgendamentos());
+    }
+
     // --- EVENT LISTENERS (OUVINTES DE EVENTOS) ---
     // Aqui definimos o que acontece quando o usuário clica nos botões.
 
@@ -111,6 +395,31 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Evento dos botões de cada linha (recolocar na fila ou cancelar)
+    agendamentosTableBody.addEventListener('click', async (event) => {
+        const button = event.target.closest('.row-action');
+        if (!button || !button.dataset.action) return;
+        const item = button.closest('tr').item;
+        if (button.dataset.action === 'cancel' && !confirm(`Cancelar o agendamento "${item.titulo}"?`)) return;
+        button.disabled = true;
+        try {
+            const response = await fetch(`${API_URL}/api/agendamentos/${item.id}/${button.dataset.action}`, { method: 'POST' });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error);
+            showNotification(data.message, 'success');
+            refreshAgendamentos();
+        } catch (error) {
+            showNotification(`Erro: ${error.message}`, 'error');
+        } finally {
+            button.disabled = false;
+        }
+    });
+
+    // Evento para carregar a próxima página de agendamentos
+    loadMoreButton.addEventListener('click', () => {
+        if (nextCursor) loadAgendamentos(nextCursor);
+    });
+
     // Evento para o botão da IA
     generateAiButton.addEventListener('click', async () => {
         const summary = document.getElementById('video-summary').value;
@@ -140,21 +449,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     
+    // Avisa quando o arquivo escolhido tem um envio interrompido que será retomado
+    document.getElementById('video').addEventListener('change', (event) => {
+        const file = event.target.files[0];
+        if (file && localStorage.getItem(uploadStorageKey(file))) {
+            showNotification('Envio anterior deste vídeo encontrado. Ele será retomado de onde parou.', 'success');
+        }
+    });
+
     // Evento para o formulário de agendamento
     uploadForm.addEventListener('submit', async (event) => {
         event.preventDefault(); // Impede o recarregamento padrão da página
         submitButton.disabled = true;
-        submitButton.textContent = 'Agendando...';
+        submitButton.textContent = 'Enviando...';
         try {
-            const response = await fetch(`${API_URL}/api/schedule/youtube`, {
-                method: 'POST',
-                body: new FormData(uploadForm),
+            const formData = new FormData(uploadForm);
+            const fields = {
+                title: formData.get('title'),
+                description: formData.get('description'),
+                tags: formData.get('tags'),
+                scheduled_time: formData.get('scheduled_time'),
+                priority: formData.get('priority'),
+            };
+            const data = await uploadInChunks(formData.get('video'), fields, (fraction) => {
+                submitButton.textContent = `Enviando... ${Math.floor(fraction * 100)}%`;
             });
-            const data = await response.json();
-            if (!response.ok) throw new Error(data.error);
             showNotification(`Vídeo agendado com sucesso! (ID: ${data.id_agendamento})`, 'success');
             uploadForm.reset(); // Limpa o formulário após o sucesso
-            loadAgendamentos(); // Atualiza a lista de agendamentos na tela
+            refreshAgendamentos(); // Atualiza a lista de agendamentos na tela
         } catch (error) {
             showNotification(`Erro ao agendar: ${error.message}`, 'error');
         } finally {
@@ -166,5 +488,8 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- INICIALIZAÇÃO ---
     // Inicia a página e configura uma atualização automática da lista de agendamentos
     initializePage();
-    setInterval(loadAgendamentos, 30000); // Atualiza a lista a cada 30 segundos
+    // Se o fluxo de eventos não estiver conectado, busca as mudanças a cada 30 segundos
+    setInterval(() => {
+        if (!eventSource || eventSource.readyState !== EventSource.OPEN) refreshAgendamentos();
+    }, 30000);
 });
\ No newline at end of file
@@ -0,0 +1,180 @@
+# bandwidth.py
+# ============================================================================
+# LIMITE DE BANDA E DIVISÃO JUSTA ENTRE OS UPLOADS EM ANDAMENTO
+# ============================================================================
+# O app.py chama BandwidthManager.acquire() antes de enviar cada parte do vídeo ao YouTube.
+# Um balde de tokens limita a taxa total do processo (com limites diferentes por horário do dia)
+# e, quando vários uploads esperam, a vez é dada por enfileiramento justo ponderado (start-time
+# fair queuing): cada upload recebe uma fatia proporcional ao seu peso, que cresce com a
+# prioridade e com o atraso em relação a data_agendamento. Um vídeo grande não segura os
+# pequenos: todos avançam ao mesmo tempo, cada um com a sua parte da banda.
+
+import time
+import heapq
+import datetime
+import threading
+import contextlib
+
+
+class BandwidthProfileError(ValueError):
+    """Texto de perfis de horário (BANDA_PERFIS) em formato inválido."""
+
+
+def parse_profiles(texto):
+    """
+    Lê perfis no formato '08:00-18:00=20;18:00-08:00=0' (horário local, megabits/s, 0 = sem limite).
+    Faixas podem passar da meia-noite. Retorna uma lista de (inicio_minutos, fim_minutos, bytes_por_segundo).
+    """
+    perfis = []
+    for item in (texto or '').replace(',', ';').split(';'):
+        if not item.strip():
+            continue
+        try:
+            faixa, taxa = item.split('=')
+            inicio, fim = (_parse_hour(hora) for hora in faixa.split('-'))
+            perfis.append((inicio, fim, megabits_to_bytes(float(taxa))))
+        except ValueError:
+            raise BandwidthProfileError(f"Perfil de banda inválido: {item.strip()!r}. Use, por exemplo, 08:00-18:00=20")
+    return perfis
+
+
+def _parse_hour(texto):
+    horas, minutos = texto.strip().split(':')
+    horas, minutos = int(horas), int(minutos)
+    if not (0 <= horas <= 24 and 0 <= minutos < 60) or horas * 60 + minutos > 24 * 60:
+        raise ValueError(texto)
+    return horas * 60 + minutos
+
+
+def megabits_to_bytes(megabits):
+    return max(megabits, 0) * 1_000_000 / 8
+
+
+class _Job:
+    __slots__ = ('prioridade', 'prazo', 'ultimo_fim', 'bytes_liberados', 'inicio')
+
+    def __init__(self, prioridade, prazo, agora):
+        self.prioridade = prioridade
+        self.prazo = prazo
+        self.ultimo_fim = 0.0
+        self.bytes_liberados = 0
+        self.inicio = agora
+
+
+class BandwidthManager:
+    """
+    Limite de banda por processo, seguro para várias threads. Sem limite no horário atual,
+    acquire() não espera, mas os pesos e as fatias continuam sendo calculados.
+    """
+
+    def __init__(self, bytes_por_segundo=0, perfis=(), urgencia_segundos=1800,
+                 relogio=time.monotonic, hora_local=datetime.datetime.now):
+        self.bytes_por_segundo = bytes_por_segundo
+        self.perfis = list(perfis)
+        self.urgencia_segundos = urgencia_segundos
+        self._relogio = relogio
+        self._hora_local = hora_local
+        self._jobs = {}
+        self._fila = []  # (tag de início, sequência, job_id) de quem está esperando a vez
+        self._sequencia = 0
+        self._tempo_virtual = 0.0
+        self._saldo = 0.0
+        self._atualizado_em = relogio()
+        self._cond = threading.Condition()
+
+    def current_limit(self):
+        """Limite em bytes/s para o horário atual (0 = sem limite)."""
+        agora = self._hora_local()
+        minuto = agora.hour * 60 + agora.minute
+        for inicio, fim, taxa in self.perfis:
+            if inicio <= fim and inicio <= minuto < fim or inicio > fim and (minuto >= inicio or minuto < fim):
+                return taxa
+        return self.bytes_por_segundo
+
+    def weight(self, job):
+        """Peso do upload: 1 + prioridade positiva, dobrando aos poucos conforme o atraso chega a urgencia_segundos."""
+        peso = 1 + max(job.prioridade or 0, 0)
+        if job.prazo is not None and self.urgencia_segundos > 0:
+            atraso = (self._hora_local() - job.prazo).total_seconds()
+            peso *= 1 + min(max(atraso, 0), self.urgencia_segundos) / self.urgencia_segundos
+        return peso
+
+    @contextlib.contextmanager
+    def job(self, job_id, prioridade=0, prazo=None):
+        """Registra o upload enquanto ele está em andamento; prazo é data_agendamento (horário local, sem fuso)."""
+        with self._cond:
+            self._jobs[job_id] = _Job(prioridade, prazo, self._relogio())
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._jobs.pop(job_id, None)
+                self._fila = [item for item in self._fila if item[2] != job_id]
+                heapq.heapify(self._fila)
+                self._cond.notify_all()
+
+    def acquire(self, job_id, quantidade):
+        """
+        Espera a vez do upload e a banda para enviar `quantidade` bytes. A parte pode ser maior que o
+        balde: o saldo fica negativo e os próximos envios esperam até ele ser pago.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or quantidade <= 0:
+                return
+            inicio = max(self._tempo_virtual, job.ultimo_fim)
+            job.ultimo_fim = inicio + quantidade / self.weight(job)
+            self._sequencia += 1
+            item = (inicio, self._sequencia, job_id)
+            heapq.heappush(self._fila, item)
+            while True:
+                limite = self.current_limit()
+                self._refill(limite)
+                minha_vez = self._fila and self._fila[0] is item
+                if minha_vez and (limite <= 0 or self._saldo >= 0):
+                    heapq.heappop(self._fila)
+                    self._tempo_virtual = inicio
+                    if limite > 0:
+                        self._saldo -= quantidade
+                    job.bytes_liberados += quantidade
+                    self._cond.notify_all()
+                    return
+                if job_id not in self._jobs:
+                    return
+                # Sem saldo, acorda quando a dívida estiver paga; o perfil de horário é conferido a cada minuto
+                espera = -self._saldo / limite if minha_vez and limite > 0 else 60
+                self._cond.wait(min(max(espera, 0.001), 60))
+
+    def _refill(self, limite):
+        agora = self._relogio()
+        if limite > 0:
+            self._saldo = min(limite, self._saldo + (agora - self._atualizado_em) * limite)
+        else:
+            self._saldo = 0.0
+        self._atualizado_em = agora
+
+    def share(self, job_id):
+        """Fatia atual do upload em bytes/s (proporcional ao peso entre os uploads em andamento), ou None sem limite."""
+        with self._cond:
+            limite = self.current_limit()
+            job = self._jobs.get(job_id)
+            if limite <= 0 or job is None:
+                return None
+            pesos = {chave: self.weight(outro) for chave, outro in self._jobs.items()}
+            return limite * pesos[job_id] / sum(pesos.values())
+
+    def snapshot(self):
+        """Peso, fatia e taxa média liberada de cada upload em andamento, para logs e métricas."""
+        with self._cond:
+            limite = self.current_limit()
+            agora = self._relogio()
+            pesos = {chave: self.weight(job) for chave, job in self._jobs.items()}
+            total = sum(pesos.values())
+            return {
+                chave: {
+                    'peso': round(pesos[chave], 3),
+                    'fatia_bytes_por_segundo': limite * pesos[chave] / total if limite > 0 else None,
+                    'media_bytes_por_segundo': job.bytes_liberados / max(agora - job.inicio, 1e-6),
+                }
+                for chave, job in self._jobs.items()
+            }
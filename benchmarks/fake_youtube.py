@@ -0,0 +1,233 @@
+# benchmarks/fake_youtube.py
+# ============================================================================
+# SERVIDOR FALSO DE UPLOAD DO YOUTUBE (PARA BENCHMARKS LOCAIS)
+# ============================================================================
+# Implementa só o que o worker usa da API: o upload resumível de videos().insert.
+#   POST /upload/youtube/v3/videos?uploadType=resumable  -> 200 + Location (URI da sessão)
+#   PUT  <sessão> com Content-Range: bytes a-b/total      -> 308 + Range, ou 200 + JSON do vídeo no fim
+#   PUT  <sessão> com Content-Range: bytes */total        -> consulta de quanto já chegou (retomada)
+# Simula banda limitada por conexão, latência por requisição, erros 5xx aleatórios e cota
+# esgotada (403 quotaExceeded) depois de um número de uploads iniciados.
+#
+# O worker é apontado para cá com YOUTUBE_API_ROOT_URL=http://127.0.0.1:<porta>/
+# Uso avulso: python benchmarks/fake_youtube.py --porta 8089 --banda-mbps 50 --latencia-ms 30
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BLOCO_LEITURA = 256 * 1024
+
+
+class FakeYouTubeServer:
+    """
+    Servidor HTTP em uma thread própria. banda_bytes_por_segundo limita cada conexão (None = sem limite),
+    taxa_erro_5xx é a chance de uma requisição responder 503 e cota_uploads é quantos uploads
+    podem ser iniciados antes de o servidor responder quotaExceeded (None = sem limite).
+    """
+
+    def __init__(self, host='127.0.0.1', porta=0, banda_bytes_por_segundo=None, latencia_segundos=0.0,
+                 taxa_erro_5xx=0.0, cota_uploads=None, semente=None):
+        self.banda_bytes_por_segundo = banda_bytes_por_segundo
+        self.latencia_segundos = latencia_segundos
+        self.taxa_erro_5xx = taxa_erro_5xx
+        self.cota_uploads = cota_uploads
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self._sessoes = {}
+        self.estatisticas = {'inicios': 0, 'partes': 0, 'consultas': 0, 'concluidos': 0,
+                             'erros_5xx': 0, 'cota_recusada': 0, 'bytes_recebidos': 0}
+
+        servidor = self
+
+        class Handler(_UploadHandler):
+            fake = servidor
+
+        self._http = ThreadingHTTPServer((host, porta), Handler)
+        self._http.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._http.server_address[:2]
+        return f"http://{host}:{porta}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._http.serve_forever, name='fake-youtube', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.estatisticas)
+
+    # --- estado compartilhado entre as conexões ---
+    def _count(self, chave, valor=1):
+        with self._lock:
+            self.estatisticas[chave] += valor
+
+    def _sorteia_5xx(self):
+        with self._lock:
+            return self.taxa_erro_5xx > 0 and self._aleatorio.random() < self.taxa_erro_5xx
+
+    def _abre_sessao(self, total, metadados):
+        with self._lock:
+            if self.cota_uploads is not None and self.estatisticas['inicios'] >= self.cota_uploads:
+                self.estatisticas['cota_recusada'] += 1
+                return None
+            self.estatisticas['inicios'] += 1
+            sessao_id = uuid.uuid4().hex
+            self._sessoes[sessao_id] = {'total': total, 'recebidos': 0, 'metadados': metadados}
+            return sessao_id
+
+
+class _UploadHandler(BaseHTTPRequestHandler):
+    # Conexões persistentes, como o httplib2 do cliente do Google espera
+    protocol_version = 'HTTP/1.1'
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo=None, cabecalhos=None):
+        dados = json.dumps(corpo).encode('utf-8') if corpo is not None else b''
+        self.send_response(status)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        if corpo is not None:
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _erro(self, status, motivo, mensagem):
+        self._responder(status, {'error': {'code': status, 'message': mensagem,
+                                           'errors': [{'reason': motivo, 'message': mensagem}]}})
+
+    def _ler_corpo(self):
+        """Lê o corpo respeitando a banda simulada; devolve os bytes lidos (só guardados se forem poucos)."""
+        restante = int(self.headers.get('Content-Length') or 0)
+        banda = self.fake.banda_bytes_por_segundo
+        pequeno = restante <= 64 * 1024
+        partes = []
+        inicio = time.monotonic()
+        lidos = 0
+        while restante > 0:
+            bloco = self.rfile.read(min(BLOCO_LEITURA, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            lidos += len(bloco)
+            if pequeno:
+                partes.append(bloco)
+            if banda:
+                # Dorme o que falta para a conexão não passar da banda configurada
+                adiantado = lidos / banda - (time.monotonic() - inicio)
+                if adiantado > 0:
+                    time.sleep(adiantado)
+        return lidos, b''.join(partes)
+
+    def do_POST(self):
+        time.sleep(self.fake.latencia_segundos)
+        _, corpo = self._ler_corpo()
+        url = urlparse(self.path)
+        if not url.path.endswith('/videos') or parse_qs(url.query).get('uploadType') != ['resumable']:
+            self._erro(404, 'notFound', 'Rota não simulada pelo servidor falso')
+            return
+        if self.fake._sorteia_5xx():
+            self.fake._count('erros_5xx')
+            self._erro(503, 'backendError', 'Erro simulado')
+            return
+        try:
+            metadados = json.loads(corpo.decode('utf-8')) if corpo else {}
+        except ValueError:
+            metadados = {}
+        total = self.headers.get('X-Upload-Content-Length')
+        sessao_id = self.fake._abre_sessao(int(total) if total else None, metadados)
+        if sessao_id is None:
+            self._erro(403, 'quotaExceeded', 'The request cannot be completed because you have exceeded your quota.')
+            return
+        host = self.headers.get('Host')
+        self._responder(200, cabecalhos={'Location': f"http://{host}/upload/sessoes/{sessao_id}"})
+
+    def do_PUT(self):
+        time.sleep(self.fake.latencia_segundos)
+        sessao_id = urlparse(self.path).path.rsplit('/', 1)[-1]
+        faixa = self.headers.get('Content-Range', '')
+        lidos, _ = self._ler_corpo()
+        with self.fake._lock:
+            sessao = self.fake._sessoes.get(sessao_id)
+        if sessao is None:
+            self._erro(404, 'notFound', 'Sessão de upload inexistente')
+            return
+
+        # Content-Range: bytes a-b/total ou bytes */total
+        try:
+            intervalo, total = faixa.split(' ', 1)[1].split('/')
+            total = int(total) if total != '*' else sessao['total']
+        except (IndexError, ValueError):
+            self._erro(400, 'badContentRange', f'Content-Range inválido: {faixa!r}')
+            return
+
+        if intervalo == '*':
+            self.fake._count('consultas')
+        elif self.fake._sorteia_5xx():
+            # Os bytes desta parte são descartados, como se a conexão tivesse caído no meio
+            self.fake._count('erros_5xx')
+            self._erro(503, 'backendError', 'Erro simulado')
+            return
+        else:
+            inicio, fim = (int(valor) for valor in intervalo.split('-'))
+            with self.fake._lock:
+                # Parte fora de ordem é ignorada; o cliente se corrige pelo cabeçalho Range
+                if inicio == sessao['recebidos'] and fim - inicio + 1 == lidos:
+                    sessao['recebidos'] = fim + 1
+                sessao['total'] = total
+            self.fake._count('partes')
+            self.fake._count('bytes_recebidos', lidos)
+
+        recebidos = sessao['recebidos']
+        if total is not None and recebidos >= total:
+            if intervalo != '*':
+                self.fake._count('concluidos')
+            metadados = sessao['metadados']
+            self._responder(200, {'kind': 'youtube#video', 'id': f"fake{sessao_id[:11]}",
+                                  'snippet': metadados.get('snippet', {}),
+                                  'status': {**metadados.get('status', {}), 'uploadStatus': 'uploaded'}})
+            return
+        cabecalhos = {'Range': f"bytes=0-{recebidos - 1}"} if recebidos else {}
+        self._responder(308, cabecalhos=cabecalhos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso de upload do YouTube")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8089)
+    parser.add_argument('--banda-mbps', type=float, default=0, help="banda por conexão em Mbit/s (0 = sem limite)")
+    parser.add_argument('--latencia-ms', type=float, default=0)
+    parser.add_argument('--erro-5xx', type=float, default=0, help="chance (0 a 1) de cada requisição responder 503")
+    parser.add_argument('--cota-uploads', type=int, default=None, help="uploads aceitos antes do quotaExceeded")
+    args = parser.parse_args()
+
+    servidor = FakeYouTubeServer(args.host, args.porta,
+                                 banda_bytes_por_segundo=args.banda_mbps * 125000 or None,
+                                 latencia_segundos=args.latencia_ms / 1000,
+                                 taxa_erro_5xx=args.erro_5xx, cota_uploads=args.cota_uploads)
+    print(f"Servidor falso do YouTube em {servidor.url} (use YOUTUBE_API_ROOT_URL={servidor.url})")
+    try:
+        servidor._http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
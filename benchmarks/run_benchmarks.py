@@ -0,0 +1,642 @@
+# benchmarks/run_benchmarks.py
+# ============================================================================
+# BENCHMARKS LOCAIS DA API E DO WORKER
+# ============================================================================
+# Roda tudo na máquina, sem SQL Server, YouTube ou Gemini de verdade:
+# - banco SQLite (WAL) em uma pasta temporária, semeado com N agendamentos;
+# - servidor falso de upload do YouTube (fake_youtube.py) com banda, latência, 5xx e cota;
+# - FakeMetadataClient do metadata_service no lugar do Gemini.
+#
+# Cenários (p50/p95/p99 de latência e vazão de cada um):
+#   listagem      GET /api/agendamentos com 1k e 100k linhas (primeira página, cursor, filtro, 304, since)
+#   ingestao      POST /api/schedule/youtube e envio em partes (/api/uploads) com arquivos de vários tamanhos
+#   gemini        /api/generate-content/batch sem cache e com cache
+#   ponta_a_ponta agendamentos/minuto postados por 1..N processos worker.py reais
+#   cota          adiamento quando a cota acaba (pelo registro local e pelo 403 do YouTube)
+#
+# Uso:
+#   python benchmarks/run_benchmarks.py                       (tudo; grava benchmarks/resultados/<data>-<commit>.json)
+#   python benchmarks/run_benchmarks.py --rapido --cenarios listagem,ingestao
+#   python benchmarks/run_benchmarks.py --comparar antes.json depois.json
+#
+# Requer as mesmas dependências do app.py (Flask, SQLAlchemy, google-api-python-client).
+
+import os
+import io
+import sys
+import json
+import math
+import time
+import pickle
+import random
+import shutil
+import socket
+import hashlib
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_REPOSITORIO = os.path.dirname(PASTA_BENCHMARKS)
+PASTA_RESULTADOS = os.path.join(PASTA_BENCHMARKS, 'resultados')
+sys.path.insert(0, PASTA_REPOSITORIO)
+sys.path.insert(0, PASTA_BENCHMARKS)
+
+from fake_youtube import FakeYouTubeServer
+
+CENARIOS = ('listagem', 'ingestao', 'gemini', 'ponta_a_ponta', 'cota')
+VERSAO_FORMATO = 1
+SEMENTE = 1234
+MB = 1024 * 1024
+
+# Métricas comparadas por --comparar: maior é melhor nas de vazão, menor nas de latência
+METRICAS_VAZAO = ('ops_por_segundo', 'mb_por_segundo', 'agendamentos_por_minuto', 'resumos_por_segundo')
+METRICAS_LATENCIA = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+# ----------------------------------------------------------------------------
+# ESTATÍSTICAS
+# ----------------------------------------------------------------------------
+def percentile(ordenadas, p):
+    """Percentil pelo método nearest-rank sobre uma lista já ordenada."""
+    indice = max(0, min(len(ordenadas) - 1, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+def summarize(duracoes):
+    """Resumo de uma lista de durações em segundos."""
+    if not duracoes:
+        return {'n': 0}
+    ordenadas = sorted(duracoes)
+    total = sum(ordenadas)
+    return {
+        'n': len(ordenadas),
+        'p50_ms': round(percentile(ordenadas, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordenadas, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordenadas, 99) * 1000, 3),
+        'media_ms': round(total / len(ordenadas) * 1000, 3),
+        'max_ms': round(ordenadas[-1] * 1000, 3),
+        'ops_por_segundo': round(len(ordenadas) / total, 2) if total else None,
+    }
+
+
+def measure(funcao, repeticoes, preparar=None):
+    """Mede funcao(indice), ou funcao(preparar(indice)) com a preparação fora do tempo medido."""
+    duracoes = []
+    for indice in range(repeticoes):
+        argumento = preparar(indice) if preparar else indice
+        inicio = time.perf_counter()
+        funcao(argumento)
+        duracoes.append(time.perf_counter() - inicio)
+    return summarize(duracoes)
+
+
+# ----------------------------------------------------------------------------
+# AMBIENTE ISOLADO
+# ----------------------------------------------------------------------------
+def free_port(tipo=socket.SOCK_DGRAM):
+    with socket.socket(socket.AF_INET, tipo) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PASTA_REPOSITORIO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_fake_token(pasta):
+    """Token que nunca expira e não tem refresh_token: o CredentialManager usa sem abrir o navegador."""
+    from google.oauth2.credentials import Credentials
+    with open(os.path.join(pasta, 'token.pickle'), 'wb') as token:
+        pickle.dump(Credentials(token='benchmark'), token)
+
+
+def base_environment(pasta, url_youtube):
+    """Variáveis lidas pelo app.py/worker.py na importação, apontando tudo para a pasta temporária."""
+    return {
+        'DATABASE_BACKEND': 'sqlite',
+        'SQLITE_PATH': os.path.join(pasta, 'agendamentos.db'),
+        'DATABASE_URL': '',
+        'PREPARO_VIDEO': 'desligado',
+        'YOUTUBE_API_ROOT_URL': url_youtube,
+        'YOUTUBE_PROJETO': 'benchmark',
+        'YOUTUBE_COTA_DIARIA': str(10 ** 9),
+        'WORKER_NOTIFY_ADDRS': f"127.0.0.1:{free_port()}",
+        'WORKER_METRICS_PORT': '0',
+        'LOG_LEVEL': 'WARNING',
+        'GEMINI_API_KEY': '',
+        # Falhas temporárias do YouTube falso voltam para a fila logo, sem a espera de produção
+        'RETENTATIVA_BASE_SEGUNDOS': '1',
+        'RETENTATIVA_MAXIMA_SEGUNDOS': '5',
+    }
+
+
+def load_app(pasta, url_youtube):
+    """Importa o app.py com o banco e as pastas dentro de `pasta` (o app usa caminhos relativos)."""
+    os.environ.update(base_environment(pasta, url_youtube))
+    os.chdir(pasta)
+    write_fake_token(pasta)
+    import App
+    return App
+
+
+def new_video_bytes(tamanho, indice):
+    """Conteúdo único por índice, para o armazenamento por hash não reaproveitar o arquivo anterior."""
+    rng = random.Random(SEMENTE + indice)
+    bloco = rng.randbytes(MB) if hasattr(rng, 'randbytes') else os.urandom(MB)
+    dados = bytearray(bloco * (tamanho // MB + 1))[:tamanho]
+    dados[:16] = hashlib.md5(f"{indice}".encode()).digest()
+    return bytes(dados)
+
+
+def seed_agendamentos(engine, tabela, quantidade, caminho_video, bytes_total, inicio, status_pesos, lote=5000):
+    """Insere `quantidade` agendamentos em lotes, com horários espalhados a partir de `inicio`."""
+    from sqlalchemy import insert
+    rng = random.Random(SEMENTE)
+    status, pesos = zip(*status_pesos.items())
+    with engine.begin() as conexao:
+        for deslocamento in range(0, quantidade, lote):
+            linhas = []
+            for indice in range(deslocamento, min(quantidade, deslocamento + lote)):
+                linhas.append({
+                    'plataforma': 'youtube',
+                    'caminho_video': caminho_video,
+                    'titulo': f"Vídeo de benchmark {indice}",
+                    'descricao': "Descrição gerada para o benchmark. " * 8,
+                    'hashtags': '#benchmark, #teste',
+                    'data_agendamento': inicio + datetime.timedelta(seconds=rng.randint(0, 30 * 86400)),
+                    'status': rng.choices(status, pesos)[0],
+                    'bytes_total': bytes_total,
+                    'prioridade': rng.randint(0, 3),
+                })
+            conexao.execute(insert(tabela), linhas)
+
+
+# ----------------------------------------------------------------------------
+# CENÁRIO: LISTAGEM
+# ----------------------------------------------------------------------------
+def bench_listagem(App, parametros):
+    cliente = App.app.test_client()
+    repeticoes = parametros['repeticoes']
+    resultados = {}
+    existentes = 0
+    inicio = datetime.datetime.now() - datetime.timedelta(days=15)
+    for linhas in parametros['linhas_listagem']:
+        seed_agendamentos(App.engine, App.Agendamento.__table__, linhas - existentes, 'uploads/inexistente.mp4',
+                          10 * MB, inicio, {'postado': 70, 'agendado': 20, 'erro': 10})
+        existentes = linhas
+
+        primeira = cliente.get('/api/agendamentos?limit=100').get_json()
+        etag = cliente.get('/api/agendamentos?limit=100').headers.get('ETag')
+        # Cursores de páginas seguidas, para medir a paginação longe do começo
+        cursores = []
+        cursor = primeira['proximo_cursor']
+        while cursor and len(cursores) < repeticoes:
+            cursores.append(cursor)
+            cursor = cliente.get('/api/agendamentos', query_string={'limit': 100, 'cursor': cursor}).get_json()['proximo_cursor']
+        versao_recente = primeira['versao'] - 2 * App.DELTA_WINDOW_MICROS
+
+        def pagina_cursor(indice):
+            cliente.get('/api/agendamentos', query_string={'limit': 100, 'cursor': cursores[indice % len(cursores)]})
+
+        consultas = {
+            'primeira_pagina': lambda indice: cliente.get('/api/agendamentos?limit=100'),
+            'pagina_com_cursor': pagina_cursor if cursores else None,
+            'filtro_status': lambda indice: cliente.get('/api/agendamentos?limit=100&status=agendado,erro'),
+            'nao_modificado_304': lambda indice: cliente.get('/api/agendamentos?limit=100',
+                                                              headers={'If-None-Match': etag}),
+            'alteracoes_since': lambda indice: cliente.get(f'/api/agendamentos?since={versao_recente}'),
+        }
+        resultados[str(linhas)] = {nome: measure(consulta, repeticoes)
+                                   for nome, consulta in consultas.items() if consulta}
+        print(f"  listagem com {linhas} linhas: p50 da primeira página "
+              f"{resultados[str(linhas)]['primeira_pagina']['p50_ms']} ms")
+    return resultados
+
+
+# ----------------------------------------------------------------------------
+# CENÁRIO: INGESTÃO
+# ----------------------------------------------------------------------------
+def bench_ingestao(App, parametros):
+    cliente = App.app.test_client()
+    agendar_em = (datetime.datetime.now() + datetime.timedelta(days=365)).isoformat()
+    contador = iter(range(10 ** 9))
+    resultados = {}
+    for tamanho_mb in parametros['tamanhos_mb']:
+        tamanho = int(tamanho_mb * MB)
+        # Arquivos grandes repetem menos vezes; cada repetição usa um conteúdo novo, gerado fora da medição
+        repeticoes = max(3, parametros['repeticoes_ingestao'] * 10 // max(10, int(tamanho_mb)))
+
+        def novo_video(indice):
+            return new_video_bytes(tamanho, next(contador))
+
+        def envio_simples(dados):
+            resposta = cliente.post('/api/schedule/youtube', content_type='multipart/form-data', data={
+                'video': (io.BytesIO(dados), 'benchmark.mp4'),
+                'title': 'Benchmark', 'scheduled_time': agendar_em,
+            })
+            assert resposta.status_code == 201, resposta.get_json()
+
+        def envio_em_partes(dados):
+            sessao = cliente.post('/api/uploads', json={'filename': 'benchmark.mp4', 'size': len(dados)}).get_json()
+            for numero in range(sessao['total_chunks']):
+                parte = dados[numero * sessao['chunk_size']:(numero + 1) * sessao['chunk_size']]
+                resposta = cliente.put(f"/api/uploads/{sessao['upload_id']}/chunks/{numero}", data=parte,
+                                       headers={'X-Chunk-Sha256': hashlib.sha256(parte).hexdigest()})
+                assert resposta.status_code == 200, resposta.get_json()
+            resposta = cliente.post(f"/api/uploads/{sessao['upload_id']}/finalize",
+                                    json={'title': 'Benchmark', 'scheduled_time': agendar_em})
+            assert resposta.status_code == 201, resposta.get_json()
+
+        chave = f"{tamanho_mb:g}MB"
+        resultados[chave] = {}
+        for nome, funcao in (('envio_simples', envio_simples), ('envio_em_partes', envio_em_partes)):
+            estatisticas = measure(funcao, repeticoes, preparar=novo_video)
+            estatisticas['mb_por_segundo'] = round(tamanho_mb * 1000 / estatisticas['p50_ms'], 2)
+            resultados[chave][nome] = estatisticas
+        print(f"  ingestão de {chave}: p50 {resultados[chave]['envio_simples']['p50_ms']} ms "
+              f"({resultados[chave]['envio_simples']['mb_por_segundo']} MB/s)")
+    return resultados
+
+
+# ----------------------------------------------------------------------------
+# CENÁRIO: GEMINI (CLIENTE FALSO)
+# ----------------------------------------------------------------------------
+def bench_gemini(App, parametros):
+    from metadata_service import MetadataService, FakeMetadataClient, ResponseCache, TokenRateLimiter
+    cliente_falso = FakeMetadataClient(latency_seconds=parametros['latencia_gemini_ms'] / 1000)
+    App.metadata_service = MetadataService(cliente_falso, cache=ResponseCache(), rate_limiter=TokenRateLimiter(10 ** 9),
+                                           max_concurrency=App.GEMINI_MAX_CONCORRENCIA)
+    cliente = App.app.test_client()
+    tamanho_lote = min(parametros['lote_gemini'], App.GEMINI_MAX_LOTE)
+    lotes = [[f"Resumo {lote}-{item}: tutorial de python sobre filas e agendamento de vídeos"
+              for item in range(tamanho_lote)] for lote in range(parametros['repeticoes_gemini'])]
+
+    def lote(indice):
+        resposta = cliente.post('/api/generate-content/batch', json={'summaries': lotes[indice]})
+        assert resposta.status_code == 200, resposta.get_json()
+
+    resultados = {'sem_cache': measure(lote, len(lotes)), 'com_cache': measure(lote, len(lotes))}
+    for estatisticas in resultados.values():
+        estatisticas['resumos_por_segundo'] = round(tamanho_lote * 1000 / estatisticas['media_ms'], 2)
+    resultados['chamadas_ao_cliente'] = cliente_falso.calls
+    resultados['tamanho_lote'] = tamanho_lote
+    print(f"  gemini: lote de {tamanho_lote} em {resultados['sem_cache']['p50_ms']} ms sem cache, "
+          f"{resultados['com_cache']['p50_ms']} ms com cache")
+    return resultados
+
+
+# ----------------------------------------------------------------------------
+# CENÁRIO: PONTA A PONTA COM PROCESSOS worker.py
+# ----------------------------------------------------------------------------
+def start_workers(pasta, quantidade, url_youtube, extras):
+    """Sobe `quantidade` processos worker.py com portas próprias; a saída de cada um vai para um arquivo."""
+    processos = []
+    for indice in range(quantidade):
+        porta = free_port()
+        ambiente = {**os.environ, **base_environment(pasta, url_youtube), **extras,
+                    'WORKER_ID': f"bench-{indice}", 'WORKER_NOTIFY_PORT': str(porta), 'LOG_LEVEL': 'INFO'}
+        saida = open(os.path.join(pasta, f"worker-{indice}.log"), 'w', encoding='utf-8')
+        processo = subprocess.Popen([sys.executable, os.path.join(PASTA_REPOSITORIO, 'worker.py')],
+                                    cwd=pasta, env=ambiente, stdout=saida, stderr=subprocess.STDOUT)
+        processos.append((processo, porta, saida))
+    return processos
+
+
+def wait_workers_ready(pasta, processos, timeout):
+    """Espera cada worker carregar a fila pela primeira vez (evento fila_recarregada no log)."""
+    limite = time.monotonic() + timeout
+    for indice, (processo, _, _) in enumerate(processos):
+        caminho = os.path.join(pasta, f"worker-{indice}.log")
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"worker {indice} saiu com código {processo.returncode}; veja {caminho}")
+            with open(caminho, encoding='utf-8', errors='replace') as log:
+                if '"fila_recarregada"' in log.read():
+                    break
+            if time.monotonic() > limite:
+                raise RuntimeError(f"worker {indice} não ficou pronto em {timeout}s; veja {caminho}")
+            time.sleep(0.1)
+
+
+def stop_workers(processos):
+    for processo, _, saida in processos:
+        processo.terminate()
+    for processo, _, saida in processos:
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+        saida.close()
+
+
+def notify_workers(processos):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for _, porta, _ in processos:
+            s.sendto(b'recarregar', ('127.0.0.1', porta))
+
+
+def count_failures(contagens):
+    return contagens.get('erro', 0) + contagens.get('esgotado', 0)
+
+
+def run_drain(App, pasta_base, nome, parametros, quantidade_workers, servidor, prazo_final,
+              extras=None, parar_quando=None):
+    """
+    Sobe os workers, agenda os vídeos já vencidos, avisa os workers e mede até a fila esvaziar
+    (ou até parar_quando(contagens) ser verdadeiro). Para na hora se algum agendamento cair em
+    'erro' ou 'esgotado', ou se passar do prazo do cenário ou de prazo_final (time.monotonic()) da execução.
+    Retorna as contagens, os tempos e as falhas (resultado['ok'] é falso se houve alguma).
+    """
+    from sqlalchemy import func, select
+    pasta = os.path.join(pasta_base, nome)
+    os.makedirs(os.path.join(pasta, 'uploads'))
+    write_fake_token(pasta)
+    ambiente = base_environment(pasta, servidor.url)
+
+    # Banco próprio do cenário, criado com os modelos do app.py
+    engine = App.create_storage_engine(f"sqlite:///{ambiente['SQLITE_PATH']}")
+    App.Base.metadata.create_all(engine)
+    tamanho = int(parametros['tamanho_video_mb'] * MB)
+    caminho_video = os.path.join(pasta, 'uploads', 'benchmark.mp4')
+    with open(caminho_video, 'wb') as video:
+        video.write(new_video_bytes(tamanho, 0))
+
+    processos = start_workers(pasta, quantidade_workers, servidor.url,
+                              {'UPLOAD_CHUNK_MB': str(parametros['chunk_mb']),
+                               'MAX_UPLOADS_SIMULTANEOS': str(parametros['uploads_por_worker']), **(extras or {})})
+    tabela = App.Agendamento.__table__
+    try:
+        wait_workers_ready(pasta, processos, timeout=60)
+        antes = servidor.snapshot()
+        quantidade = parametros['agendamentos']
+        seed_agendamentos(engine, tabela, quantidade, caminho_video, tamanho,
+                          datetime.datetime.now() - datetime.timedelta(days=31), {'agendado': 1})
+        inicio_relogio = datetime.datetime.now()
+        inicio = time.monotonic()
+        notify_workers(processos)
+
+        limite = min(inicio + parametros['timeout_ponta_a_ponta'], prazo_final)
+        esgotou_tempo = False
+        while True:
+            with engine.connect() as conexao:
+                contagens = dict(conexao.execute(select(tabela.c.status, func.count()).group_by(tabela.c.status)).all())
+            # Uma falha já invalida a medição: não adianta esperar o resto da fila (nem o backoff das novas tentativas)
+            if count_failures(contagens):
+                break
+            if parar_quando(contagens) if parar_quando else contagens.get('postado', 0) >= quantidade:
+                break
+            if time.monotonic() > limite:
+                esgotou_tempo = True
+                break
+            time.sleep(0.2)
+        duracao = time.monotonic() - inicio
+
+        with engine.connect() as conexao:
+            concluidos = [linha[0] for linha in conexao.execute(
+                select(tabela.c.atualizado_em).where(tabela.c.status == 'postado'))]
+            adiados = conexao.execute(select(func.count()).where(
+                tabela.c.status == 'agendado', tabela.c.mensagem_erro.like('Adiado:%'))).scalar()
+            mensagens_falha = [linha[0] for linha in conexao.execute(
+                select(tabela.c.mensagem_erro).where(tabela.c.status.in_(('erro', 'esgotado'))).limit(5))]
+    finally:
+        stop_workers(processos)
+        engine.dispose()
+
+    depois = servidor.snapshot()
+    return {
+        'workers': quantidade_workers,
+        'agendamentos': quantidade,
+        'duracao_segundos': round(duracao, 3),
+        'status': contagens,
+        'adiados_por_cota': adiados,
+        'agendamentos_por_minuto': round(contagens.get('postado', 0) / duracao * 60, 2) if duracao else None,
+        'tempo_ate_postar': summarize([(fim - inicio_relogio).total_seconds() for fim in concluidos]),
+        'youtube_falso': {chave: depois[chave] - antes[chave] for chave in depois},
+        'esgotou_tempo': esgotou_tempo,
+        'falhas': {'erro': contagens.get('erro', 0), 'esgotado': contagens.get('esgotado', 0),
+                   'mensagens': mensagens_falha},
+        'ok': not esgotou_tempo and not count_failures(contagens),
+    }
+
+
+def describe_failure(resultado):
+    """Texto curto do motivo de um run_drain ter falhado, para a saída do terminal."""
+    if resultado['esgotou_tempo']:
+        return f"FALHOU: prazo esgotado após {resultado['duracao_segundos']}s com status {resultado['status']}"
+    falhas = resultado['falhas']
+    return (f"FALHOU: {falhas['erro']} em erro e {falhas['esgotado']} esgotado(s); "
+            f"primeiras mensagens: {falhas['mensagens']}")
+
+
+def bench_ponta_a_ponta(App, pasta, parametros, servidor, prazo_final):
+    resultados = {}
+    for quantidade_workers in range(1, parametros['max_workers'] + 1):
+        resultado = run_drain(App, pasta, f"ponta_a_ponta_{quantidade_workers}", parametros,
+                              quantidade_workers, servidor, prazo_final)
+        resultados[str(quantidade_workers)] = resultado
+        if not resultado['ok']:
+            # Com mais workers o problema só se repete; o resto do prazo fica para os outros cenários
+            print(f"  {quantidade_workers} worker(s): {describe_failure(resultado)}")
+            break
+        print(f"  {quantidade_workers} worker(s): {resultado['agendamentos_por_minuto']} agendamentos/min, "
+              f"status {resultado['status']}")
+    return resultados
+
+
+def bench_cota(App, pasta, parametros, servidor_base, prazo_final):
+    """Confere o adiamento por cota: o worker não deve marcar nenhum agendamento como 'erro'."""
+    uploads_na_cota = 3
+    parametros = {**parametros, 'agendamentos': uploads_na_cota * 3}
+    resultados = {}
+
+    def estabilizou(contagens):
+        return contagens.get('postado', 0) >= uploads_na_cota and not contagens.get('processando')
+
+    # 1) Registro local: a cota configurada só comporta uploads_na_cota envios
+    resultados['registro_local'] = run_drain(
+        App, pasta, 'cota_registro', parametros, 1, servidor_base, prazo_final,
+        extras={'YOUTUBE_COTA_DIARIA': str(uploads_na_cota * 1600), 'YOUTUBE_CUSTO_UPLOAD': '1600'},
+        parar_quando=estabilizou)
+
+    # 2) O YouTube recusa com quotaExceeded antes de o registro local perceber
+    servidor = FakeYouTubeServer(banda_bytes_por_segundo=servidor_base.banda_bytes_por_segundo,
+                                 latencia_segundos=servidor_base.latencia_segundos,
+                                 cota_uploads=uploads_na_cota, semente=SEMENTE).start()
+    try:
+        resultados['recusa_do_youtube'] = run_drain(
+            App, pasta, 'cota_youtube', parametros, 1, servidor, prazo_final,
+            parar_quando=lambda contagens: estabilizou(contagens) and servidor.snapshot()['cota_recusada'] > 0)
+    finally:
+        servidor.stop()
+
+    for nome, resultado in resultados.items():
+        postados = resultado['status'].get('postado', 0)
+        if not resultado['ok']:
+            print(f"  cota ({nome}): {describe_failure(resultado)}")
+            continue
+        resultado['ok'] = postados == uploads_na_cota
+        print(f"  cota ({nome}): {postados} postados, {resultado['status'].get('agendado', 0)} esperando o reset, "
+              f"{'ok' if resultado['ok'] else 'INESPERADO'}")
+    return resultados
+
+
+# ----------------------------------------------------------------------------
+# COMPARAÇÃO ENTRE EXECUÇÕES
+# ----------------------------------------------------------------------------
+def flatten(dados, prefixo=''):
+    for chave, valor in dados.items():
+        caminho = f"{prefixo}.{chave}" if prefixo else chave
+        if isinstance(valor, dict):
+            yield from flatten(valor, caminho)
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool) \
+                and chave in METRICAS_VAZAO + METRICAS_LATENCIA:
+            yield caminho, chave, valor
+
+
+def find_failures(dados, prefixo=''):
+    """Caminhos dos resultados marcados com ok = False (agendamentos em erro/esgotado ou prazo esgotado)."""
+    for chave, valor in dados.items():
+        caminho = f"{prefixo}.{chave}" if prefixo else chave
+        if isinstance(valor, dict):
+            if valor.get('ok') is False:
+                yield caminho, valor
+            else:
+                yield from find_failures(valor, caminho)
+
+
+def compare(arquivo_antes, arquivo_depois, tolerancia):
+    """Mostra a variação de cada métrica; devolve 1 se alguma piorou mais que a tolerância (%)."""
+    with open(arquivo_antes, encoding='utf-8') as f:
+        antes = json.load(f)
+    with open(arquivo_depois, encoding='utf-8') as f:
+        depois = json.load(f)
+    valores_antes = {caminho: valor for caminho, _, valor in flatten(antes['resultados'])}
+    print(f"antes:  {antes.get('commit')} ({antes.get('criado_em')})")
+    print(f"depois: {depois.get('commit')} ({depois.get('criado_em')})")
+    pioras = 0
+    for caminho, chave, valor in flatten(depois['resultados']):
+        anterior = valores_antes.get(caminho)
+        if not anterior:
+            continue
+        variacao = (valor - anterior) / anterior * 100
+        piorou = variacao < -tolerancia if chave in METRICAS_VAZAO else variacao > tolerancia
+        pioras += piorou
+        print(f"{'PIOROU ' if piorou else '       '}{caminho:<70} {anterior:>12.2f} -> {valor:>12.2f} ({variacao:+.1f}%)")
+    print(f"{pioras} métrica(s) piorou(aram) mais de {tolerancia:g}%.")
+    return 1 if pioras else 0
+
+
+# ----------------------------------------------------------------------------
+# EXECUÇÃO
+# ----------------------------------------------------------------------------
+def build_parameters(args):
+    rapido = args.rapido
+    return {
+        'repeticoes': 20 if rapido else 200,
+        'linhas_listagem': [1000] if rapido else [1000, 100000],
+        'tamanhos_mb': [1, 10] if rapido else [1, 10, 100],
+        'repeticoes_ingestao': 5 if rapido else 20,
+        'latencia_gemini_ms': 200,
+        'lote_gemini': 20,
+        'repeticoes_gemini': 3 if rapido else 10,
+        'max_workers': args.workers or (2 if rapido else 4),
+        'agendamentos': 12 if rapido else 60,
+        'tamanho_video_mb': 2 if rapido else 8,
+        'chunk_mb': 1,
+        'uploads_por_worker': 4,
+        'timeout_ponta_a_ponta': 120 if rapido else 600,
+        'prazo_total_minutos': args.prazo_minutos,
+        'banda_mbps': args.banda_mbps,
+        'latencia_ms': args.latencia_ms,
+        'erro_5xx': args.erro_5xx,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks locais da API e do worker")
+    parser.add_argument('--cenarios', default=','.join(CENARIOS), help=f"separados por vírgula: {', '.join(CENARIOS)}")
+    parser.add_argument('--rapido', action='store_true', help="menos linhas, arquivos menores e menos repetições")
+    parser.add_argument('--workers', type=int, default=None, help="mede de 1 até este número de workers")
+    parser.add_argument('--banda-mbps', type=float, default=200, help="banda por conexão do YouTube falso (Mbit/s)")
+    parser.add_argument('--latencia-ms', type=float, default=20, help="latência por requisição do YouTube falso")
+    parser.add_argument('--erro-5xx', type=float, default=0.01, help="chance de 503 por requisição do YouTube falso")
+    parser.add_argument('--saida', default=None, help="arquivo JSON (padrão: benchmarks/resultados/<data>-<commit>.json)")
+    parser.add_argument('--prazo-minutos', type=float, default=60,
+                        help="prazo total dos cenários com workers; ao passar dele o cenário é encerrado como falha")
+    parser.add_argument('--manter-pasta', action='store_true', help="não apaga a pasta temporária (logs dos workers)")
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'), help="compara dois resultados e sai")
+    parser.add_argument('--tolerancia', type=float, default=10, help="variação (%%) tolerada por --comparar")
+    args = parser.parse_args()
+
+    if args.comparar:
+        sys.exit(compare(*args.comparar, args.tolerancia))
+
+    cenarios = [nome.strip() for nome in args.cenarios.split(',') if nome.strip()]
+    desconhecidos = set(cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+    parametros = build_parameters(args)
+    # Fica fora do relatório: é um instante do relógio monotônico, sem sentido fora desta execução
+    prazo_final = time.monotonic() + args.prazo_minutos * 60
+    commit = git_commit()
+    pasta = tempfile.mkdtemp(prefix='postador-benchmark-')
+    servidor = FakeYouTubeServer(banda_bytes_por_segundo=args.banda_mbps * 125000 or None,
+                                 latencia_segundos=args.latencia_ms / 1000,
+                                 taxa_erro_5xx=args.erro_5xx, semente=SEMENTE).start()
+    resultados = {}
+    try:
+        # A API medida em processo tem o seu próprio banco; cada execução de workers cria outro
+        os.makedirs(os.path.join(pasta, 'api'))
+        App = load_app(os.path.join(pasta, 'api'), servidor.url)
+        # Listagem antes da ingestão, para as contagens de linhas serem exatas
+        for nome in cenarios:
+            print(f"Cenário {nome}...")
+            if nome == 'listagem':
+                resultados[nome] = bench_listagem(App, parametros)
+            elif nome == 'ingestao':
+                resultados[nome] = bench_ingestao(App, parametros)
+            elif nome == 'gemini':
+                resultados[nome] = bench_gemini(App, parametros)
+            elif nome == 'ponta_a_ponta':
+                resultados[nome] = bench_ponta_a_ponta(App, pasta, parametros, servidor, prazo_final)
+            elif nome == 'cota':
+                resultados[nome] = bench_cota(App, pasta, parametros, servidor, prazo_final)
+    finally:
+        servidor.stop()
+        os.chdir(PASTA_REPOSITORIO)
+        if args.manter_pasta:
+            print(f"Pasta do benchmark mantida em {pasta}")
+        else:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    relatorio = {
+        'versao_formato': VERSAO_FORMATO,
+        'criado_em': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'ambiente': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                     'processador': platform.processor() or platform.machine(), 'cpus': os.cpu_count()},
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+    saida = args.saida
+    if not saida:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        saida = os.path.join(PASTA_RESULTADOS, f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{(commit or 'sem-git')[:8]}.json")
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2, default=str)
+    print(f"Resultados gravados em {saida}")
+    falhos = [caminho for caminho, valor in find_failures(resultados)]
+    if falhos:
+        print(f"Cenário(s) com falha: {', '.join(falhos)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# disk_manager.py
+# ============================================================================
+# ESPAÇO EM DISCO DA PASTA uploads/: ADMISSÃO DE VÍDEOS NOVOS E LIMPEZA
+# ============================================================================
+# O app.py consulta check_admission() antes de aceitar um vídeo, para recusar na hora um
+# envio que não caberia no disco (ou na cota de bytes pendentes) em vez de falhar no meio
+# da gravação. O worker chama collect() de tempos em tempos com a lista de arquivos que
+# ainda são usados por algum agendamento; o resto (vídeos órfãos, de falhas antigas,
+# arquivos temporários e sessões de envio abandonadas) é apagado depois de um prazo de carência.
+# Gravações longas que ainda não chegaram ao banco (a importação em lote, por exemplo) registram
+# os seus arquivos com protect(): o marcador fica em disco, então vale também para o worker.
+# Aqui fica só a parte do sistema de arquivos; as consultas ao banco continuam no app.py.
+
+import os
+import json
+import time
+import uuid
+import shutil
+import contextlib
+
+
+def normalize_path(caminho):
+    """Forma comparável de um caminho (absoluto e, no Windows, sem diferença de maiúsculas)."""
+    return os.path.normcase(os.path.abspath(caminho))
+
+
+class _Protection:
+    """Arquivos protegidos da limpeza por um marcador (um caminho por linha)."""
+
+    def __init__(self, marcador):
+        self.marcador = marcador
+
+    def add(self, caminho):
+        # Cada linha nova também renova a data do marcador, que só expira parado
+        with open(self.marcador, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(normalize_path(caminho) + '\n')
+
+
+class DiskManager:
+    """
+    Regras de espaço de uma pasta de vídeos. Limites em bytes; cota_pendente_bytes = 0 desliga a cota.
+    Arquivos sem agendamento só são apagados depois de `carencia_segundos` sem alteração, o que protege
+    um vídeo recém-gravado cujo agendamento ainda não chegou ao banco.
+    """
+
+    def __init__(self, pasta, pasta_sessoes, reserva_bytes=0, cota_pendente_bytes=0,
+                 carencia_segundos=3600, sessoes_validade_segundos=24 * 3600):
+        self.pasta = pasta
+        self.pasta_sessoes = pasta_sessoes
+        self.reserva_bytes = reserva_bytes
+        self.cota_pendente_bytes = cota_pendente_bytes
+        self.carencia_segundos = carencia_segundos
+        self.sessoes_validade_segundos = sessoes_validade_segundos
+        self.pasta_protecoes = os.path.join(pasta, '.protegidos')
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.pasta).free
+
+    def session_bytes(self):
+        """Bytes reservados pelas sessões de envio em partes ainda abertas (o tamanho declarado de cada uma)."""
+        total = 0
+        for nome in self._list_sessions():
+            try:
+                with open(os.path.join(self.pasta_sessoes, nome, 'meta.json'), 'r', encoding='utf-8') as arquivo_meta:
+                    total += int(json.load(arquivo_meta).get('size', 0))
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def check_admission(self, tamanho, bytes_pendentes, bytes_gravados=None):
+        """
+        Confere se um vídeo de `tamanho` bytes pode ser aceito. bytes_pendentes são os vídeos que já estão
+        na fila (ainda não postados). bytes_gravados é o que será de fato escrito no disco, quando
+        for menos que o tamanho (vídeos importados por hard link não ocupam espaço novo).
+        Retorna None se cabe, ou a mensagem explicando por que não cabe.
+        """
+        gravados = tamanho if bytes_gravados is None else bytes_gravados
+        livres = self.free_bytes() - self.reserva_bytes
+        if gravados and gravados > livres:
+            return (f"Sem espaço em disco no servidor: o vídeo tem {gravados / 1024 ** 2:.0f} MB e há "
+                    f"{max(livres, 0) / 1024 ** 2:.0f} MB livres (fora a reserva de {self.reserva_bytes / 1024 ** 2:.0f} MB).")
+        if self.cota_pendente_bytes and bytes_pendentes + tamanho > self.cota_pendente_bytes:
+            return (f"A fila já tem {bytes_pendentes / 1024 ** 3:.1f} GB de vídeos esperando o upload "
+                    f"(limite de {self.cota_pendente_bytes / 1024 ** 3:.1f} GB). Tente de novo depois que alguns forem postados.")
+        return None
+
+    def usage(self, bytes_pendentes):
+        """Resumo do uso do disco para a API e as métricas."""
+        uso = shutil.disk_usage(self.pasta)
+        return {
+            'livres_bytes': uso.free,
+            'total_bytes': uso.total,
+            'reserva_bytes': self.reserva_bytes,
+            'pendentes_bytes': bytes_pendentes,
+            'sessoes_abertas_bytes': self.session_bytes(),
+            'cota_pendente_bytes': self.cota_pendente_bytes or None,
+        }
+
+    @contextlib.contextmanager
+    def protect(self):
+        """
+        Protege da limpeza os arquivos registrados com add() antes de criá-los, mesmo os que têm data
+        antiga (hard links mantêm a data do original). O marcador não é apagado ao sair: continua valendo
+        pela carência, para cobrir uma limpeza que leu o banco antes do commit dos agendamentos.
+        """
+        os.makedirs(self.pasta_protecoes, exist_ok=True)
+        protecao = _Protection(os.path.join(self.pasta_protecoes, f"{uuid.uuid4().hex}.txt"))
+        yield protecao
+
+    def _protected_paths(self, agora):
+        """Caminhos dos marcadores ainda válidos; os parados há mais que a carência são apagados."""
+        protegidos = set()
+        try:
+            entradas = list(os.scandir(self.pasta_protecoes))
+        except FileNotFoundError:
+            return protegidos
+        for entrada in entradas:
+            try:
+                if agora - entrada.stat().st_mtime > self.carencia_segundos:
+                    os.remove(entrada.path)
+                    continue
+                with open(entrada.path, 'r', encoding='utf-8') as arquivo:
+                    protegidos.update(linha.strip() for linha in arquivo if linha.strip())
+            except OSError:
+                continue
+        return protegidos
+
+    def _list_sessions(self):
+        try:
+            return [nome for nome in os.listdir(self.pasta_sessoes)
+                    if os.path.isdir(os.path.join(self.pasta_sessoes, nome))]
+        except FileNotFoundError:
+            return []
+
+    def collect(self, referenciados, agora=None):
+        """
+        Apaga da pasta os arquivos que não estão em `referenciados` (caminhos dos vídeos que algum agendamento
+        ainda usa) e estão parados há mais que a carência, e as sessões de envio abandonadas.
+        Retorna {'arquivos': quantidade, 'bytes': total, 'sessoes': quantidade}.
+        """
+        agora = agora or time.time()
+        referenciados = {normalize_path(caminho) for caminho in referenciados}
+        resultado = {'arquivos': 0, 'bytes': 0, 'sessoes': 0}
+        candidatos = []
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file(follow_symlinks=False) or normalize_path(entrada.path) in referenciados:
+                    continue
+                # Inclui os '.recebendo-*' de requisições que caíram no meio do envio
+                info = entrada.stat(follow_symlinks=False)
+                if agora - info.st_mtime >= self.carencia_segundos:
+                    candidatos.append((entrada.path, info))
+        # Os marcadores são lidos depois da varredura: quem protege registra o arquivo antes de criá-lo
+        protegidos = self._protected_paths(agora)
+        for caminho, info in candidatos:
+            if normalize_path(caminho) in protegidos:
+                continue
+            try:
+                os.remove(caminho)
+            except OSError:
+                continue  # Em uso (Windows) ou já apagado por outro worker
+            resultado['arquivos'] += 1
+            resultado['bytes'] += info.st_size
+
+        for nome in self._list_sessions():
+            pasta = os.path.join(self.pasta_sessoes, nome)
+            try:
+                # A sessão só conta como abandonada se nenhuma parte chegou dentro da validade
+                ultima_alteracao = max(os.path.getmtime(os.path.join(pasta, item)) for item in os.listdir(pasta))
+            except (OSError, ValueError):
+                continue
+            if agora - ultima_alteracao < self.sessoes_validade_segundos:
+                continue
+            resultado['bytes'] += sum(entrada.stat().st_size for entrada in os.scandir(pasta) if entrada.is_file())
+            shutil.rmtree(pasta, ignore_errors=True)
+            resultado['sessoes'] += 1
+        return resultado
@@ -0,0 +1,122 @@
+# manifest.py
+# ============================================================================
+# LEITURA DE MANIFESTOS PARA O AGENDAMENTO EM LOTE
+# ============================================================================
+# O app.py recebe em /api/schedule/youtube/bulk um manifesto (CSV com cabeçalho ou JSON Lines)
+# com uma linha por vídeo, ou o nome de uma pasta do servidor com os vídeos. Aqui ficam só a
+# leitura e a normalização das linhas e a resolução segura dos caminhos; a validação dos campos
+# do agendamento e a gravação no banco continuam no app.py.
+
+import io
+import os
+import csv
+import json
+
+# Colunas reconhecidas (os mesmos nomes dos campos do formulário do dashboard)
+COLUNAS = ('file', 'title', 'description', 'tags', 'scheduled_time', 'priority', 'summary')
+FORMATOS = ('csv', 'jsonl')
+EXTENSOES_VIDEO = ('.mp4', '.mov', '.m4v', '.mkv', '.avi', '.webm', '.wmv', '.flv', '.mpg', '.mpeg', '.3gp')
+
+
+class ManifestError(Exception):
+    """O manifesto inteiro não pôde ser lido (formato, codificação, colunas)."""
+
+
+def detect_format(nome_arquivo='', content_type='', texto=''):
+    """Descobre se o manifesto é CSV ou JSON Lines pela extensão, pelo Content-Type ou pelo conteúdo."""
+    extensao = os.path.splitext(nome_arquivo or '')[1].lower()
+    if extensao == '.csv' or 'csv' in content_type:
+        return 'csv'
+    if extensao in ('.jsonl', '.ndjson', '.json') or 'json' in content_type:
+        return 'jsonl'
+    return 'jsonl' if texto.lstrip().startswith(('{', '[')) else 'csv'
+
+
+def _normalize(linha):
+    """Mantém só as colunas conhecidas, sem espaços nas pontas; tags em lista viram texto separado por vírgulas."""
+    normalizada = {}
+    for coluna in COLUNAS:
+        valor = linha.get(coluna)
+        if isinstance(valor, list):
+            valor = ', '.join(str(item).strip() for item in valor if str(item).strip())
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor not in (None, ''):
+            normalizada[coluna] = valor
+    return normalizada
+
+
+def parse_manifest(texto, formato):
+    """
+    Lê o manifesto e devolve uma lista de (numero_da_linha, dicionário com as colunas conhecidas).
+    Em JSON Lines também é aceito um único array JSON. Linhas vazias são ignoradas.
+    """
+    if formato not in FORMATOS:
+        raise ManifestError(f"Formato de manifesto inválido: {formato!r}. Use um destes: {', '.join(FORMATOS)}.")
+    texto = texto.lstrip('\ufeff')  # BOM do Excel
+    linhas = []
+    if formato == 'csv':
+        leitor = csv.DictReader(io.StringIO(texto, newline=''))
+        if not leitor.fieldnames:
+            raise ManifestError("O CSV precisa de uma linha de cabeçalho")
+        leitor.fieldnames = [(nome or '').strip().lower() for nome in leitor.fieldnames]
+        if 'file' not in leitor.fieldnames:
+            raise ManifestError("O CSV precisa da coluna 'file'")
+        for linha in leitor:
+            normalizada = _normalize(linha)
+            if normalizada:
+                linhas.append((leitor.line_num, normalizada))
+        return linhas
+
+    if texto.lstrip().startswith('['):
+        try:
+            return parse_items(json.loads(texto))
+        except ValueError as e:
+            raise ManifestError(f"JSON inválido: {e}")
+    for numero, conteudo in enumerate(texto.splitlines(), start=1):
+        if not conteudo.strip():
+            continue
+        try:
+            item = json.loads(conteudo)
+        except ValueError as e:
+            raise ManifestError(f"Linha {numero}: JSON inválido ({e})")
+        if not isinstance(item, dict):
+            raise ManifestError(f"Linha {numero}: cada item precisa ser um objeto JSON")
+        linhas.append((numero, _normalize(item)))
+    return linhas
+
+
+def parse_items(itens):
+    """Mesmo resultado de parse_manifest para uma lista de objetos já decodificada (corpo JSON da rota)."""
+    if not isinstance(itens, list):
+        raise ManifestError("'items' precisa ser uma lista de objetos")
+    linhas = []
+    for numero, item in enumerate(itens, start=1):
+        if not isinstance(item, dict):
+            raise ManifestError(f"Item {numero}: cada item precisa ser um objeto JSON")
+        linhas.append((numero, _normalize(item)))
+    return linhas
+
+
+def resolve_server_path(pasta_base, referencia):
+    """
+    Caminho absoluto de um arquivo referenciado no manifesto, que precisa estar dentro de `pasta_base`
+    (caminhos relativos partem dela). Retorna None se a referência sair da pasta.
+    """
+    pasta_base = os.path.realpath(pasta_base)
+    try:
+        caminho = os.path.realpath(os.path.join(pasta_base, referencia))
+        # No Windows, caminhos em unidades diferentes (D:\ com a pasta em C:\) levantam ValueError aqui
+        if os.path.commonpath([pasta_base, caminho]) != pasta_base:
+            return None
+    except ValueError:
+        return None
+    return caminho
+
+
+def list_videos(pasta):
+    """Vídeos de uma pasta (sem subpastas), em ordem alfabética do nome do arquivo."""
+    return sorted(
+        nome for nome in os.listdir(pasta)
+        if os.path.splitext(nome)[1].lower() in EXTENSOES_VIDEO and os.path.isfile(os.path.join(pasta, nome))
+    )
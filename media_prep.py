@@ -0,0 +1,220 @@
+# media_prep.py
+# ============================================================================
+# PREPARAÇÃO DOS VÍDEOS ANTES DO UPLOAD (ANÁLISE, REMUX E TRANSCODIFICAÇÃO)
+# ============================================================================
+# O worker roda prepare_video() em um pool de processos para cada agendamento novo
+# (status 'preparando'), fora das requisições do Flask. A análise usa o ffprobe e a
+# posição do átomo moov é lida direto do arquivo; remux e transcodificação usam o ffmpeg.
+# Sem ffprobe/ffmpeg no PATH, só o tamanho e a posição do moov são conferidos.
+
+import os
+import json
+import uuid
+import struct
+import shutil
+import hashlib
+import subprocess
+
+MODOS = ('desligado', 'analisar', 'remux', 'transcodificar')
+
+# Limites do YouTube: arquivos acima disso são recusados antes de gastar banda e cota
+DURACAO_MAXIMA_SEGUNDOS = 12 * 3600
+TAMANHO_MAXIMO_BYTES = 256 * 1024 ** 3
+
+# Codecs que o YouTube processa sem problemas; os demais são convertidos no modo 'transcodificar'
+CODECS_VIDEO_ACEITOS = ('h264', 'hevc', 'vp9', 'av1', 'mpeg4', 'prores')
+CODECS_AUDIO_ACEITOS = ('aac', 'mp3', 'opus', 'vorbis', 'ac3', 'flac', 'pcm_s16le')
+# format_name que o ffprobe informa para MP4/MOV
+FORMATO_MP4 = 'mov,mp4,m4a,3gp,3g2,mj2'
+# Caixas que podem aparecer no nível superior de um MP4/MOV
+CAIXAS_MP4 = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid')
+
+TIMEOUT_FFPROBE_SEGUNDOS = 120
+
+
+class MediaRejectedError(Exception):
+    """O arquivo não seria aceito pelo YouTube; o agendamento vai para 'erro' sem tentar o upload."""
+
+
+def moov_at_start(caminho):
+    """
+    Percorre as caixas de nível superior de um MP4/MOV. Retorna True se o moov (índice do vídeo)
+    vem antes dos dados (mdat), False se vem depois e None se o arquivo não for MP4/MOV.
+    """
+    with open(caminho, 'rb') as arquivo:
+        tamanho_arquivo = os.fstat(arquivo.fileno()).st_size
+        posicao = 0
+        while posicao + 8 <= tamanho_arquivo:
+            arquivo.seek(posicao)
+            tamanho, tipo = struct.unpack('>I4s', arquivo.read(8))
+            if tipo not in CAIXAS_MP4:
+                return None
+            if tipo == b'moov':
+                return True
+            if tipo == b'mdat':
+                return False
+            if tamanho == 1:
+                tamanho = struct.unpack('>Q', arquivo.read(8))[0]
+            elif tamanho == 0:
+                break
+            if tamanho < 8:
+                return None
+            posicao += tamanho
+    return None
+
+
+def probe_media(caminho):
+    """Roda o ffprobe e devolve o JSON com format e streams. Arquivo ilegível gera MediaRejectedError."""
+    resultado = subprocess.run(
+        ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', caminho],
+        capture_output=True, timeout=TIMEOUT_FFPROBE_SEGUNDOS
+    )
+    if resultado.returncode != 0:
+        mensagem = resultado.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise MediaRejectedError(f"o arquivo não pôde ser lido como vídeo ({mensagem[-1] if mensagem else 'ffprobe falhou'})")
+    return json.loads(resultado.stdout.decode('utf-8'))
+
+
+def summarize_probe(dados):
+    """Extrai do JSON do ffprobe os campos guardados no agendamento."""
+    formato = dados.get('format', {})
+    streams = dados.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    def numero(valor, tipo=float):
+        try:
+            return tipo(valor)
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        'formato': formato.get('format_name'),
+        'duracao_segundos': numero(formato.get('duration')),
+        'taxa_bits': numero(formato.get('bit_rate'), int),
+        'codec_video': video.get('codec_name') if video else None,
+        'codec_audio': audio.get('codec_name') if audio else None,
+        'largura': video.get('width') if video else None,
+        'altura': video.get('height') if video else None,
+    }
+
+
+def file_sha256(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def run_ffmpeg(argumentos, caminho_saida):
+    """Roda o ffmpeg; em caso de falha apaga a saída parcial e levanta RuntimeError com a última linha do erro."""
+    resultado = subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *argumentos, caminho_saida],
+                               capture_output=True)
+    if resultado.returncode != 0:
+        if os.path.exists(caminho_saida):
+            os.remove(caminho_saida)
+        mensagem = resultado.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(mensagem[-1] if mensagem else f"ffmpeg saiu com código {resultado.returncode}")
+
+
+def remux_faststart(caminho, caminho_saida):
+    """Copia as streams sem recodificar, com o moov no início do arquivo."""
+    run_ffmpeg(['-i', caminho, '-map', '0:v', '-map', '0:a?', '-c', 'copy', '-movflags', '+faststart'], caminho_saida)
+
+
+def transcode(caminho, caminho_saida, perfil):
+    """Converte para H.264/AAC em MP4 com faststart, limitando a taxa se o perfil pedir."""
+    argumentos = ['-i', caminho, '-map', '0:v:0', '-map', '0:a:0?',
+                  '-c:v', 'libx264', '-preset', perfil['preset'], '-crf', str(perfil['crf']), '-pix_fmt', 'yuv420p']
+    if perfil.get('taxa_maxima_kbps'):
+        taxa = perfil['taxa_maxima_kbps']
+        argumentos += ['-maxrate', f"{taxa}k", '-bufsize', f"{taxa * 2}k"]
+    argumentos += ['-c:a', 'aac', '-b:a', f"{perfil['audio_kbps']}k", '-movflags', '+faststart']
+    run_ffmpeg(argumentos, caminho_saida)
+
+
+def transcode_reasons(info, perfil):
+    """
+    Por que o vídeo precisa ser convertido no perfil: dicionário {'codec_video' | 'codec_audio' | 'taxa': texto},
+    vazio se pode ir como está.
+    """
+    motivos = {}
+    if info['codec_video'] not in CODECS_VIDEO_ACEITOS:
+        motivos['codec_video'] = f"codec de vídeo {info['codec_video']}"
+    if info['codec_audio'] and info['codec_audio'] not in CODECS_AUDIO_ACEITOS:
+        motivos['codec_audio'] = f"codec de áudio {info['codec_audio']}"
+    taxa_maxima = perfil.get('taxa_maxima_kbps')
+    if taxa_maxima and info['taxa_bits'] and info['taxa_bits'] > taxa_maxima * 1000:
+        motivos['taxa'] = f"taxa de {info['taxa_bits'] // 1000} kbps"
+    return motivos
+
+
+def prepare_video(caminho, perfil, pasta_saida):
+    """
+    Analisa o vídeo e, conforme perfil['modo'], faz remux ou transcodificação para um arquivo novo
+    em `pasta_saida`. Roda em outro processo, então recebe e devolve apenas dados simples.
+    Retorna um dicionário com o resultado da análise e, se um arquivo novo foi gerado,
+    caminho_saida, hash_saida e tamanho_saida; motivos_transcodificacao lista por que ele foi convertido.
+    Levanta MediaRejectedError para arquivos recusados.
+    """
+    modo = perfil['modo']
+    tamanho = os.path.getsize(caminho)
+    if tamanho == 0:
+        raise MediaRejectedError("o arquivo está vazio")
+    if tamanho > TAMANHO_MAXIMO_BYTES:
+        raise MediaRejectedError("o arquivo passa de 256 GB, o limite do YouTube")
+
+    resultado = {'moov_no_inicio': moov_at_start(caminho), 'preparo': 'nenhum', 'aviso': None,
+                 'motivos_transcodificacao': [], 'caminho_saida': None, 'hash_saida': None, 'tamanho_saida': None}
+    if not shutil.which('ffprobe'):
+        resultado['aviso'] = "ffprobe não encontrado no PATH; apenas o tamanho e o moov foram conferidos"
+        return resultado
+
+    info = summarize_probe(probe_media(caminho))
+    resultado.update(info)
+    if not info['codec_video']:
+        raise MediaRejectedError("o arquivo não tem uma faixa de vídeo")
+    if not info['duracao_segundos'] or info['duracao_segundos'] <= 0:
+        raise MediaRejectedError("não foi possível determinar a duração do vídeo")
+    if info['duracao_segundos'] > DURACAO_MAXIMA_SEGUNDOS:
+        raise MediaRejectedError("o vídeo passa de 12 horas, o limite do YouTube")
+
+    motivos = transcode_reasons(info, perfil) if modo == 'transcodificar' else {}
+    resultado['motivos_transcodificacao'] = list(motivos.values())
+    fazer_remux = modo in ('remux', 'transcodificar') and info['formato'] == FORMATO_MP4 \
+        and resultado['moov_no_inicio'] is False
+    if not motivos and not fazer_remux:
+        return resultado
+    if not shutil.which('ffmpeg'):
+        resultado['aviso'] = "ffmpeg não encontrado no PATH; o vídeo será enviado como está"
+        return resultado
+
+    caminho_saida = os.path.join(pasta_saida, f".preparando-{uuid.uuid4().hex}.mp4")
+    try:
+        if motivos:
+            transcode(caminho, caminho_saida, perfil)
+            preparo = 'transcodificado'
+            # Convertido só pela taxa e não ficou menor: não vale a pena, envia o original.
+            # Com codec de áudio ou de vídeo recusado a conversão é necessária, mesmo maior.
+            if set(motivos) == {'taxa'} and os.path.getsize(caminho_saida) >= tamanho and not fazer_remux:
+                os.remove(caminho_saida)
+                resultado['aviso'] = "a transcodificação não reduziu o arquivo; o original será enviado"
+                return resultado
+        else:
+            remux_faststart(caminho, caminho_saida)
+            preparo = 'remux'
+    except (RuntimeError, OSError) as e:
+        # A preparação é uma otimização: se o ffmpeg falhar, o vídeo original ainda pode ser enviado
+        resultado['aviso'] = f"falha no ffmpeg ({e}); o vídeo será enviado como está"
+        return resultado
+
+    resultado.update({
+        'preparo': preparo,
+        'moov_no_inicio': True,
+        'caminho_saida': caminho_saida,
+        'hash_saida': file_sha256(caminho_saida),
+        'tamanho_saida': os.path.getsize(caminho_saida),
+    })
+    return resultado
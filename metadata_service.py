@@ -0,0 +1,269 @@
+# metadata_service.py
+# ============================================================================
+# SERVIÇO DE GERAÇÃO DE METADADOS (TÍTULO, DESCRIÇÃO E TAGS) COM IA
+# ============================================================================
+# O app.py usa o MetadataService com o GeminiClient. Qualquer objeto com o método
+# generate(prompt) -> (texto, tokens) pode substituir o Gemini, como o FakeMetadataClient
+# usado em testes e benchmarks sem acesso à internet.
+
+import re
+import abc
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from telemetry import REGISTRY, span
+
+# Mudar a versão quando o prompt mudar, para que respostas antigas do cache não sejam reaproveitadas
+PROMPT_VERSION = 'v1'
+
+PROMPT_TEMPLATE = """
+    Você é um especialista em marketing de conteúdo para o YouTube. Sua tarefa é criar metadados otimizados para um vídeo, com base em um resumo fornecido.
+    Responda APENAS com um objeto JSON válido, sem nenhum texto ou formatação adicional antes ou depois.
+
+    O JSON deve ter as seguintes chaves: "title", "description", "tags".
+
+    - "title": Crie um título magnético e otimizado para SEO, com no máximo 70 caracteres.
+    - "description": Crie uma descrição de 3 parágrafos. O primeiro resume o vídeo. O segundo detalha os pontos principais. O terceiro é uma chamada para ação (call-to-action) para se inscrever no canal e seguir nas redes sociais.
+    - "tags": Crie uma única string contendo 10 a 15 hashtags relevantes, separadas por vírgulas.
+
+    Resumo do vídeo:
+    ---
+    {summary}
+    ---
+    """
+
+# Estimativa de tokens da resposta, usada antes de saber o consumo real
+ESTIMATED_OUTPUT_TOKENS = 800
+
+GERACOES = REGISTRY.counter(
+    'postador_gemini_geracoes_total', 'Pedidos de metadados por origem da resposta (cache, compartilhada ou IA).',
+    ('origem',))
+TOKENS_USADOS = REGISTRY.counter('postador_gemini_tokens_total', 'Tokens consumidos na API de IA.')
+
+
+# ----------------------------------------------------------------------------
+# CLIENTES DE IA
+# ----------------------------------------------------------------------------
+class MetadataClient(abc.ABC):
+    """Interface dos clientes de IA: recebe o prompt e devolve (texto da resposta, tokens usados ou None)."""
+
+    @abc.abstractmethod
+    def generate(self, prompt):
+        """Envia o prompt ao modelo e retorna (texto, tokens)."""
+
+
+class GeminiClient(MetadataClient):
+    """Cliente do Google Gemini. O modelo é criado uma vez e reaproveitado em todas as chamadas."""
+
+    def __init__(self, api_key, model_name='gemini-2.5-flash'):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        # Pede a resposta já em JSON, sem blocos de código em volta
+        self._model = genai.GenerativeModel(model_name, generation_config={'response_mime_type': 'application/json'})
+
+    def generate(self, prompt):
+        response = self._model.generate_content(prompt)
+        uso = getattr(response, 'usage_metadata', None)
+        return response.text, getattr(uso, 'total_token_count', None)
+
+
+class FakeMetadataClient(MetadataClient):
+    """Cliente local para testes e benchmarks: responde metadados determinísticos após uma latência opcional."""
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        resumo = prompt.split('---')[1].strip() if '---' in prompt else prompt.strip()
+        palavras = [p for p in re.findall(r'\w+', resumo.lower()) if len(p) > 3][:12]
+        texto = json.dumps({
+            'title': resumo[:70],
+            'description': f"{resumo}\n\nNeste vídeo: {', '.join(palavras)}.\n\nInscreva-se no canal!",
+            'tags': ', '.join(f"#{p}" for p in palavras),
+        })
+        return texto, len(prompt) // 4 + len(texto) // 4
+
+
+# ----------------------------------------------------------------------------
+# CACHE E LIMITE DE TAXA
+# ----------------------------------------------------------------------------
+class ResponseCache:
+    """Cache LRU com validade (TTL), seguro para várias threads."""
+
+    def __init__(self, max_items=1024, ttl_seconds=24 * 3600):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def put(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl_seconds)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_items:
+                self._itens.popitem(last=False)
+
+
+class TokenRateLimiter:
+    """
+    Balde de tokens por minuto (limite de TPM da API). acquire() bloqueia até haver saldo;
+    depois da chamada, adjust() corrige a estimativa com o consumo real informado pela API.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.capacidade = tokens_per_minute
+        self.saldo = float(tokens_per_minute)
+        self._atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _recarregar(self):
+        agora = time.monotonic()
+        self.saldo = min(self.capacidade, self.saldo + (agora - self._atualizado_em) * self.capacidade / 60)
+        self._atualizado_em = agora
+
+    def acquire(self, tokens):
+        tokens = min(tokens, self.capacidade)
+        while True:
+            with self._lock:
+                self._recarregar()
+                if self.saldo >= tokens:
+                    self.saldo -= tokens
+                    return
+                espera = (tokens - self.saldo) * 60 / self.capacidade
+            time.sleep(espera)
+
+    def adjust(self, diferenca):
+        with self._lock:
+            self.saldo -= diferenca
+
+
+# ----------------------------------------------------------------------------
+# SERVIÇO
+# ----------------------------------------------------------------------------
+def normalize_summary(summary):
+    """Normaliza o resumo para o cache: mesma forma Unicode, sem espaços repetidos e sem diferença de maiúsculas."""
+    return ' '.join(unicodedata.normalize('NFC', summary).split()).casefold()
+
+
+def parse_metadata(texto):
+    """Extrai o JSON da resposta da IA e garante as chaves title, description e tags."""
+    inicio, fim = texto.find('{'), texto.rfind('}')
+    if inicio == -1 or fim == -1:
+        raise ValueError("A resposta da IA não contém um JSON.")
+    dados = json.loads(texto[inicio:fim + 1])
+    tags = dados.get('tags', '')
+    if isinstance(tags, list):
+        tags = ', '.join(str(tag) for tag in tags)
+    return {
+        'title': str(dados.get('title', '')).strip()[:100],
+        'description': str(dados.get('description', '')).strip(),
+        'tags': str(tags).strip(),
+    }
+
+
+class MetadataService:
+    """
+    Gera metadados de vídeo a partir de um resumo. Respostas ficam em cache pelo resumo
+    normalizado + versão do prompt; pedidos iguais feitos ao mesmo tempo compartilham
+    uma única chamada à IA; e todas as chamadas respeitam os limites de concorrência e
+    de tokens por minuto.
+    """
+
+    def __init__(self, client, cache=None, rate_limiter=None, max_concurrency=4):
+        self.client = client
+        self.cache = cache or ResponseCache()
+        self.rate_limiter = rate_limiter
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ia')
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(summary):
+        return hashlib.sha256(f"{PROMPT_VERSION}\n{normalize_summary(summary)}".encode('utf-8')).hexdigest()
+
+    def generate(self, summary):
+        """Gera (ou devolve do cache) os metadados de um resumo."""
+        chave = self.cache_key(summary)
+        resultado = self.cache.get(chave)
+        if resultado is not None:
+            GERACOES.inc(origem='cache')
+            return dict(resultado)
+
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            dono = futuro is None
+            if dono:
+                futuro = Future()
+                self._em_andamento[chave] = futuro
+        if not dono:
+            GERACOES.inc(origem='compartilhada')
+            return dict(futuro.result())
+        GERACOES.inc(origem='ia')
+
+        try:
+            resultado = self._call_client(summary)
+            self.cache.put(chave, resultado)
+            futuro.set_result(resultado)
+            return dict(resultado)
+        except Exception as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+
+    def _call_client(self, summary):
+        prompt = PROMPT_TEMPLATE.format(summary=summary)
+        estimativa = len(prompt) // 4 + ESTIMATED_OUTPUT_TOKENS
+        with span('gemini_espera'):
+            self._slots.acquire()
+        try:
+            if self.rate_limiter:
+                with span('gemini_limite_tokens'):
+                    self.rate_limiter.acquire(estimativa)
+            with span('gemini'):
+                texto, tokens_usados = self.client.generate(prompt)
+        finally:
+            self._slots.release()
+        if tokens_usados:
+            TOKENS_USADOS.inc(tokens_usados)
+        if self.rate_limiter and tokens_usados:
+            self.rate_limiter.adjust(tokens_usados - estimativa)
+        return parse_metadata(texto)
+
+    def generate_batch(self, summaries):
+        """
+        Gera os metadados de vários resumos em paralelo (dentro dos limites).
+        Retorna uma lista na mesma ordem, com {'ok': True, ...metadados} ou {'ok': False, 'error': ...}.
+        """
+        def gerar_um(summary):
+            try:
+                return {'ok': True, **self.generate(summary)}
+            except Exception as e:
+                return {'ok': False, 'error': str(e)}
+
+        return list(self._pool.map(gerar_um, summaries))
@@ -0,0 +1,77 @@
+# storage.py
+# ============================================================================
+# CAMADA DE ARMAZENAMENTO: ESCOLHA DO BANCO E POOL DE CONEXÕES
+# ============================================================================
+# O app.py cria o engine por aqui e o worker.py reaproveita o mesmo engine (importando do app.py),
+# então os dois processos usam a mesma configuração de banco e de pool.
+#
+# Bancos suportados:
+# - SQL Server (padrão), pelo pyodbc, com pool de conexões testadas antes do uso (pre-ping)
+#   e recicladas periodicamente, para não usar conexões derrubadas pelo servidor ou pela rede.
+# - SQLite em um arquivo local, em modo WAL: sem servidor e sem ida e volta pela rede a cada
+#   consulta. Serve para instalações em uma máquina só e para rodar o app no Linux.
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+BACKENDS = ('sqlserver', 'sqlite')
+
+
+def build_database_url(backend, sqlserver_url, sqlite_path):
+    """URL do SQLAlchemy para o backend escolhido."""
+    if backend == 'sqlite':
+        return f"sqlite:///{sqlite_path}"
+    if backend == 'sqlserver':
+        return sqlserver_url
+    raise ValueError(f"DATABASE_BACKEND inválido: {backend!r}. Use um destes: {', '.join(BACKENDS)}.")
+
+
+def create_storage_engine(url, pool_size=10, max_overflow=20, pool_timeout=30, pool_recycle=1800,
+                          sqlite_busy_timeout_ms=30000):
+    """
+    Cria o engine do SQLAlchemy com o pool ajustado para o banco da URL.
+    pool_size/max_overflow limitam as conexões abertas por processo (threads de upload, rotas do
+    Flask e a thread de eventos dividem o mesmo pool); pool_timeout é quanto uma thread espera
+    por uma conexão livre.
+    """
+    if url.startswith('sqlite'):
+        return _create_sqlite_engine(url, pool_size, max_overflow, pool_timeout, sqlite_busy_timeout_ms)
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+def _create_sqlite_engine(url, pool_size, max_overflow, pool_timeout, busy_timeout_ms):
+    # Cada thread pega sua própria conexão do pool, então a checagem de thread do sqlite3 não é necessária.
+    # Conexões locais não caem, por isso não há pre-ping nem reciclagem.
+    engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        connect_args={'check_same_thread': False, 'timeout': busy_timeout_ms / 1000},
+    )
+
+    @event.listens_for(engine, 'connect')
+    def configure_sqlite_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL: leituras (dashboard) não bloqueiam a escrita (worker) e vice-versa
+        cursor.execute('PRAGMA journal_mode=WAL')
+        # Com WAL, NORMAL só perde as últimas transações se a máquina desligar, nunca corrompe o arquivo
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        # Espera o outro processo terminar de escrever em vez de falhar com "database is locked"
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+    return engine
+
+
+def is_sqlite(engine):
+    return engine.dialect.name == 'sqlite'
@@ -0,0 +1,313 @@
+# telemetry.py
+# ============================================================================
+# MÉTRICAS, TEMPO DAS ETAPAS E LOGS ESTRUTURADOS
+# ============================================================================
+# O app.py e o worker.py registram aqui contadores, gauges e histogramas, que são
+# expostos no formato de texto do Prometheus em /metrics (no Flask e em uma porta do worker).
+# Os logs saem em JSON, uma linha por evento, com o job_id e o trace_id do agendamento
+# que está sendo processado na thread, para dar para seguir um vídeo do início ao fim.
+
+import sys
+import json
+import time
+import uuid
+import logging
+import datetime
+import threading
+import contextlib
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE_METRICAS = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites dos histogramas (em segundos, salvo indicação)
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+BUCKETS_ATRASO = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)
+BUCKETS_BYTES_POR_SEGUNDO = (1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8)
+
+
+# ----------------------------------------------------------------------------
+# MÉTRICAS
+# ----------------------------------------------------------------------------
+def _escape(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(nomes, valores, extra=''):
+    pares = [f'{nome}="{_escape(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _format_number(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+class _Metric:
+    tipo = None
+
+    def __init__(self, nome, ajuda, labels=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labels = tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"A métrica {self.nome} usa os labels {self.labels}, recebeu {tuple(labels)}")
+        return tuple(labels[nome] for nome in self.labels)
+
+    def _header(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Counter(_Metric):
+    """Contador que só aumenta (eventos, bytes, erros)."""
+    tipo = 'counter'
+
+    def inc(self, valor=1, **labels):
+        chave = self._key(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def render(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return self._header() + [f"{self.nome}{_format_labels(self.labels, chave)} {_format_number(valor)}"
+                                 for chave, valor in itens]
+
+
+class Gauge(_Metric):
+    """
+    Valor que sobe e desce (tamanho de fila, uploads em andamento). Também pode ser calculado
+    na hora da leitura com set_function(funcao), que devolve um número ou uma lista de (labels, valor).
+    """
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, labels=()):
+        super().__init__(nome, ajuda, labels)
+        self._funcao = None
+
+    def set(self, valor, **labels):
+        chave = self._key(labels)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def set_function(self, funcao):
+        self._funcao = funcao
+
+    def render(self):
+        if self._funcao is not None:
+            try:
+                resultado = self._funcao()
+            except Exception as e:
+                log_event('metrica_falhou', f"Não foi possível calcular {self.nome}: {e}", logging.WARNING)
+                return self._header()
+            if isinstance(resultado, (int, float)):
+                resultado = [({}, resultado)]
+            itens = sorted((self._key(labels), valor) for labels, valor in resultado)
+        else:
+            with self._lock:
+                itens = sorted(self._valores.items())
+        return self._header() + [f"{self.nome}{_format_labels(self.labels, chave)} {_format_number(valor)}"
+                                 for chave, valor in itens if valor is not None]
+
+
+class Histogram(_Metric):
+    """Distribuição de valores (durações, atrasos, taxas) em faixas cumulativas, com soma e contagem."""
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, labels=(), buckets=BUCKETS_DURACAO):
+        super().__init__(nome, ajuda, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, valor, **labels):
+        chave = self._key(labels)
+        with self._lock:
+            contagens, soma = self._valores.get(chave, ([0] * len(self.buckets), 0.0))
+            for indice, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    contagens[indice] += 1
+                    break
+            self._valores[chave] = (contagens, soma + valor)
+
+    def render(self):
+        with self._lock:
+            itens = sorted((chave, (list(contagens), soma)) for chave, (contagens, soma) in self._valores.items())
+        linhas = self._header()
+        for chave, (contagens, soma) in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                labels = _format_labels(self.labels, chave, f'le="{_format_number(limite)}"')
+                linhas.append(f"{self.nome}_bucket{labels} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_format_labels(self.labels, chave)} {_format_number(soma)}")
+            linhas.append(f"{self.nome}_count{_format_labels(self.labels, chave)} {acumulado}")
+        return linhas
+
+
+class MetricsRegistry:
+    """Todas as métricas do processo, na ordem em que foram criadas."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _register(self, classe, nome, *args, **kwargs):
+        with self._lock:
+            if nome not in self._metricas:
+                self._metricas[nome] = classe(nome, *args, **kwargs)
+            return self._metricas[nome]
+
+    def counter(self, nome, ajuda, labels=()):
+        return self._register(Counter, nome, ajuda, labels)
+
+    def gauge(self, nome, ajuda, labels=()):
+        return self._register(Gauge, nome, ajuda, labels)
+
+    def histogram(self, nome, ajuda, labels=(), buckets=BUCKETS_DURACAO):
+        return self._register(Histogram, nome, ajuda, labels, buckets)
+
+    def render(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.render())
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Métricas comuns ao servidor e ao worker
+ETAPA_DURACAO = REGISTRY.histogram(
+    'postador_etapa_duracao_segundos', 'Duração de cada etapa (span) do agendamento e do upload.',
+    ('etapa', 'resultado'))
+ERROS = REGISTRY.counter(
+    'postador_erros_total', 'Erros por etapa e tipo de exceção.', ('etapa', 'tipo'))
+
+
+def record_error(etapa, erro):
+    """
+    Conta o erro em postador_erros_total uma única vez por exceção. A mesma exceção passa por
+    span() (às vezes aninhados) e por quem a trata depois; fica a etapa mais interna, a primeira a registrar.
+    """
+    if getattr(erro, '_erro_registrado', False):
+        return
+    try:
+        erro._erro_registrado = True
+    except AttributeError:
+        pass  # Exceções sem __dict__ não podem ser marcadas e continuam contando a cada chamada
+    ERROS.inc(etapa=etapa, tipo=type(erro).__name__)
+
+
+# ----------------------------------------------------------------------------
+# LOGS ESTRUTURADOS E CONTEXTO DO JOB
+# ----------------------------------------------------------------------------
+# job_id/trace_id do agendamento em processamento; cada thread (ou requisição) tem o seu
+_contexto = contextvars.ContextVar('contexto_log', default={})
+logger = logging.getLogger('postador')
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por evento: horário UTC, nível, serviço, evento, mensagem, contexto do job e campos extras."""
+
+    def __init__(self, servico):
+        super().__init__()
+        self.servico = servico
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname.lower(),
+            'servico': self.servico,
+            'evento': getattr(record, 'evento', record.name),
+            'mensagem': record.getMessage(),
+            'thread': record.threadName,
+        }
+        dados.update(getattr(record, 'contexto', {}))
+        dados.update(getattr(record, 'campos', {}))
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+def configure_logging(servico, nivel='INFO'):
+    """Manda os logs do 'postador' para a saída padrão em JSON. Chamar de novo troca o nome do serviço."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter(servico))
+    logger.handlers[:] = [handler]
+    logger.setLevel(nivel.upper())
+    logger.propagate = False
+
+
+def log_event(evento, mensagem, nivel=logging.INFO, exc_info=False, **campos):
+    """Registra um evento com nome fixo (bom para filtrar) e campos extras."""
+    logger.log(nivel, mensagem, exc_info=exc_info,
+               extra={'evento': evento, 'contexto': _contexto.get(), 'campos': campos})
+
+
+@contextlib.contextmanager
+def job_context(job_id, **campos):
+    """Associa os logs e spans deste bloco ao agendamento `job_id`, com um trace_id novo."""
+    atual = _contexto.get()
+    # Dentro do mesmo job (ex.: worker -> perform_youtube_upload) o trace_id é mantido
+    trace_id = atual['trace_id'] if atual.get('job_id') == job_id else uuid.uuid4().hex[:16]
+    token = _contexto.set({**atual, 'job_id': job_id, 'trace_id': trace_id, **campos})
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+@contextlib.contextmanager
+def span(etapa, **campos):
+    """
+    Mede a duração de uma etapa: alimenta postador_etapa_duracao_segundos e registra um
+    log de debug. Exceções são contadas em postador_erros_total (uma vez, veja record_error) e propagadas.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        duracao = time.perf_counter() - inicio
+        ETAPA_DURACAO.observe(duracao, etapa=etapa, resultado='erro')
+        record_error(etapa, e)
+        log_event('span', f"{etapa} falhou em {duracao:.3f}s", logging.DEBUG,
+                  etapa=etapa, duracao_segundos=round(duracao, 6), erro=repr(e), **campos)
+        raise
+    duracao = time.perf_counter() - inicio
+    ETAPA_DURACAO.observe(duracao, etapa=etapa, resultado='ok')
+    log_event('span', f"{etapa} em {duracao:.3f}s", logging.DEBUG,
+              etapa=etapa, duracao_segundos=round(duracao, 6), **campos)
+
+
+# ----------------------------------------------------------------------------
+# SERVIDOR /metrics PARA PROCESSOS SEM FLASK (WORKER)
+# ----------------------------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        corpo = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE_METRICAS)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass  # Sem um log por coleta do Prometheus
+
+
+def start_metrics_server(porta, host='0.0.0.0'):
+    """Serve GET /metrics em uma thread própria. Retorna o servidor (porta 0 escolhe uma livre)."""
+    servidor = ThreadingHTTPServer((host, porta), _MetricsHandler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='metricas', daemon=True).start()
+    return servidor
@@ -1,74 +1,579 @@
 # worker.py
 
+import os
 import time
+import heapq
+import socket
+import logging
 import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from apscheduler.schedulers.blocking import BlockingScheduler
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from sqlalchemy import update, or_
 
-# Importa as configurações e a função de upload do nosso app.py
-from App import Agendamento, perform_youtube_upload, SERVER_NAME, DATABASE_NAME, CONNECTION_STRING
+# Importa as configurações e a função de upload do nosso app.py.
+# O worker usa o mesmo engine (e o mesmo pool de conexões) que o perform_youtube_upload.
+from App import (Agendamento, Session, perform_youtube_upload, notify_worker, quota_ledger, count_quota_backlog,
+                 apply_preparation_result, fail_agendamento, collect_disk_garbage, to_local_naive, bandwidth_manager, PREPARO_VIDEO, PREPARO_PERFIL,
+                 UPLOAD_FOLDER)
+from media_prep import prepare_video
+from telemetry import (REGISTRY, ETAPA_DURACAO, configure_logging, log_event, job_context, span, record_error,
+                       start_metrics_server)
 
-print("🤖 INICIANDO O WORKER DE AGENDAMENTO...")
-print("="*40)
+# --- CONFIGURAÇÃO DO POOL DE UPLOADS ---
+# Quantos uploads podem rodar ao mesmo tempo. Pode ser alterado no .env com MAX_UPLOADS_SIMULTANEOS=8
+# Cada upload ocupa uma conexão do pool do banco; aumente DB_POOL_SIZE junto se passar de uns 8.
+MAX_UPLOADS_SIMULTANEOS = max(1, int(os.getenv('MAX_UPLOADS_SIMULTANEOS', '4')))
 
-# Configura a conexão com o banco de dados (exatamente como no app.py)
-engine = create_engine(CONNECTION_STRING)
-Session = sessionmaker(bind=engine)
+# --- CONFIGURAÇÃO DA PREPARAÇÃO DOS VÍDEOS ---
+# Processos analisando/convertendo vídeos ao mesmo tempo (o ffmpeg usa vários núcleos por conta própria)
+PREPARO_PROCESSOS = max(1, int(os.getenv('PREPARO_PROCESSOS', '2')))
 
-def check_and_post_videos():
+# --- CONFIGURAÇÃO DO AGENDADOR ---
+# Porta UDP onde o worker escuta os avisos do app.py (precisa estar em WORKER_NOTIFY_ADDRS do app)
+WORKER_NOTIFY_PORT = int(os.getenv('WORKER_NOTIFY_PORT', '5055'))
+# Recarga de segurança da fila, caso algum aviso UDP se perca ou o banco seja alterado por fora do app
+RECARGA_SEGURANCA_SEGUNDOS = int(os.getenv('RECARGA_SEGURANCA_SEGUNDOS', '300'))
+# Intervalo entre os relatórios de vazão
+RELATORIO_SEGUNDOS = 60
+# Intervalo entre as limpezas de uploads/ (vídeos sem agendamento, falhas antigas, sessões abandonadas; 0 desliga)
+DISCO_LIMPEZA_MINUTOS = float(os.getenv('DISCO_LIMPEZA_MINUTOS', '30'))
+# Porta HTTP do /metrics do worker para o Prometheus (0 desliga). Vários workers na mesma máquina precisam de portas diferentes.
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '9105'))
+
+# --- CONFIGURAÇÃO DOS LEASES (VÁRIOS WORKERS EM PARALELO) ---
+# Identificação única deste worker; por padrão, máquina + processo
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+# Por quanto tempo um agendamento fica reservado sem heartbeat antes de outro worker poder assumir
+LEASE_SEGUNDOS = int(os.getenv('LEASE_SEGUNDOS', '120'))
+
+# Mensagens aceitas no socket de avisos
+MENSAGEM_RECARREGAR = b'recarregar'  # enviada pelo app.py quando a fila muda
+MENSAGEM_VAGA = b'vaga'              # enviada pelas threads de upload quando terminam
+porta_aviso = None
+
+# Cada upload roda em uma thread do pool; perform_youtube_upload abre sua própria sessão e serviço do YouTube
+upload_pool = ThreadPoolExecutor(max_workers=MAX_UPLOADS_SIMULTANEOS, thread_name_prefix='upload')
+
+# IDs dos agendamentos que já estão no pool (na fila ou enviando), para não serem enviados duas vezes
+uploads_em_andamento = set()
+uploads_lock = threading.Lock()
+
+# A preparação roda em processos separados para não disputar o GIL com as threads de upload.
+# IDs em preparação neste worker (protegidos pelo mesmo uploads_lock)
+preparo_pool = ProcessPoolExecutor(max_workers=PREPARO_PROCESSOS) if PREPARO_VIDEO != 'desligado' else None
+preparos_em_andamento = set()
+
+# --- MÉTRICAS DO WORKER ---
+FILA = REGISTRY.gauge('postador_worker_fila', 'Agendamentos na fila em memória do worker.', ('fila',))
+RESERVAS = REGISTRY.counter('postador_worker_reservas_total', 'Tentativas de reservar agendamentos vencidos.',
+                            ('resultado',))
+REGISTRY.gauge('postador_worker_em_andamento', 'Uploads e preparações em andamento neste worker.',
+               ('tipo',)).set_function(lambda: [({'tipo': 'upload'}, len(uploads_em_andamento)),
+                                                ({'tipo': 'preparo'}, len(preparos_em_andamento))])
+
+
+class EstatisticasVazao:
+    """
+    Acumula os uploads concluídos entre dois relatórios para medir a vazão
+    (vídeos/min e bytes/s) e ajudar a dimensionar o pool de acordo com a cota.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reiniciar(time.monotonic())
+
+    def _reiniciar(self, agora):
+        self.inicio = agora
+        self.videos_postados = 0
+        self.videos_com_erro = 0
+        self.bytes_enviados = 0
+
+    def registrar(self, sucesso, tamanho_bytes):
+        with self._lock:
+            if sucesso:
+                self.videos_postados += 1
+                self.bytes_enviados += tamanho_bytes
+            else:
+                self.videos_com_erro += 1
+
+    def coletar(self):
+        """Retorna (videos_por_minuto, bytes_por_segundo, postados, erros) do período e zera os contadores."""
+        with self._lock:
+            agora = time.monotonic()
+            duracao = max(agora - self.inicio, 1e-6)
+            resultado = (
+                self.videos_postados * 60 / duracao,
+                self.bytes_enviados / duracao,
+                self.videos_postados,
+                self.videos_com_erro,
+            )
+            self._reiniciar(agora)
+            return resultado
+
+
+estatisticas = EstatisticasVazao()
+
+
+def run_upload(agendamento_id, caminho_video):
     """
-    Esta é a tarefa que o worker vai executar repetidamente.
+    Roda dentro de uma thread do pool: faz o upload e registra o resultado nas estatísticas.
     """
-    print(f"[{datetime.datetime.now()}] 🔍 Verificando agendamentos...")
-    
+    try:
+        tamanho_bytes = os.path.getsize(caminho_video) if os.path.exists(caminho_video) else 0
+        with job_context(agendamento_id):
+            sucesso = perform_youtube_upload(agendamento_id, WORKER_ID)
+        estatisticas.registrar(sucesso, tamanho_bytes)
+    except Exception as e:
+        # Em caso de erro na função de upload, registra no log e aplica a política de novas tentativas
+        record_error('worker', e)
+        log_event('upload_erro_inesperado', f"Erro inesperado ao processar o upload: {e}", logging.ERROR,
+                  exc_info=True, job_id=agendamento_id)
+        estatisticas.registrar(False, 0)
+        try:
+            # Só registra a falha se o agendamento ainda estiver reservado para este worker
+            fail_agendamento(agendamento_id, WORKER_ID, e, f"Erro no worker: {str(e)}")
+        except Exception as db_e:
+            log_event('registro_falha_falhou', f"Erro ao registrar falha do agendamento: {db_e}", logging.ERROR,
+                      job_id=agendamento_id)
+    finally:
+        with uploads_lock:
+            uploads_em_andamento.discard(agendamento_id)
+        # Acorda o laço principal para ocupar a vaga que abriu
+        send_to_self(MENSAGEM_VAGA)
+
+
+def free_slots():
+    """Quantos uploads ainda cabem no pool deste worker."""
+    with uploads_lock:
+        return MAX_UPLOADS_SIMULTANEOS - len(uploads_em_andamento)
+
+
+def report_throughput():
+    """Mostra a vazão desde o último relatório."""
+    videos_por_minuto, bytes_por_segundo, postados, erros = estatisticas.coletar()
+    with uploads_lock:
+        em_andamento = len(uploads_em_andamento)
+    log_event('vazao', f"{videos_por_minuto:.2f} vídeos/min, {bytes_por_segundo / 1_000_000:.2f} MB/s",
+              videos_por_minuto=round(videos_por_minuto, 3), bytes_por_segundo=round(bytes_por_segundo),
+              postados=postados, erros=erros, em_andamento=em_andamento, capacidade=MAX_UPLOADS_SIMULTANEOS)
+    banda = bandwidth_manager.snapshot()
+    if banda:
+        limite = bandwidth_manager.current_limit()
+        log_event('banda', f"Limite de banda: {limite * 8 / 1_000_000:.1f} Mbit/s" if limite else "Banda sem limite",
+                  limite_bytes_por_segundo=round(limite),
+                  uploads={str(job_id): {chave: round(valor, 3) if valor is not None else None
+                                         for chave, valor in dados.items()} for job_id, dados in banda.items()})
     session = Session()
     try:
-        # Busca por agendamentos que estão na hora e com status 'agendado'
-        now = datetime.datetime.now()
-        agendamentos_para_postar = session.query(Agendamento).filter(
-            Agendamento.status == 'agendado',
-            Agendamento.data_agendamento <= now
+        cota = quota_ledger.project_drain(count_quota_backlog(session))
+    finally:
+        session.close()
+    if cota['dias_para_esvaziar']:
+        previsao = f"fila cabe na cota a partir de {cota['fila_cabe_na_cota_a_partir_de']}"
+    elif cota['dias_para_esvaziar'] == 0:
+        previsao = "fila cabe na cota de hoje"
+    else:
+        previsao = "cota diária menor que o custo de um upload"
+    log_event('cota', f"Cota do YouTube: {cota['unidades_usadas']}/{cota['limite']} unidades hoje, "
+              f"{cota['uploads_pendentes']} upload(s) vencido(s) aguardando, {previsao}.",
+              unidades_usadas=cota['unidades_usadas'], limite=cota['limite'],
+              uploads_pendentes=cota['uploads_pendentes'], dias_para_esvaziar=cota['dias_para_esvaziar'])
+
+
+def run_disk_cleanup():
+    """Limpeza periódica do disco; uma falha aqui não pode derrubar o laço principal."""
+    try:
+        collect_disk_garbage()
+    except Exception as e:
+        record_error('limpeza_disco', e)
+        log_event('limpeza_disco_falhou', f"Erro na limpeza de uploads/: {e}", logging.ERROR)
+
+
+def load_schedule_heap():
+    """
+    Carrega do banco apenas (data_agendamento, id, prioridade) dos agendamentos pendentes e monta
+    um min-heap, de forma que o próximo vídeo a vencer está sempre em heap[0].
+    Agendamentos esperando uma nova tentativa continuam 'agendado' (o mesmo índice de status) e
+    entram no heap pelo horário da próxima tentativa.
+    """
+    session = Session()
+    try:
+        pendentes = session.query(Agendamento.data_agendamento, Agendamento.id, Agendamento.prioridade,
+                                  Agendamento.proxima_tentativa_em).filter(
+            Agendamento.status == 'agendado'
         ).all()
+    finally:
+        session.close()
+    heap = [(max(to_local_naive(data_agendamento), proxima_tentativa_em or datetime.datetime.min),
+             agendamento_id, prioridade or 0)
+            for data_agendamento, agendamento_id, prioridade, proxima_tentativa_em in pendentes]
+    heapq.heapify(heap)
+    log_event('fila_recarregada', f"Fila recarregada: {len(heap)} vídeo(s) agendado(s).", agendados=len(heap))
+    return heap
+
+
+def claim_agendamento(session, agendamento_id, now):
+    """
+    Reserva o agendamento para este worker com um UPDATE condicional atômico: só um worker
+    consegue mudar o status de 'agendado' para 'processando', mesmo com vários workers
+    em várias máquinas. Retorna True se a reserva foi deste worker.
+    """
+    resultado = session.execute(
+        update(Agendamento)
+        .where(Agendamento.id == agendamento_id,
+               Agendamento.status == 'agendado',
+               Agendamento.data_agendamento <= now,
+               or_(Agendamento.proxima_tentativa_em.is_(None),
+                   Agendamento.proxima_tentativa_em <= now))
+        .values(status='processando',
+                worker_id=WORKER_ID,
+                lease_expira_em=now + datetime.timedelta(seconds=LEASE_SEGUNDOS))
+    )
+    session.commit()
+    return resultado.rowcount == 1
+
+
+def post_due_videos(heap, prontos):
+    """
+    Passa os agendamentos vencidos do heap de horários para o heap de prontos, ordenado por
+    prioridade (maior primeiro) e depois por horário. Dos prontos, reserva a cota do upload e o
+    agendamento e os envia para o pool enquanto houver vaga, sem esperar os uploads terminarem.
+    Os que não couberem no pool ou na cota de hoje ficam em `prontos` como 'agendado'; sem cota,
+    os que só retomam uma sessão de upload aberta (custo zero) continuam sendo enviados.
+    Retorna True se algum agendamento ficou esperando porque a cota do YouTube acabou.
+    """
+    now = datetime.datetime.now()
+    while heap and heap[0][0] <= now:
+        data_agendamento, agendamento_id, prioridade = heapq.heappop(heap)
+        heapq.heappush(prontos, (-prioridade, data_agendamento, agendamento_id))
+
+    sem_cota = []
+    session = Session()
+    try:
+        while prontos and free_slots() > 0:
+            item = heapq.heappop(prontos)
+            agendamento_id = item[2]
+            # Retomar uma sessão de upload já aberta não gasta cota
+            sessao_aberta = session.query(Agendamento.upload_sessao_uri).filter(
+                Agendamento.id == agendamento_id
+            ).scalar()
+            custo = 0 if sessao_aberta else quota_ledger.custo_upload
+            if custo and sem_cota:
+                # A cota já acabou nesta rodada: nem tenta reservar de novo
+                sem_cota.append(item)
+                continue
+            with span('reserva_cota'):
+                dia_cota = quota_ledger.reserve(custo) if custo else None
+            if custo and dia_cota is None:
+                RESERVAS.inc(resultado='sem_cota')
+                sem_cota.append(item)
+                continue
 
-        if not agendamentos_para_postar:
-            print("✨ Nenhum vídeo para postar no momento.")
-            return
-
-        for agendamento in agendamentos_para_postar:
-            print(f"Found post! Starting to work on Post #{agendamento.id}")
-            print(f"▶️ Encontrado agendamento ID: {agendamento.id} - Título: {agendamento.titulo}")
-            
-            # Muda o status para 'processando' para evitar que seja pego de novo
-            agendamento.status = 'processando'
-            session.commit()
-            
+            # A cota reservada volta para o registro se o agendamento não chegar ao pool
+            entregue = False
             try:
-                # Chama a função principal de upload
-                perform_youtube_upload(agendamento.id)
-            except Exception as e:
-                # Em caso de erro na função de upload, registra no log
-                print(f"❌ Erro inesperado ao processar o upload para o agendamento {agendamento.id}: {e}")
-                agendamento.status = 'erro'
-                agendamento.mensagem_erro = f"Erro no worker: {str(e)}"
-                session.commit()
+                # Outro worker pode ter pego antes, ou o agendamento mudou depois que a fila foi carregada
+                with span('reserva_agendamento'):
+                    reservado = claim_agendamento(session, agendamento_id, now)
+                if not reservado:
+                    RESERVAS.inc(resultado='perdida')
+                    continue
+                RESERVAS.inc(resultado='ok')
+
+                titulo, caminho_video = session.query(Agendamento.titulo, Agendamento.caminho_video).filter(
+                    Agendamento.id == agendamento_id
+                ).one()
+                log_event('agendamento_reservado', f"Reservado: {titulo}", job_id=agendamento_id, custo_cota=custo)
+
+                with uploads_lock:
+                    uploads_em_andamento.add(agendamento_id)
+                upload_pool.submit(run_upload, agendamento_id, caminho_video)
+                entregue = True
+            finally:
+                if dia_cota and not entregue:
+                    quota_ledger.release(dia_cota, custo)
+
+    except Exception as e:
+        record_error('reserva_agendamento', e)
+        log_event('reserva_falhou', f"Erro ao verificar o banco de dados: {e}", logging.ERROR)
+        session.rollback()
+    finally:
+        session.close()
+        # Quem esperou pela cota volta para os prontos, na mesma ordem
+        for item in sem_cota:
+            heapq.heappush(prontos, item)
+    return bool(sem_cota)
+
+
+def claim_preparation(session, agendamento_id, now):
+    """Reserva um agendamento 'preparando' para este worker (mesma ideia do claim_agendamento)."""
+    resultado = session.execute(
+        update(Agendamento)
+        .where(Agendamento.id == agendamento_id,
+               Agendamento.status == 'preparando',
+               Agendamento.worker_id.is_(None))
+        .values(worker_id=WORKER_ID,
+                lease_expira_em=now + datetime.timedelta(seconds=LEASE_SEGUNDOS))
+    )
+    session.commit()
+    return resultado.rowcount == 1
+
+
+def start_preparations():
+    """
+    Envia para o pool de processos os vídeos que aguardam preparação, os de horário mais
+    próximo primeiro, enquanto houver processo livre.
+    """
+    if preparo_pool is None:
+        return
+    with uploads_lock:
+        vagas = PREPARO_PROCESSOS - len(preparos_em_andamento)
+    if vagas <= 0:
+        return
+    session = Session()
+    try:
+        candidatos = session.query(Agendamento.id, Agendamento.caminho_video).filter(
+            Agendamento.status == 'preparando',
+            Agendamento.worker_id.is_(None)
+        ).order_by(Agendamento.data_agendamento.asc(), Agendamento.id.asc()).limit(vagas).all()
+        now = datetime.datetime.now()
+        for agendamento_id, caminho_video in candidatos:
+            if not claim_preparation(session, agendamento_id, now):
+                continue
+            log_event('preparo_iniciado', "Preparando o vídeo.", job_id=agendamento_id, caminho_video=caminho_video)
+            with uploads_lock:
+                preparos_em_andamento.add(agendamento_id)
+            futuro = preparo_pool.submit(prepare_video, caminho_video, PREPARO_PERFIL, UPLOAD_FOLDER)
+            futuro.add_done_callback(functools.partial(finish_preparation, agendamento_id, time.perf_counter()))
+    except Exception as e:
+        record_error('preparo', e)
+        log_event('preparo_busca_falhou', f"Erro ao buscar vídeos para preparar: {e}", logging.ERROR)
+        session.rollback()
+    finally:
+        session.close()
+
 
+def finish_preparation(agendamento_id, inicio, futuro):
+    """Callback do pool de processos: grava o resultado e avisa os workers que há vídeo pronto."""
+    try:
+        erro = futuro.exception()
+        ETAPA_DURACAO.observe(time.perf_counter() - inicio, etapa='preparo', resultado='erro' if erro else 'ok')
+        if erro:
+            record_error('preparo', erro)
+        resultado = None if erro else futuro.result()
+        status = apply_preparation_result(agendamento_id, WORKER_ID, resultado, erro)
+        if status == 'agendado':
+            log_event('preparo_concluido', "Vídeo preparado.", job_id=agendamento_id,
+                      preparo=resultado.get('preparo') if resultado else None,
+                      motivos=resultado.get('motivos_transcodificacao') if resultado else None,
+                      duracao_video_segundos=resultado.get('duracao_segundos') if resultado else None)
+            notify_worker()
+            send_to_self(MENSAGEM_RECARREGAR)
+        elif status == 'erro':
+            log_event('preparo_recusado', f"Vídeo recusado: {erro}", logging.WARNING, job_id=agendamento_id)
     except Exception as e:
-        print(f"❌ Erro ao verificar o banco de dados: {e}")
+        # O lease expira e outro worker (ou este, depois) prepara o vídeo de novo
+        record_error('preparo', e)
+        log_event('preparo_registro_falhou', f"Erro ao registrar a preparação: {e}", logging.ERROR,
+                  job_id=agendamento_id)
+    finally:
+        with uploads_lock:
+            preparos_em_andamento.discard(agendamento_id)
+        send_to_self(MENSAGEM_VAGA)
+
+
+def renew_leases():
+    """Heartbeat: estende o lease dos agendamentos que este worker está postando ou preparando."""
+    with uploads_lock:
+        ids = list(uploads_em_andamento | preparos_em_andamento)
+    if not ids:
+        return
+    session = Session()
+    try:
+        session.execute(
+            update(Agendamento)
+            .where(Agendamento.id.in_(ids),
+                   Agendamento.status.in_(('processando', 'preparando')),
+                   Agendamento.worker_id == WORKER_ID)
+            .values(lease_expira_em=datetime.datetime.now() + datetime.timedelta(seconds=LEASE_SEGUNDOS))
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def recover_expired_leases():
+    """
+    Devolve para a fila os agendamentos cujo worker parou de renovar o lease (caiu ou travou).
+    A sessão de upload salva no agendamento é mantida, então quem pegar continua o envio.
+    Preparações abandonadas ficam livres para outro worker preparar de novo.
+    Retorna quantos foram recuperados.
+    """
+    session = Session()
+    try:
+        agora = datetime.datetime.now()
+        resultado = session.execute(
+            update(Agendamento)
+            .where(Agendamento.status == 'processando',
+                   or_(Agendamento.lease_expira_em.is_(None),
+                       Agendamento.lease_expira_em < agora))
+            .values(status='agendado', worker_id=None, lease_expira_em=None)
+        )
+        preparos = session.execute(
+            update(Agendamento)
+            .where(Agendamento.status == 'preparando',
+                   Agendamento.worker_id.isnot(None),
+                   or_(Agendamento.lease_expira_em.is_(None),
+                       Agendamento.lease_expira_em < agora))
+            .values(worker_id=None, lease_expira_em=None)
+        )
+        session.commit()
+        recuperados = resultado.rowcount + preparos.rowcount
+        if recuperados:
+            log_event('leases_recuperados', f"{recuperados} agendamento(s) com lease expirado voltaram para a fila.",
+                      recuperados=recuperados)
+        return recuperados
+    except Exception:
         session.rollback()
+        raise
     finally:
         session.close()
 
 
-# --- Configuração do Agendador (Scheduler) ---
-# Instale com: pip install APScheduler
-scheduler = BlockingScheduler()
+def run_heartbeat():
+    """Thread de heartbeat: renova os leases deste worker e recupera os leases expirados de outros."""
+    while True:
+        time.sleep(LEASE_SEGUNDOS / 3)
+        try:
+            renew_leases()
+            if recover_expired_leases():
+                # Todos os workers (inclusive este) recarregam a fila para pegar os recuperados
+                notify_worker()
+                send_to_self(MENSAGEM_RECARREGAR)
+        except Exception as e:
+            record_error('heartbeat', e)
+            log_event('heartbeat_falhou', f"Erro no heartbeat dos leases: {e}", logging.ERROR)
+
+
+def open_notification_socket():
+    """
+    Abre o socket UDP onde o app.py avisa que a fila mudou. Se a porta já estiver em uso
+    (outro worker na mesma máquina), usa uma porta livre: o worker continua funcionando,
+    mas os avisos do app.py só chegam se essa porta estiver em WORKER_NOTIFY_ADDRS.
+    """
+    global porta_aviso
+    aviso = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        aviso.bind(('0.0.0.0', WORKER_NOTIFY_PORT))
+    except OSError:
+        aviso.bind(('0.0.0.0', 0))
+        log_event('porta_aviso_em_uso', f"Porta UDP {WORKER_NOTIFY_PORT} em uso; usando a porta {aviso.getsockname()[1]}. "
+                  f"Defina WORKER_NOTIFY_PORT diferente para cada worker e liste todas em WORKER_NOTIFY_ADDRS.",
+                  logging.WARNING, porta=aviso.getsockname()[1])
+    porta_aviso = aviso.getsockname()[1]
+    return aviso
+
+
+def send_to_self(mensagem):
+    """Envia um aviso para o próprio laço principal (ex.: uma vaga abriu no pool)."""
+    if porta_aviso is None:
+        return
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as aviso:
+        aviso.sendto(mensagem, ('127.0.0.1', porta_aviso))
+
+
+def wait_for_notification(aviso, segundos):
+    """
+    Dorme até `segundos` ou até chegar um aviso, o que vier primeiro.
+    Retorna o conjunto de mensagens recebidas (vazio se o tempo acabou).
+    Avisos acumulados são consumidos de uma vez só.
+    """
+    mensagens = set()
+    aviso.settimeout(max(segundos, 0.001))
+    try:
+        mensagens.add(aviso.recvfrom(64)[0])
+    except socket.timeout:
+        return mensagens
+    aviso.setblocking(False)
+    try:
+        while True:
+            mensagens.add(aviso.recvfrom(64)[0])
+    except BlockingIOError:
+        pass
+    return mensagens
+
+
+def run_event_loop():
+    """
+    Laço principal: dorme exatamente até o próximo agendamento vencer (ou até um aviso),
+    posta os vencidos e volta a dormir. O banco só é consultado quando a fila muda.
+    Com a cota do YouTube esgotada, os vencidos esperam até a cota zerar.
+    """
+    aviso = open_notification_socket()
+    recover_expired_leases()
+    threading.Thread(target=run_heartbeat, name='heartbeat', daemon=True).start()
+    start_preparations()
+    heap = load_schedule_heap()
+    prontos = []
+    proxima_recarga = time.monotonic() + RECARGA_SEGURANCA_SEGUNDOS
+    proximo_relatorio = time.monotonic() + RELATORIO_SEGUNDOS
+    # A primeira limpeza espera um intervalo inteiro, para não disputar o início com os uploads atrasados
+    proxima_limpeza = time.monotonic() + DISCO_LIMPEZA_MINUTOS * 60 if DISCO_LIMPEZA_MINUTOS else float('inf')
+
+    while True:
+        cota_esgotada = post_due_videos(heap, prontos)
+        FILA.set(len(heap), fila='horarios')
+        FILA.set(len(prontos), fila='prontos')
+
+        # Calcula quanto dormir: até o próximo vídeo, a próxima recarga de segurança, o próximo relatório ou a próxima limpeza.
+        # Com o pool cheio, o próximo vídeo espera o aviso de vaga em vez do horário.
+        # Sem cota, os prontos esperam o reset; os que vencerem até lá só entram na fila de prontos.
+        espera = min(proxima_recarga, proximo_relatorio, proxima_limpeza) - time.monotonic()
+        if free_slots() > 0:
+            if cota_esgotada:
+                espera = min(espera, quota_ledger.seconds_until_reset() + 1)
+            if heap:
+                espera = min(espera, (heap[0][0] - datetime.datetime.now()).total_seconds())
+
+        mensagens = wait_for_notification(aviso, espera)
+        if MENSAGEM_RECARREGAR in mensagens or time.monotonic() >= proxima_recarga:
+            heap = load_schedule_heap()
+            prontos = []
+            proxima_recarga = time.monotonic() + RECARGA_SEGURANCA_SEGUNDOS
+            start_preparations()
+        elif MENSAGEM_VAGA in mensagens:
+            start_preparations()
+
+        if time.monotonic() >= proximo_relatorio:
+            report_throughput()
+            proximo_relatorio = time.monotonic() + RELATORIO_SEGUNDOS
+
+        if time.monotonic() >= proxima_limpeza:
+            run_disk_cleanup()
+            proxima_limpeza = time.monotonic() + DISCO_LIMPEZA_MINUTOS * 60
 
-# Agenda a tarefa 'check_and_post_videos' para rodar a cada 60 segundos
-scheduler.add_job(check_and_post_videos, 'interval', seconds=60)
 
-try:
-    print("🚀 Worker iniciado. Verificando a cada 60 segundos. Pressione Ctrl+C para sair.")
-    scheduler.start()
-except (KeyboardInterrupt, SystemExit):
-    pass
\ No newline at end of file
+if __name__ == '__main__':
+    configure_logging('worker', os.getenv('LOG_LEVEL', 'INFO'))
+    try:
+        if WORKER_METRICS_PORT:
+            try:
+                start_metrics_server(WORKER_METRICS_PORT)
+            except OSError as e:
+                log_event('metricas_indisponiveis', f"Não foi possível abrir a porta {WORKER_METRICS_PORT} do /metrics: {e}",
+                          logging.WARNING)
+        log_event('worker_iniciado', f"Worker {WORKER_ID} iniciado. Escutando avisos na porta UDP {WORKER_NOTIFY_PORT}, "
+                  f"até {MAX_UPLOADS_SIMULTANEOS} uploads simultâneos. Pressione Ctrl+C para sair.",
+                  worker_id=WORKER_ID, porta_metricas=WORKER_METRICS_PORT or None)
+        run_event_loop()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        # Espera os uploads e as preparações em andamento terminarem antes de sair
+        upload_pool.shutdown(wait=True)
+        if preparo_pool is not None:
+            preparo_pool.shutdown(wait=True)